@@ -0,0 +1,29 @@
+"""reservation version column
+
+Revision ID: 76a662b9a70e
+Revises: e99fcfac935d
+Create Date: 2026-10-18 11:20:09.334871
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '76a662b9a70e'
+down_revision: Union[str, Sequence[str], None] = 'e99fcfac935d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # A constant server default lets Postgres add the column without rewriting the table.
+    op.add_column('reservations', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('reservations', 'version')
@@ -0,0 +1,40 @@
+"""otp codes one row per phone
+
+Revision ID: 8cbdcd1dac4c
+Revises: 6434c1e3f166
+Create Date: 2026-10-18 09:12:41.102344
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8cbdcd1dac4c'
+down_revision: Union[str, Sequence[str], None] = '6434c1e3f166'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # OTP rows are short-lived; drop stale ones and keep only the newest code per phone.
+    op.execute("DELETE FROM otp_codes WHERE expires_at < now()")
+    op.execute(
+        "DELETE FROM otp_codes o USING otp_codes newer "
+        "WHERE o.phone_number = newer.phone_number AND o.id < newer.id"
+    )
+    op.add_column('otp_codes', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.execute("ALTER TABLE otp_codes DROP CONSTRAINT IF EXISTS uq_phone_code")
+    op.drop_index(op.f('ix_otp_codes_phone_number'), table_name='otp_codes')
+    op.create_index(op.f('ix_otp_codes_phone_number'), 'otp_codes', ['phone_number'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_otp_codes_phone_number'), table_name='otp_codes')
+    op.create_index(op.f('ix_otp_codes_phone_number'), 'otp_codes', ['phone_number'], unique=False)
+    op.create_unique_constraint('uq_phone_code', 'otp_codes', ['phone_number', 'code'])
+    op.drop_column('otp_codes', 'attempts')
@@ -0,0 +1,47 @@
+"""keyset pagination indexes
+
+Revision ID: 9403cc4527e2
+Revises: 8cbdcd1dac4c
+Create Date: 2026-10-18 10:03:27.518962
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9403cc4527e2'
+down_revision: Union[str, Sequence[str], None] = '8cbdcd1dac4c'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns)
+INDEXES = [
+    ('ix_users_role_id', 'users', ['role', 'id']),
+    ('ix_reservations_user_id_date_id', 'reservations', ['user_id', 'date', 'id']),
+    ('ix_reservations_status_date_id', 'reservations', ['status', 'date', 'id']),
+    ('ix_reservations_date_id', 'reservations', ['date', 'id']),
+    ('ix_payments_user_id_created_at_id', 'payments', ['user_id', 'created_at', 'id']),
+    # customers_crm is created by the separate CRM app, so this one is skipped where the table is missing.
+    ('ix_customers_crm_category_customer_id', 'customers_crm', ['category', 'customer_id']),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        inspector = sa.inspect(op.get_bind())
+        for name, table, columns in INDEXES:
+            if not inspector.has_table(table):
+                continue
+            op.create_index(name, table, columns, unique=False, postgresql_concurrently=True, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
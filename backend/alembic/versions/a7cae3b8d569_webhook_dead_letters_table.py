@@ -0,0 +1,42 @@
+"""webhook dead letters table
+
+Revision ID: a7cae3b8d569
+Revises: f6b9d2a7c458
+Create Date: 2026-10-18 19:16:03.320477
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7cae3b8d569'
+down_revision: Union[str, Sequence[str], None] = 'f6b9d2a7c458'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('webhook_dead_letters',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('delivery_id', sa.String(length=32), nullable=False),
+    sa.Column('event', sa.String(length=50), nullable=False),
+    sa.Column('url', sa.Text(), nullable=False),
+    sa.Column('payload', sa.Text(), nullable=False),
+    sa.Column('attempts', sa.Integer(), nullable=False),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True,
+    )
+    op.create_index(op.f('ix_webhook_dead_letters_id'), 'webhook_dead_letters', ['id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_webhook_dead_letters_delivery_id'), 'webhook_dead_letters', ['delivery_id'], unique=False, if_not_exists=True)
+    op.create_index(op.f('ix_webhook_dead_letters_created_at'), 'webhook_dead_letters', ['created_at'], unique=False, if_not_exists=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('webhook_dead_letters', if_exists=True)
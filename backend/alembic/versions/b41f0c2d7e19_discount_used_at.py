@@ -0,0 +1,30 @@
+"""discount used_at
+
+Revision ID: b41f0c2d7e19
+Revises: 76a662b9a70e
+Create Date: 2026-10-18 13:05:41.208317
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b41f0c2d7e19'
+down_revision: Union[str, Sequence[str], None] = '76a662b9a70e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable without default: a metadata-only change. Discounts used before this
+    # migration keep NULL and are left out of the per-day discount rollups.
+    op.add_column('discounts', sa.Column('used_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('discounts', 'used_at')
@@ -0,0 +1,36 @@
+"""discount campaign column
+
+Revision ID: c7d3e58a1f40
+Revises: b41f0c2d7e19
+Create Date: 2026-10-18 13:48:12.560194
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c7d3e58a1f40'
+down_revision: Union[str, Sequence[str], None] = 'b41f0c2d7e19'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('discounts', sa.Column('campaign', sa.String(length=50), nullable=True))
+    # CREATE INDEX CONCURRENTLY cannot run inside the migration transaction.
+    with op.get_context().autocommit_block():
+        op.create_index(
+            'ix_discounts_campaign', 'discounts', ['campaign'],
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_discounts_campaign', table_name='discounts', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('discounts', 'campaign')
@@ -0,0 +1,37 @@
+"""rate limit buckets table
+
+Revision ID: d4f7b0e5a236
+Revises: c3e6a9d4f125
+Create Date: 2026-10-18 19:09:05.472690
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4f7b0e5a236'
+down_revision: Union[str, Sequence[str], None] = 'c3e6a9d4f125'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # UNLOGGED: losing the buckets on a crash only resets the limits, so they skip the WAL.
+    op.create_table('rate_limit_buckets',
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('tokens', sa.Float(), nullable=False),
+    sa.Column('allowed', sa.Boolean(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('key'),
+    prefixes=['UNLOGGED'],
+    if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('rate_limit_buckets', if_exists=True)
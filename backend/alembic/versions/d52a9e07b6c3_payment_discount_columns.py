@@ -0,0 +1,36 @@
+"""payment discount columns
+
+Revision ID: d52a9e07b6c3
+Revises: c7d3e58a1f40
+Create Date: 2026-10-18 14:31:55.902417
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd52a9e07b6c3'
+down_revision: Union[str, Sequence[str], None] = 'c7d3e58a1f40'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Nullable columns without defaults: no table rewrite.
+    op.add_column('payments', sa.Column('discount_id', sa.Integer(), nullable=True))
+    op.add_column('payments', sa.Column('discount_amount', sa.Float(), nullable=True))
+    # NOT VALID skips scanning existing rows (they are all NULL anyway).
+    op.create_foreign_key(
+        'payments_discount_id_fkey', 'payments', 'discounts', ['discount_id'], ['id'], postgresql_not_valid=True
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_constraint('payments_discount_id_fkey', 'payments', type_='foreignkey')
+    op.drop_column('payments', 'discount_amount')
+    op.drop_column('payments', 'discount_id')
@@ -0,0 +1,66 @@
+"""user search indexes
+
+Revision ID: e8b61f4d0a27
+Revises: d52a9e07b6c3
+Create Date: 2026-10-18 15:12:37.118604
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from services.persian_text import SQL_TRANSLATE_FROM, SQL_TRANSLATE_TO
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e8b61f4d0a27'
+down_revision: Union[str, Sequence[str], None] = 'd52a9e07b6c3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 10000
+
+# SQL version of services.persian_text.search_name() for existing rows:
+# character mapping, ZWNJ -> space, diacritics removed, whitespace collapsed, lower-cased.
+SEARCH_NAME_SQL = f"""
+    NULLIF(lower(btrim(regexp_replace(
+        regexp_replace(
+            translate(coalesce(first_name, '') || ' ' || coalesce(last_name, ''), '{SQL_TRANSLATE_FROM}', '{SQL_TRANSLATE_TO}'),
+            '[\\u064b-\\u065f\\u0670\\u0640]', '', 'g'),
+        '\\s+', ' ', 'g'))), '')
+"""
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('users', sa.Column('search_name', sa.String(length=201), nullable=True))
+    op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+
+    with op.get_context().autocommit_block():
+        # Backfill in id ranges so no single transaction locks the whole table.
+        conn = op.get_bind()
+        max_id = conn.execute(sa.text("SELECT coalesce(max(id), 0) FROM users")).scalar()
+        for start in range(0, max_id + 1, BACKFILL_BATCH_SIZE):
+            conn.execute(
+                sa.text(f"UPDATE users SET search_name = {SEARCH_NAME_SQL} WHERE id >= :start AND id < :end"),
+                {"start": start, "end": start + BACKFILL_BATCH_SIZE},
+            )
+        op.create_index(
+            'ix_users_phone_number_prefix', 'users', ['phone_number'],
+            postgresql_ops={'phone_number': 'varchar_pattern_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_users_search_name_trgm', 'users', ['search_name'],
+            postgresql_using='gin', postgresql_ops={'search_name': 'gin_trgm_ops'},
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_users_search_name_trgm', table_name='users', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_phone_number_prefix', table_name='users', postgresql_concurrently=True, if_exists=True)
+    op.drop_column('users', 'search_name')
@@ -0,0 +1,51 @@
+"""hot query indexes
+
+Revision ID: e99fcfac935d
+Revises: 9403cc4527e2
+Create Date: 2026-10-18 10:41:55.730615
+
+Indexes for the filters the CRUD layer actually runs. Some of the query
+patterns are already served by earlier revisions:
+- reservations(user_id, date) and payments(user_id, created_at) by the
+  keyset pagination indexes of 9403cc4527e2;
+- otp_codes(phone_number, code) by the unique otp_codes.phone_number index
+  of 8cbdcd1dac4c (there is at most one row per phone).
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e99fcfac935d'
+down_revision: Union[str, Sequence[str], None] = '9403cc4527e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, columns, partial index predicate)
+INDEXES = [
+    ('ix_reservations_active_date_coworker', 'reservations', ['date', 'coworker_id'], "status <> 'cancelled'"),
+    ('ix_payments_reservation_id', 'payments', ['reservation_id'], None),
+    ('ix_discounts_user_id_used_created_at', 'discounts', ['user_id', 'used', 'created_at'], None),
+    ('ix_referrals_invited_phone', 'referrals', ['invited_phone'], None),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+    with op.get_context().autocommit_block():
+        for name, table, columns, where in INDEXES:
+            op.create_index(
+                name, table, columns, unique=False,
+                postgresql_where=sa.text(where) if where else None,
+                postgresql_concurrently=True, if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
@@ -0,0 +1,99 @@
+"""occasion month-day columns
+
+Revision ID: f3a9c61d2b84
+Revises: e8b61f4d0a27
+Create Date: 2026-10-18 17:40:12.503318
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from services.persian_calendar import jalali_month_day
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a9c61d2b84'
+down_revision: Union[str, Sequence[str], None] = 'e8b61f4d0a27'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BACKFILL_BATCH_SIZE = 5000
+
+
+def _backfill(conn, table: str, key: str, columns: dict):
+    """
+    Fills the month-day columns ({target: source}) in key order, one short transaction per batch.
+    The Jalali conversion (and, for the CRM's free-text dates, the parsing) happens in Python.
+    """
+    sources = ", ".join(columns.values())
+    assignments = ", ".join(f"{target} = :{target}" for target in columns)
+    last = None
+    while True:
+        rows = conn.execute(
+            sa.text(
+                f"SELECT {key}, {sources} FROM {table}"
+                + (f" WHERE {key} > :last" if last is not None else "")
+                + f" ORDER BY {key} LIMIT {BACKFILL_BATCH_SIZE}"
+            ),
+            {"last": last},
+        ).all()
+        if not rows:
+            return
+        params = [
+            dict({target: jalali_month_day(value) for target, value in zip(columns, row[1:])}, key=row[0])
+            for row in rows
+        ]
+        conn.execute(sa.text(f"UPDATE {table} SET {assignments} WHERE {key} = :key"), params)
+        last = rows[-1][0]
+
+
+def _has_crm(conn) -> bool:
+    # customers_crm belongs to the separate CRM app and only exists where that app created it.
+    return sa.inspect(conn).has_table('customers_crm')
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    conn = op.get_bind()
+    has_crm = _has_crm(conn)
+    op.add_column('users', sa.Column('birth_md', sa.SmallInteger(), nullable=True))
+    if has_crm:
+        op.add_column('customers_crm', sa.Column('birth_md', sa.SmallInteger(), nullable=True))
+        op.add_column('customers_crm', sa.Column('marriage_md', sa.SmallInteger(), nullable=True))
+
+    with op.get_context().autocommit_block():
+        _backfill(conn, 'users', 'id', {'birth_md': 'birth_date'})
+        op.create_index(
+            'ix_users_birth_md_id', 'users', ['birth_md', 'id'],
+            postgresql_where=sa.text('birth_md IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        if not has_crm:
+            return
+        _backfill(conn, 'customers_crm', 'customer_id', {'birth_md': 'birth_date', 'marriage_md': 'marriage_date'})
+        op.create_index(
+            'ix_customers_crm_birth_md', 'customers_crm', ['birth_md'],
+            postgresql_where=sa.text('birth_md IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+        op.create_index(
+            'ix_customers_crm_marriage_md', 'customers_crm', ['marriage_md'],
+            postgresql_where=sa.text('marriage_md IS NOT NULL'),
+            postgresql_concurrently=True, if_not_exists=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    has_crm = _has_crm(op.get_bind())
+    with op.get_context().autocommit_block():
+        if has_crm:
+            op.drop_index('ix_customers_crm_marriage_md', table_name='customers_crm', postgresql_concurrently=True, if_exists=True)
+            op.drop_index('ix_customers_crm_birth_md', table_name='customers_crm', postgresql_concurrently=True, if_exists=True)
+        op.drop_index('ix_users_birth_md_id', table_name='users', postgresql_concurrently=True, if_exists=True)
+    if has_crm:
+        op.drop_column('customers_crm', 'marriage_md', if_exists=True)
+        op.drop_column('customers_crm', 'birth_md', if_exists=True)
+    op.drop_column('users', 'birth_md')
@@ -0,0 +1,47 @@
+"""daily reporting rollup tables
+
+Revision ID: f6b9d2a7c458
+Revises: e5a8c1f6b347
+Create Date: 2026-10-18 19:13:46.781203
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f6b9d2a7c458'
+down_revision: Union[str, Sequence[str], None] = 'e5a8c1f6b347'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Created empty; fill them with backfill_rollups.py once this revision is applied.
+    op.create_table('daily_booking_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('service_type', sa.String(length=50), nullable=False),
+    sa.Column('coworker_id', sa.Integer(), nullable=False),
+    sa.Column('bookings', sa.Integer(), nullable=False),
+    sa.Column('cancellations', sa.Integer(), nullable=False),
+    sa.Column('payments', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'service_type', 'coworker_id'),
+    if_not_exists=True,
+    )
+    op.create_table('daily_discount_rollups',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('discount_type', sa.String(length=50), nullable=False),
+    sa.Column('applied', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'discount_type'),
+    if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('daily_discount_rollups', if_exists=True)
+    op.drop_table('daily_booking_rollups', if_exists=True)
@@ -1,8 +1,9 @@
 from pydantic import BaseModel, Field
-from typing import Optional
-from sqlalchemy import Column, String, Integer, Boolean, DateTime
+from typing import List, Optional
+from sqlalchemy import Column, String, Integer, SmallInteger, Boolean, DateTime, Index, event, text
 from db import Base  # وارد کردن Base از فایل db.py
 from datetime import datetime
+from services.persian_calendar import jalali_month_day
 
 # --- ۱. مدل داده SQLAlchemy (جدول دیتابیس) ---
 class DBCustomer(Base):
@@ -16,6 +17,9 @@ class DBCustomer(Base):
     # فیلدهای بازاریابی و وفاداری
     birth_date = Column(String, nullable=True) # برای سهولت فعلاً String
     marriage_date = Column(String, nullable=True) # برای سهولت فعلاً String
+    # ماه و روز شمسی تاریخ‌های بالا (MMDD) برای کمپین‌های تولد و سالگرد؛ در هر ذخیره به‌روز می‌شوند
+    birth_md = Column(SmallInteger, nullable=True)
+    marriage_md = Column(SmallInteger, nullable=True)
     last_visit = Column(DateTime, nullable=True) # تاریخ آخرین مراجعه (Datetime)
     total_visits = Column(Integer, default=0)
     is_vip = Column(Boolean, default=False)
@@ -28,6 +32,20 @@ class DBCustomer(Base):
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    __table_args__ = (
+        # فیلتر دسته‌بندی + صفحه‌بندی کرسری روی customer_id
+        Index("ix_customers_crm_category_customer_id", "category", "customer_id"),
+        # «تولد/سالگرد امروز کیست؟» بدون اسکن کل جدول
+        Index("ix_customers_crm_birth_md", "birth_md", postgresql_where=text("birth_md IS NOT NULL")),
+        Index("ix_customers_crm_marriage_md", "marriage_md", postgresql_where=text("marriage_md IS NOT NULL")),
+    )
+
+@event.listens_for(DBCustomer, "before_insert")
+@event.listens_for(DBCustomer, "before_update")
+def _update_month_days(mapper, connection, customer):
+    customer.birth_md = jalali_month_day(customer.birth_date)
+    customer.marriage_md = jalali_month_day(customer.marriage_date)
+
 # --- ۲. مدل داده Pydantic (ورودی/خروجی API) ---
 class CustomerIn(BaseModel):
     """مدل Pydantic برای ایجاد/به‌روزرسانی مشتری (ورودی API)."""
@@ -66,3 +84,19 @@ class CustomerOut(BaseModel):
 class CustomerRoot(BaseModel):
     # این به FastAPI می‌گوید که انتظار یک کلید به نام 'body' در ریشه JSON داشته باش.
     body: CustomerIn
+
+class CustomerBulkError(BaseModel):
+    line: Optional[int] = None
+    error: str
+
+class CustomerBulkResult(BaseModel):
+    """نتیجه ورود گروهی مشتریان (POST /customer/bulk)."""
+    received: int
+    inserted: int
+    updated: int
+    merged: int
+    rejected: int
+    batches: int
+    elapsed_ms: float
+    records_per_second: float
+    errors: List[CustomerBulkError] = []
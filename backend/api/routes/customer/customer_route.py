@@ -1,10 +1,25 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from typing import List
+from fastapi import APIRouter, Depends, File, HTTPException, Query, Response, UploadFile, status
+from typing import List, Optional
 from sqlalchemy.orm import Session
-from sqlalchemy import exc
+from sqlalchemy import case, exc, func, literal_column, select
+from sqlalchemy.dialects.postgresql import insert
 from db import get_db, engine
-from ..customer.customer_model import DBCustomer, CustomerIn, CustomerOut, Base, CustomerRoot # وارد کردن CustomerRoot
+from ..customer.customer_model import DBCustomer, CustomerIn, CustomerOut, Base, CustomerRoot, CustomerBulkResult # وارد کردن CustomerRoot
 from datetime import datetime
+from crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, keyset_paginate
+from services.persian_calendar import jalali_month_day
+import csv
+import io
+import json
+import os
+import time
+
+# تعداد رکورد در هر upsert چندردیفی (و هر تراکنش) در ورود گروهی
+CUSTOMER_BULK_BATCH_SIZE = int(os.getenv("CUSTOMER_BULK_BATCH_SIZE", "1000"))
+# حداکثر خطاهایی که در پاسخ ورود گروهی برگردانده می‌شوند
+MAX_BULK_ERRORS = 100
+BULK_FIELDS = list(CustomerIn.model_fields)
+BULK_COLUMNS = BULK_FIELDS + ["birth_md", "marriage_md"]
 
 # --- ۱. تنظیمات Router ---
 router = APIRouter(
@@ -21,69 +36,192 @@ def get_customer_by_id(db: Session, customer_id: str):
     """مشتری را بر اساس customer_id از دیتابیس دریافت می‌کند."""
     return db.query(DBCustomer).filter(DBCustomer.customer_id == customer_id).first()
 
+def _parse_last_visit(value: Optional[str]) -> Optional[datetime]:
+    """رشته last_visit (مانند 2025-11-26 10:00:00) را به datetime تبدیل می‌کند؛ در صورت فرمت نادرست ValueError."""
+    if not value or not value.strip():
+        return None
+    return datetime.strptime(value.strip(), "%Y-%m-%d %H:%M:%S")
+
+def _customer_values(customer_in: CustomerIn, fields) -> dict:
+    """
+    مقادیر ستون‌ها برای INSERT/UPDATE. ستون‌های birth_md / marriage_md اینجا محاسبه می‌شوند،
+    چون رویدادهای ORM (before_insert/before_update) روی دستورات Core اجرا نمی‌شوند.
+    """
+    values = customer_in.model_dump(include=set(fields))
+    if "last_visit" in values:
+        values["last_visit"] = _parse_last_visit(customer_in.last_visit)
+    if "birth_date" in values:
+        values["birth_md"] = jalali_month_day(customer_in.birth_date)
+    if "marriage_date" in values:
+        values["marriage_md"] = jalali_month_day(customer_in.marriage_date)
+    return values
+
 # --- ۳. مسیرهای API ---
 
 @router.post("/", response_model=CustomerOut, status_code=201)
 def create_customer(customer_data: CustomerRoot, db: Session = Depends(get_db)):
-    """ایجاد یا به‌روزرسانی مشتری CRM."""
-    
+    """
+    ایجاد یا به‌روزرسانی مشتری CRM در یک رفت‌وبرگشت:
+    INSERT ... ON CONFLICT (customer_id) DO UPDATE ... total_visits = total_visits + 1 RETURNING *.
+    درخواست‌های هم‌زمان برای یک مشتری جدید هم دیگر روی کلید اصلی تداخل ندارند.
+    """
     # ۱. استخراج داده‌های واقعی مشتری از داخل CustomerRoot
     customer_in = customer_data.body # CustomerIn object
-    
-    # ۲. بررسی وجود مشتری در دیتابیس
-    db_customer = get_customer_by_id(db, customer_id=customer_in.customer_id)
-    
-    # ۳. تبدیل رشته‌های تاریخ به شیء datetime
-    last_visit_dt = None
-    if customer_in.last_visit:
-        try:
-            # سعی می‌کنیم فرمت‌های مختلف تاریخ را بپذیریم (مانند 2025-11-26 10:00:00)
-            fmt = "%Y-%m-%d %H:%M:%S" if len(customer_in.last_visit.strip()) > 16 else "%Y-%m-%d %H:%M:%S"
-            last_visit_dt = datetime.strptime(customer_in.last_visit.strip(), fmt)
-        except ValueError:
-            raise HTTPException(status_code=400, detail="فرمت زمان last_visit معتبر نیست. نمونه صحیح: 2025-11-25 10:00:00")
-            
-    # تبدیل CustomerIn به دیکشنری برای SQLAlchemy (فقط فیلدهای ست شده)
-    customer_data_dict = customer_in.model_dump(exclude_unset=True)
-
-    if db_customer:
-        # الف) به‌روزرسانی (Update)
-        for key, value in customer_data_dict.items():
-            # last_visit باید به صورت شیء datetime تنظیم شود
-            if key == 'last_visit':
-                setattr(db_customer, key, last_visit_dt)
-            # از به‌روزرسانی customer_id جلوگیری می‌کنیم و بقیه فیلدها را تنظیم می‌کنیم
-            elif key != 'customer_id':
-                setattr(db_customer, key, value)
-        
-        # افزایش total_visits
-        db_customer.total_visits = (db_customer.total_visits or 0) + 1
-        
-        try:
-            db.commit()
-            db.refresh(db_customer)
-        except exc.SQLAlchemyError as e:
-            db.rollback()
-            raise HTTPException(status_code=500, detail=f"Database error on update: {e}")
-        return db_customer
-        
-    else:
-        # ب) ایجاد مشتری جدید (Create)
-        new_customer_data = customer_data_dict
-        new_customer_data['last_visit'] = last_visit_dt
-        new_customer_data['total_visits'] = 1 # اولین مراجعه
-        
-        new_customer = DBCustomer(**new_customer_data)
-        
+
+    # ۲. فقط فیلدهای ارسال‌شده به‌روزرسانی می‌شوند (customer_id هرگز)
+    try:
+        values = _customer_values(customer_in, customer_in.model_fields_set | {"customer_id"})
+    except ValueError:
+        raise HTTPException(status_code=400, detail="فرمت زمان last_visit معتبر نیست. نمونه صحیح: 2025-11-25 10:00:00")
+    now = datetime.utcnow()
+    update_values = {key: value for key, value in values.items() if key != "customer_id"}
+
+    # ۳. درج با اولین مراجعه، یا به‌روزرسانی و افزایش total_visits
+    stmt = insert(DBCustomer).values(**values, total_visits=1, created_at=now, updated_at=now)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBCustomer.customer_id],
+        set_=dict(update_values, total_visits=func.coalesce(DBCustomer.total_visits, 0) + 1, updated_at=now),
+    ).returning(DBCustomer)
+
+    try:
+        customer = db.scalars(
+            select(DBCustomer).from_statement(stmt).execution_options(populate_existing=True)
+        ).one()
+        # جدا کردن شیء تا commit آن را منقضی نکند (بدون کوئری refresh)
+        db.expunge(customer)
+        db.commit()
+    except exc.SQLAlchemyError as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"Database error on upsert: {e}")
+    return customer
+
+
+# --- ورود گروهی مشتریان ---
+
+def _read_records(upload: UploadFile, fmt: str):
+    """
+    رکوردها را به صورت (شماره خط، داده) به ترتیب فایل برمی‌گرداند، بدون بارگذاری کل فایل در حافظه.
+    داده برای CSV یک دیکشنری و برای JSON lines متن خام همان خط است.
+    """
+    stream = io.TextIOWrapper(upload.file, encoding="utf-8-sig")
+    if fmt == "csv":
+        reader = csv.DictReader(stream)
+        for row in reader:
+            # سلول‌های خالی یعنی «مقداری ارسال نشده»
+            yield reader.line_num, {key.strip(): value for key, value in row.items() if key and value not in (None, "")}
+        return
+    for line_number, line in enumerate(stream, start=1):
+        if line.strip():
+            yield line_number, line
+
+def _upsert_batch(db: Session, records: List[CustomerIn]):
+    """
+    یک دسته را با یک INSERT ... ON CONFLICT چندردیفی ذخیره می‌کند. رکوردهای تکراری یک مشتری در دسته
+    ادغام می‌شوند (هر کدام یک مراجعه) و فیلدهای خالی مقدار قبلی را تغییر نمی‌دهند.
+    برمی‌گرداند: (تعداد درج‌شده، تعداد به‌روزشده)
+    """
+    now = datetime.utcnow()
+    merged = {}
+    for record in records:
+        values = {key: value for key, value in _customer_values(record, BULK_FIELDS).items() if value is not None}
+        row = merged.setdefault(record.customer_id, dict(total_visits=0))
+        row.update(values)
+        row["total_visits"] += 1
+    rows = [
+        dict({field: None for field in BULK_COLUMNS}, **row, created_at=now, updated_at=now)
+        for _, row in sorted(merged.items())
+    ]
+    for row in rows:
+        row["category"] = row["category"] or "جدید"
+
+    stmt = insert(DBCustomer).values(rows)
+    excluded = stmt.excluded
+    keep_existing = {
+        column: func.coalesce(getattr(excluded, column), getattr(DBCustomer, column))
+        for column in BULK_FIELDS if column not in ("customer_id", "category")
+    }
+    # ماه و روز همیشه همراه تاریخ خودش عوض می‌شود (حتی اگر تاریخ جدید قابل تبدیل نباشد)
+    for date_column, md_column in (("birth_date", "birth_md"), ("marriage_date", "marriage_md")):
+        keep_existing[md_column] = case(
+            (getattr(excluded, date_column).is_(None), getattr(DBCustomer, md_column)),
+            else_=getattr(excluded, md_column),
+        )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DBCustomer.customer_id],
+        set_=dict(
+            keep_existing,
+            # دسته‌بندی پیش‌فرض «جدید» نباید دسته فعلی مشتری موجود را بازنویسی کند
+            category=case((excluded.category == "جدید", DBCustomer.category), else_=excluded.category),
+            total_visits=func.coalesce(DBCustomer.total_visits, 0) + excluded.total_visits,
+            updated_at=now,
+        ),
+    ).returning(literal_column("xmax = 0"))
+    inserted = sum(1 for (is_insert,) in db.execute(stmt) if is_insert)
+    db.commit()
+    return inserted, len(rows) - inserted
+
+@router.post("/bulk", response_model=CustomerBulkResult)
+def bulk_upsert_customers(
+    file: UploadFile = File(..., description="JSON lines (یک CustomerIn در هر خط) یا CSV با سرستون‌های CustomerIn"),
+    format: Optional[str] = Query(None, pattern="^(jsonl|csv)$", description="در صورت خالی بودن از پسوند فایل تشخیص داده می‌شود"),
+    batch_size: int = Query(CUSTOMER_BULK_BATCH_SIZE, ge=1, le=5000),
+    db: Session = Depends(get_db),
+):
+    """
+    ورود گروهی مشتریان CRM: رکوردها به صورت جریانی خوانده و در دسته‌های batch_size با یک upsert
+    چندردیفی ذخیره می‌شوند (هر دسته یک تراکنش). رکوردهای نامعتبر رد شده و در errors گزارش می‌شوند.
+    """
+    fmt = format or ("csv" if (file.filename or "").lower().endswith(".csv") else "jsonl")
+    started = time.perf_counter()
+    received = inserted = updated = rejected = batches = 0
+    errors = []
+    batch: List[CustomerIn] = []
+
+    def flush():
+        nonlocal inserted, updated, batches
         try:
-            db.add(new_customer)
-            db.commit()
-            db.refresh(new_customer)
+            batch_inserted, batch_updated = _upsert_batch(db, batch)
         except exc.SQLAlchemyError as e:
             db.rollback()
-            raise HTTPException(status_code=500, detail=f"Database error on create: {e}")
+            raise HTTPException(status_code=500, detail=f"Database error on bulk upsert (after {inserted + updated} records): {e}")
+        inserted += batch_inserted
+        updated += batch_updated
+        batches += 1
+        batch.clear()
+
+    try:
+        for line_number, data in _read_records(file, fmt):
+            received += 1
+            try:
+                record = CustomerIn.model_validate(json.loads(data) if isinstance(data, str) else data)
+                _parse_last_visit(record.last_visit)
+            except (ValueError, TypeError) as e:
+                rejected += 1
+                if len(errors) < MAX_BULK_ERRORS:
+                    errors.append({"line": line_number, "error": str(e)[:300]})
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                flush()
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=400, detail=f"فایل قابل خواندن نیست (پس از {received} رکورد): {e}")
+    if batch:
+        flush()
 
-        return new_customer
+    elapsed = time.perf_counter() - started
+    print(f"CRM bulk import: {received} records, {inserted} inserted, {updated} updated, {rejected} rejected in {batches} batch(es), {elapsed:.2f}s")
+    return {
+        "received": received,
+        "inserted": inserted,
+        "updated": updated,
+        # چند رکورد یک مشتری در یک دسته، یک ردیف حساب می‌شوند
+        "merged": received - rejected - inserted - updated,
+        "rejected": rejected,
+        "batches": batches,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "records_per_second": round(received / elapsed, 1) if elapsed > 0 else float(received),
+        "errors": errors,
+    }
 
 
 @router.get("/{customer_id}", response_model=CustomerOut)
@@ -95,6 +233,21 @@ def read_customer(customer_id: str, db: Session = Depends(get_db)):
     return db_customer
 
 @router.get("/", response_model=List[CustomerOut])
-def list_customers(db: Session = Depends(get_db)):
-    """دریافت لیست تمامی مشتریان."""
-    return db.query(DBCustomer).all()
+def list_customers(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    is_vip: Optional[bool] = None,
+    db: Session = Depends(get_db),
+):
+    """دریافت لیست مشتریان به صورت صفحه‌بندی‌شده (کرسر صفحه بعد در هدر X-Next-Cursor)."""
+    query = db.query(DBCustomer)
+    if category is not None:
+        query = query.filter(DBCustomer.category == category)
+    if is_vip is not None:
+        query = query.filter(DBCustomer.is_vip == is_vip)
+    items, next_cursor = keyset_paginate(query, [DBCustomer.customer_id], limit=limit, cursor=cursor, descending=False)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
@@ -8,9 +8,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from sqlalchemy.orm import Session
 
-from database import get_db
+from database import SessionLocal, get_db
 from models import User
-from crud.crud_users import get_user_by_phone
+from crud.crud_users import get_user_by_phone, get_token_version
+from services.principal_cache import Principal, principal_cache, token_version_cache
 
 # --- Configuration ---
 # You must generate a secure secret key and set it as an environment variable
@@ -18,6 +19,11 @@ from crud.crud_users import get_user_by_phone
 SECRET_KEY = os.getenv("SECRET_KEY", "a_very_insecure_default_key_for_testing_only")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+# Roles that run the salon (may manage any reservation)
+STAFF_ROLES = {"admin", "manager", "coworker"}
+# Opt-in: embed user id, role, is_active and a revocation version in access tokens,
+# so get_current_principal can authorize requests without loading the user.
+JWT_SELF_CONTAINED_CLAIMS = os.getenv("JWT_SELF_CONTAINED_CLAIMS", "false").lower() == "true"
 
 # Password Hashing (even if using OTP now, this is good practice)
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
@@ -38,32 +44,110 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-# --- Dependency to get current user ---
-
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
+def create_user_access_token(db: Session, user: User) -> str:
     """
-    Decodes the token, validates it, and returns the current user from the database.
-    This is the core dependency for protecting routes.
+    Creates the access token for a logged-in user.
+    With JWT_SELF_CONTAINED_CLAIMS enabled the token also carries the claims
+    needed for authorization checks, stamped with the user's current token version.
     """
-    credentials_exception = HTTPException(
+    # The 'sub' (subject) of the token should be a unique identifier.
+    claims = {"sub": user.phone_number}
+    if JWT_SELF_CONTAINED_CLAIMS:
+        claims.update({
+            "uid": user.id,
+            "role": user.role,
+            "active": user.is_active,
+            "ver": get_token_version(db, user_id=user.id),
+        })
+    return create_access_token(data=claims)
+
+# --- Dependency to get current user ---
+
+def _credentials_exception(detail: str = "Could not validate credentials") -> HTTPException:
+    return HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
-        detail="Could not validate credentials",
+        detail=detail,
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> dict:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        phone: str = payload.get("sub")
-        if phone is None:
-            raise credentials_exception
     except JWTError:
-        raise credentials_exception
-    
+        raise _credentials_exception()
+    if payload.get("sub") is None:
+        raise _credentials_exception()
+    return payload
+
+def _load_principal(db: Session, phone: str) -> Principal:
+    principal = principal_cache.get(phone)
+    if principal is not None:
+        return principal
+
     user = get_user_by_phone(db, phone=phone)
     if user is None:
-        raise credentials_exception
-    return user
+        raise _credentials_exception()
+    principal = Principal.from_user(user)
+    principal_cache.set(phone, principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Decodes the token, validates it, and returns the current user.
+    The user is served from the in-process principal cache when possible and
+    only loaded from the database on a cache miss.
+    This is the core dependency for protecting routes. Inactive users are rejected.
+    """
+    payload = _decode_token(token)
+    principal = _load_principal(db, phone=payload["sub"])
+    if not principal.is_active:
+        raise _credentials_exception("Inactive user")
+    return principal
+
+def _authorize_principal(db: Session, token: str) -> Principal:
+    payload = _decode_token(token)
+    if "uid" in payload:
+        user_id = payload["uid"]
+        current_version = token_version_cache.get(user_id)
+        if current_version is None:
+            current_version = get_token_version(db, user_id=user_id)
+            token_version_cache.set(user_id, current_version)
+        if payload.get("ver") != current_version:
+            raise _credentials_exception("Token has been revoked")
+        principal = Principal(
+            id=user_id,
+            phone_number=payload["sub"],
+            role=payload.get("role", "customer"),
+            is_active=payload.get("active", True),
+        )
+    else:
+        principal = _load_principal(db, phone=payload["sub"])
+
+    if not principal.is_active:
+        raise _credentials_exception("Inactive user")
+    return principal
 
-def get_current_admin_user(current_user: User = Depends(get_current_user)) -> User:
+def get_current_principal(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> Principal:
+    """
+    Lightweight alternative to get_current_user for routes that only need id, phone and role.
+    Self-contained tokens are authorized from their claims plus a cached version check;
+    other tokens fall back to the cached user lookup. Inactive users are rejected.
+    """
+    return _authorize_principal(db, token)
+
+def get_stream_principal(token: str = Depends(oauth2_scheme)) -> Principal:
+    """
+    Same as get_current_principal for long-lived responses (e.g. SSE). get_db sessions are only
+    closed when the response ends, so this one uses its own session and closes it right away
+    instead of holding a pooled connection for as long as the client stays connected.
+    """
+    db = SessionLocal()
+    try:
+        return _authorize_principal(db, token)
+    finally:
+        db.close()
+
+def get_current_admin_user(current_user: Principal = Depends(get_current_user)) -> Principal:
     """
     A dependency that builds on get_current_user to ensure the user is an admin.
     """
@@ -73,3 +157,25 @@ def get_current_admin_user(current_user: User = Depends(get_current_user)) -> Us
             detail="The user does not have enough privileges",
         )
     return current_user
+
+def get_current_admin_principal(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    """
+    Same as get_current_admin_user, but built on the lightweight principal dependency.
+    """
+    if current_user.role != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The user does not have enough privileges",
+        )
+    return current_user
+
+def get_current_staff_principal(current_user: Principal = Depends(get_current_principal)) -> Principal:
+    """
+    Ensures the user is salon staff (admin, manager or coworker).
+    """
+    if current_user.role not in STAFF_ROLES:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="The user does not have enough privileges",
+        )
+    return current_user
@@ -0,0 +1,67 @@
+"""
+Rebuilds the reporting rollups (daily_booking_rollups, daily_discount_rollups)
+from reservations, payments and discounts.
+
+The rollups are kept up to date incrementally by the CRUD layer; run this once
+after deploying them, or to repair a range. The range is rebuilt in chunks, each
+in its own short transaction, so live writes are only held up briefly.
+
+Usage:
+    python backfill_rollups.py                                  # whole history
+    python backfill_rollups.py --from 2025-01-01 --to 2025-12-31
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import func
+
+from database import Base, SessionLocal, engine
+from models import Discount, Reservation
+from crud.crud_reports import rebuild_rollups
+
+
+def history_range(db):
+    first, last = db.query(func.min(Reservation.date), func.max(Reservation.date)).one()
+    first_used, last_used = db.query(func.min(Discount.used_at), func.max(Discount.used_at)).one()
+    days = [d.date() for d in (first, last, first_used, last_used) if d is not None]
+    if not days:
+        return None, None
+    return min(days), max(days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    parser.add_argument("--chunk-days", type=int, default=31, help="Days rebuilt per transaction.")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        first, last = history_range(db)
+        date_from = args.date_from or first
+        date_to = args.date_to or last
+        if date_from is None or date_to is None:
+            print("Nothing to backfill.")
+            return
+
+        started = time.perf_counter()
+        rows = 0
+        chunk_start = date_from
+        while chunk_start <= date_to:
+            chunk_end = min(chunk_start + timedelta(days=args.chunk_days - 1), date_to)
+            rows += rebuild_rollups(db, chunk_start, chunk_end)
+            print(f"  {chunk_start} .. {chunk_end}")
+            chunk_start = chunk_end + timedelta(days=1)
+        print(f"Rebuilt {rows} rollup rows for {date_from} .. {date_to} in {time.perf_counter() - started:.1f}s")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
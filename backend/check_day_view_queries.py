@@ -0,0 +1,87 @@
+"""
+Checks that the admin day view loads in a constant number of queries.
+
+For growing numbers of reservations on one day, the script seeds the rows inside
+a transaction, builds the day-view payload exactly as the endpoint does and
+counts the SQL statements executed. Everything is rolled back afterwards.
+
+Usage:
+    python check_day_view_queries.py [--sizes 1,10,100,500]
+"""
+import argparse
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from database import engine
+from models import Payment, Reservation, User
+from routers.reservations import _calendar
+
+
+def seed_day(db: Session, day: date, count: int):
+    """Creates `count` reservations on `day`, each with its own customer, a shared coworker and a payment."""
+    coworker = User(phone_number="09000000001", first_name="Check", last_name="Coworker", role="coworker",
+                    is_active=True, created_at=datetime.now())
+    db.add(coworker)
+    db.flush()
+    start = datetime.combine(day, datetime.min.time())
+    for i in range(count):
+        customer = User(phone_number=f"0980{i:07d}", first_name="Check", last_name=str(i), role="customer",
+                        is_active=True, created_at=datetime.now())
+        db.add(customer)
+        db.flush()
+        reservation = Reservation(user_id=customer.id, coworker_id=coworker.id, service_type="haircut",
+                                  date=start + timedelta(minutes=i), status="confirmed", payment_status="paid")
+        db.add(reservation)
+        db.flush()
+        db.add(Payment(user_id=customer.id, reservation_id=reservation.id, amount=1000, status="paid"))
+    db.flush()
+    db.expire_all()
+
+
+def count_queries(day: date, count: int) -> int:
+    conn = engine.connect()
+    outer = conn.begin()
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    statements = []
+
+    def capture(*args):
+        statements.append(args[2])
+
+    try:
+        seed_day(db, day, count)
+        event.listen(engine, "before_cursor_execute", capture)
+        try:
+            payload = _calendar(db, start_day=day, days=1, include_cancelled=False)
+        finally:
+            event.remove(engine, "before_cursor_execute", capture)
+        assert len(payload["reservations"]) >= count
+    finally:
+        db.close()
+        outer.rollback()
+        conn.close()
+    return len(statements)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="1,10,100,500")
+    args = parser.parse_args()
+
+    day = date(2099, 1, 1)  # far from real bookings
+    counts = {size: count_queries(day, size) for size in (int(s) for s in args.sizes.split(","))}
+    for size, queries in counts.items():
+        print(f"{size:>6} reservations -> {queries} queries")
+
+    if len(set(counts.values())) != 1:
+        print("FAIL: query count grows with the number of reservations")
+        raise SystemExit(1)
+    print("OK: query count is constant")
+
+
+if __name__ == "__main__":
+    main()
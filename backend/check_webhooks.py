@@ -0,0 +1,131 @@
+"""
+End-to-end check of the webhook dispatcher against a local stub server.
+
+Starts an HTTP server on localhost that plays the receiver (n8n):
+  /flaky  answers 503 to the first attempt of every delivery, then 200
+  /slow   sleeps --slow-seconds before answering 200
+  /gone   always answers 410 (not retryable)
+and sends --deliveries webhooks to each path through a WebhookDispatcher.
+Checks that submit() never waits for the receiver, that every signature
+verifies, that flaky deliveries arrive exactly once after a retry, and that
+the /gone deliveries land in webhook_dead_letters (removed again afterwards).
+
+Usage:
+    python check_webhooks.py --deliveries 50 --workers 4
+"""
+import argparse
+import os
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+load_dotenv()
+
+# Short backoff so the retries happen within the run
+os.environ.setdefault("WEBHOOK_BACKOFF_SECONDS", "0.2")
+
+from database import Base, SessionLocal, engine
+from models import WebhookDeadLetter
+from services.webhook_dispatcher import WebhookDispatcher, verify_signature
+
+STUB_SECRET = "stub-secret"
+STUB_EVENT = "stub.test"
+
+
+class StubReceiver(BaseHTTPRequestHandler):
+    attempts = Counter()  # delivery id -> requests seen
+    accepted = Counter()  # delivery id -> 2xx answers
+    bad_signatures = 0
+    slow_seconds = 1.0
+    lock = threading.Lock()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        delivery_id = self.headers.get("X-Webhook-Id")
+        signed = verify_signature(STUB_SECRET, self.headers.get("X-Webhook-Timestamp", ""), body,
+                                  self.headers.get("X-Webhook-Signature", ""))
+        with self.lock:
+            StubReceiver.attempts[delivery_id] += 1
+            first_attempt = StubReceiver.attempts[delivery_id] == 1
+            if not signed:
+                StubReceiver.bad_signatures += 1
+
+        if self.path == "/gone":
+            status = 410
+        elif self.path == "/flaky" and first_attempt:
+            status = 503
+        else:
+            if self.path == "/slow":
+                time.sleep(self.slow_seconds)
+            status = 200
+        if status == 200:
+            with self.lock:
+                StubReceiver.accepted[delivery_id] += 1
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--deliveries", type=int, default=50, help="Webhooks per stub path.")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--slow-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    StubReceiver.slow_seconds = args.slow_seconds
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubReceiver)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    dispatcher = WebhookDispatcher(secret=STUB_SECRET, workers=args.workers, max_attempts=3, timeout=args.slow_seconds + 5)
+    submitted = {}
+    started = time.perf_counter()
+    for path in ("/slow", "/flaky", "/gone"):
+        submitted[path] = [
+            dispatcher.submit(base_url + path, STUB_EVENT, {"n": i, "first_name": "تست"}).delivery_id
+            for i in range(args.deliveries)
+        ]
+    submit_ms = (time.perf_counter() - started) * 1000
+    idle = dispatcher.wait_idle(timeout=args.deliveries * args.slow_seconds + 60)
+    elapsed = time.perf_counter() - started
+    dispatcher.stop()
+    server.shutdown()
+
+    db = SessionLocal()
+    try:
+        dead = db.query(WebhookDeadLetter).filter(WebhookDeadLetter.event == STUB_EVENT).all()
+        dead_ids = {row.delivery_id for row in dead}
+        db.query(WebhookDeadLetter).filter(WebhookDeadLetter.event == STUB_EVENT).delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+    total = 3 * args.deliveries
+    print(f"Submitted {total} webhooks in {submit_ms:.1f} ms ({submit_ms / total:.3f} ms each); "
+          f"all settled in {elapsed:.1f}s with {args.workers} workers. Stats: {dispatcher.stats}")
+    checks = {
+        "dispatcher drained": idle,
+        "submit did not wait for the receiver": submit_ms < args.slow_seconds * 1000,
+        "all signatures valid": StubReceiver.bad_signatures == 0,
+        "slow deliveries accepted once": all(StubReceiver.accepted[i] == 1 for i in submitted["/slow"]),
+        "flaky deliveries retried and accepted once": all(
+            StubReceiver.attempts[i] == 2 and StubReceiver.accepted[i] == 1 for i in submitted["/flaky"]),
+        "gone deliveries dead-lettered after one attempt": all(
+            StubReceiver.attempts[i] == 1 and i in dead_ids for i in submitted["/gone"]),
+        "nothing else dead-lettered": len(dead_ids) == args.deliveries,
+    }
+    for name, ok in checks.items():
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+    if not all(checks.values()):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
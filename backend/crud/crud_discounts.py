@@ -1,55 +1,186 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import or_, select, update
+from sqlalchemy.dialects.postgresql import insert
 from datetime import datetime
 from fastapi import HTTPException
-from models import Discount
-from schemas import DiscountCreate
+from typing import List
+import os
+import time
+from models import Discount, User
+from schemas import DiscountCampaignCreate, DiscountCreate
+from crud import crud_reports
+from services.discount_codes import DISCOUNT_CODE_LENGTH, generate_codes
+
+# Rows per INSERT (and per transaction) when generating campaign codes
+DISCOUNT_CAMPAIGN_BATCH_SIZE = int(os.getenv("DISCOUNT_CAMPAIGN_BATCH_SIZE", "5000"))
+# Retries for the rare code that already exists in the table
+MAX_CODE_INSERT_ROUNDS = 5
+
+def _insert_discounts(db: Session, rows: List[dict], code_length: int = DISCOUNT_CODE_LENGTH) -> List[Discount]:
+    """
+    Inserts discounts with fresh codes in one multi-row INSERT ... ON CONFLICT (code) DO NOTHING RETURNING.
+    Rows whose code already exists in the table get a new code and are retried. Does not commit.
+    """
+    inserted = []
+    pending = rows
+    for _ in range(MAX_CODE_INSERT_ROUNDS):
+        codes = generate_codes(len(pending), length=code_length)
+        for row, code in zip(pending, codes):
+            row["code"] = code
+        stmt = (
+            insert(Discount)
+            .values(pending)
+            .on_conflict_do_nothing(index_elements=[Discount.code])
+            .returning(Discount)
+        )
+        batch = db.scalars(select(Discount).from_statement(stmt)).all()
+        inserted.extend(batch)
+        taken = {discount.code for discount in batch}
+        pending = [row for row in pending if row["code"] not in taken]
+        if not pending:
+            return inserted
+    raise HTTPException(status_code=500, detail="Could not generate unique discount codes.")
 
 # -------------------------------
 # Create discount for a user (called by admin)
 # -------------------------------
 def create_discount(db: Session, data: DiscountCreate):
-    """Creates a new discount record in the database."""
-    discount = Discount(
+    """Creates a new discount record in the database, with a freshly generated code."""
+    discount = _insert_discounts(db, [dict(
         user_id=data.user_id,
         discount_type=data.discount_type,
         percentage=data.percentage,
-        valid_until=data.valid_until,
+        expires_at=data.expires_at,
+        created_at=datetime.now(),
         used=False,
-    )
-    db.add(discount)
+    )])[0]
     db.commit()
-    db.refresh(discount)
     return discount
 
 # -------------------------------
-# Apply discount (mark as used by the owner)
+# Discount campaigns (bulk generation)
 # -------------------------------
-def apply_discount(db: Session, discount_id: int, user_id: int):
+def _segment_user_ids(db: Session, segment, batch_size: int):
+    """Yields the recipients' IDs in batches, walking the (role, id) index with keyset pagination."""
+    if segment.user_ids is not None:
+        user_ids = sorted(set(segment.user_ids))
+        for i in range(0, len(user_ids), batch_size):
+            # Unknown IDs are dropped instead of failing the whole batch on the foreign key.
+            yield db.scalars(
+                select(User.id).where(User.id.in_(user_ids[i:i + batch_size])).order_by(User.id)
+            ).all()
+        return
+
+    last_id = 0
+    while True:
+        query = select(User.id).where(User.id > last_id)
+        if segment.role is not None:
+            query = query.where(User.role == segment.role)
+        if segment.active_only:
+            query = query.where(User.is_active.is_(True))
+        batch = db.scalars(query.order_by(User.id).limit(batch_size)).all()
+        if not batch:
+            return
+        yield batch
+        last_id = batch[-1]
+
+def create_discount_campaign(db: Session, data: DiscountCampaignCreate, batch_size: int = DISCOUNT_CAMPAIGN_BATCH_SIZE):
     """
-    Marks a discount as used after verifying ownership and validity.
+    Gives every user of the segment one discount with a unique, random code.
+    Codes are generated collision-free in memory and written with one multi-row INSERT per batch,
+    each batch in its own short transaction, so large campaigns never hold locks for long.
+    Returns counts and throughput.
     """
-    discount = db.query(Discount).filter(Discount.id == discount_id).first()
+    started = time.perf_counter()
+    now = datetime.now()
+    recipients = created = batches = 0
+    codes = [] if data.return_codes else None
+
+    for user_ids in _segment_user_ids(db, data.segment, batch_size):
+        rows = [
+            dict(
+                user_id=user_id,
+                discount_type=data.discount_type,
+                percentage=data.percentage,
+                max_amount=data.max_amount,
+                expires_at=data.expires_at,
+                campaign=data.campaign,
+                created_at=now,
+                used=False,
+            )
+            for user_id in user_ids
+        ]
+        inserted = _insert_discounts(db, rows, code_length=data.code_length)
+        db.commit()
+        recipients += len(user_ids)
+        created += len(inserted)
+        batches += 1
+        if codes is not None:
+            codes.extend(discount.code for discount in inserted)
 
-    # --- Authorization and Validation ---
-    if not discount:
-        raise HTTPException(status_code=404, detail="Discount not found")
-    
-    if discount.user_id != user_id:
-        raise HTTPException(status_code=403, detail="You do not own this discount")
+    elapsed = time.perf_counter() - started
+    print(f"Discount campaign '{data.campaign}': {created} codes in {batches} batch(es), {elapsed:.2f}s")
+    return {
+        "campaign": data.campaign,
+        "recipients": recipients,
+        "created": created,
+        "batches": batches,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "codes_per_second": round(created / elapsed, 1) if elapsed > 0 else float(created),
+        "codes": codes,
+    }
 
-    if discount.used:
-        raise HTTPException(status_code=400, detail="Discount already used")
+# -------------------------------
+# Apply discount (mark as used by the owner)
+# -------------------------------
+def _redeem(db: Session, condition, user_id: int, commit: bool = True):
+    """
+    Marks the discount matching `condition` as used in one conditional UPDATE ... RETURNING,
+    so of any number of concurrent requests exactly one succeeds. Only when nothing matched is
+    the row read again, to tell the caller why. With commit=False the caller's transaction
+    (e.g. a payment) decides.
+    """
+    now = datetime.now()
+    stmt = (
+        update(Discount)
+        .where(
+            condition,
+            Discount.user_id == user_id,
+            Discount.used.is_(False),
+            or_(Discount.expires_at.is_(None), Discount.expires_at > now),
+        )
+        .values(used=True, used_at=now)
+        .returning(Discount)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    )
+    discount = db.scalars(stmt).first()
 
-    if discount.valid_until and discount.valid_until < datetime.utcnow():
+    if discount is None:
+        db.rollback()
+        existing = db.query(Discount.user_id, Discount.used, Discount.expires_at).filter(condition).first()
+        if existing is None:
+            raise HTTPException(status_code=404, detail="Discount not found")
+        if existing.user_id != user_id:
+            raise HTTPException(status_code=403, detail="You do not own this discount")
+        if existing.used:
+            raise HTTPException(status_code=409, detail="Discount already used")
         raise HTTPException(status_code=400, detail="Discount expired")
 
-    # --- Mark as used ---
-    discount.used = True
-    db.commit()
-    db.refresh(discount)
-    
+    crud_reports.record_discount_use(db, day=now.date(), discount_type=discount.discount_type)
+    if commit:
+        # Detach the returned row so commit does not expire it (no refresh query needed).
+        db.expunge(discount)
+        db.commit()
     return discount
 
+def apply_discount(db: Session, discount_id: int, user_id: int, commit: bool = True):
+    """Marks a discount as used if it belongs to the user, is unused and has not expired."""
+    return _redeem(db, Discount.id == discount_id, user_id, commit=commit)
+
+def redeem_discount_code(db: Session, code: str, user_id: int):
+    """Same as apply_discount, looked up by code through its unique index."""
+    return _redeem(db, Discount.code == code.strip().upper(), user_id)
+
 # -------------------------------
 # Get all discounts for a user
 # -------------------------------
@@ -0,0 +1,138 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import column, exists, inspect, or_, select, table
+from datetime import date, datetime, timedelta
+from fastapi import HTTPException
+from typing import List, Optional
+import os
+import time
+from models import Discount, User
+from crud.crud_discounts import DISCOUNT_CAMPAIGN_BATCH_SIZE, _insert_discounts
+from services import sms_outbox
+from services.persian_calendar import format_jalali, occasion_month_days
+
+OCCASIONS = ("birthday", "anniversary")
+OCCASION_DISCOUNT_PERCENT = int(os.getenv("OCCASION_DISCOUNT_PERCENT", "20"))
+OCCASION_DISCOUNT_VALID_DAYS = int(os.getenv("OCCASION_DISCOUNT_VALID_DAYS", "7"))
+# Also look up birthdays / marriage anniversaries recorded in the CRM (matched to users by phone number).
+# Off by default: customers_crm is owned by the separate CRM app and may not exist in this database.
+OCCASIONS_USE_CRM = os.getenv("OCCASIONS_USE_CRM", "false").lower() == "true"
+
+OCCASION_MESSAGES = {
+    "birthday": "{name} عزیز، تولدتان مبارک!\n{percentage}٪ تخفیف هدیه سالن متین مفهوم با کد {code} تا {expires}\nلغو11",
+    "anniversary": "{name} عزیز، سالگرد ازدواجتان مبارک!\n{percentage}٪ تخفیف هدیه سالن متین مفهوم با کد {code} تا {expires}\nلغو11",
+}
+
+# The CRM table belongs to the CRM app's metadata; only the columns used here are declared.
+customers_crm = table("customers_crm", column("customer_id"), column("birth_md"), column("marriage_md"))
+
+def _crm_available(db: Session) -> bool:
+    if not OCCASIONS_USE_CRM:
+        return False
+    if inspect(db.connection()).has_table("customers_crm"):
+        return True
+    print("WARNING: OCCASIONS_USE_CRM is set but customers_crm does not exist; using users.birth_date only")
+    return False
+
+def _recipient_sources(db: Session, occasion: str, month_days: List[int]):
+    """
+    One query per source, each answered from its own month-day index (an OR across the two
+    would make Postgres scan all users). CRM matches whose users.birth_md already matched are left
+    out, so nobody is counted twice, not even in a dry run.
+    """
+    base = select(User.id, User.phone_number, User.first_name).where(User.is_active.is_(True))
+    if occasion == "birthday":
+        yield base.where(User.birth_md.in_(month_days))
+    if _crm_available(db):
+        crm_md = customers_crm.c.birth_md if occasion == "birthday" else customers_crm.c.marriage_md
+        query = base.join(customers_crm, customers_crm.c.customer_id == User.phone_number).where(crm_md.in_(month_days))
+        if occasion == "birthday":
+            query = query.where(or_(User.birth_md.is_(None), User.birth_md.notin_(month_days)))
+        yield query
+
+def _recipients(db: Session, occasion: str, month_days: List[int], campaign: str, batch_size: int):
+    """
+    Yields batches of (id, phone_number, first_name), source by source in id order. Users who
+    already got this campaign's discount are skipped, so running the job twice on the same day
+    sends nothing twice.
+    """
+    rewarded = exists().where(Discount.campaign == campaign, Discount.user_id == User.id)
+    for query in _recipient_sources(db, occasion, month_days):
+        last_id = 0
+        while True:
+            batch = db.execute(
+                query.where(~rewarded, User.id > last_id).order_by(User.id).limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            yield batch
+            last_id = batch[-1].id
+
+def run_occasion_campaign(db: Session, occasion: str, day: Optional[date] = None, dry_run: bool = False,
+                          percentage: Optional[int] = None, valid_days: Optional[int] = None,
+                          batch_size: int = DISCOUNT_CAMPAIGN_BATCH_SIZE):
+    """
+    Gives everyone whose birthday / marriage anniversary (Jalali calendar) falls on `day` a personal
+    discount and queues a greeting SMS with the code. Each batch of discounts and its messages are
+    written with one multi-row INSERT each and committed together; the outbox worker delivers them.
+    With dry_run the recipients are only counted. Returns counts and throughput.
+    """
+    if occasion not in OCCASIONS:
+        raise HTTPException(status_code=400, detail=f"Unknown occasion: {occasion}")
+    started = time.perf_counter()
+    day = day or date.today()
+    percentage = percentage or OCCASION_DISCOUNT_PERCENT
+    expires_at = datetime.combine(day + timedelta(days=valid_days or OCCASION_DISCOUNT_VALID_DAYS), datetime.min.time())
+    month_days = occasion_month_days(day)
+    campaign = f"{occasion}-{day.isoformat()}"
+    template = OCCASION_MESSAGES[occasion]
+    now = datetime.now()
+    recipients = created = queued = batches = 0
+
+    for batch in _recipients(db, occasion, month_days, campaign, batch_size):
+        recipients += len(batch)
+        batches += 1
+        if dry_run:
+            continue
+        rows = [
+            dict(
+                user_id=user.id,
+                discount_type=occasion,
+                percentage=percentage,
+                expires_at=expires_at,
+                campaign=campaign,
+                created_at=now,
+                used=False,
+            )
+            for user in batch
+        ]
+        codes = {discount.user_id: discount.code for discount in _insert_discounts(db, rows)}
+        expires = format_jalali(expires_at.date() - timedelta(days=1))
+        queued += sms_outbox.enqueue_sms_batch(db, [
+            (user.phone_number, template.format(name=user.first_name or "مشتری", percentage=percentage, code=codes[user.id], expires=expires))
+            for user in batch
+        ])
+        db.commit()
+        created += len(codes)
+
+    if queued:
+        sms_outbox.notify()
+    elapsed = time.perf_counter() - started
+    print(f"Occasion campaign '{campaign}'{' (dry run)' if dry_run else ''}: {recipients} recipient(s), "
+          f"{created} discount(s), {queued} SMS queued in {batches} batch(es), {elapsed:.2f}s")
+    return {
+        "occasion": occasion,
+        "day": day,
+        "campaign": campaign,
+        "month_days": month_days,
+        "dry_run": dry_run,
+        "recipients": recipients,
+        "discounts_created": created,
+        "sms_queued": queued,
+        "batches": batches,
+        "elapsed_ms": round(elapsed * 1000, 1),
+        "recipients_per_second": round(recipients / elapsed, 1) if elapsed > 0 else float(recipients),
+    }
+
+def run_occasion_campaigns(db: Session, day: Optional[date] = None, occasions: Optional[List[str]] = None, **kwargs):
+    """Runs the daily job for every occasion (or the given ones)."""
+    return [run_occasion_campaign(db, occasion, day=day, **kwargs) for occasion in (occasions or OCCASIONS)]
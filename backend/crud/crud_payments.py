@@ -1,16 +1,37 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import func, update
 from fastapi import HTTPException
-from models import Payment, Reservation
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+import os
+from models import Payment, Referral, Reservation
 from schemas import PaymentCreate
+from crud import crud_discounts, crud_quotes, crud_reports
+from crud.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from services.referral_analytics import referral_analytics
+
+# Once the app always pays through POST /quotes, set this to stop trusting client-supplied amounts.
+PAYMENTS_REQUIRE_QUOTE = os.getenv("PAYMENTS_REQUIRE_QUOTE", "false").lower() == "true"
 
 # -------------------------------
 # Create or update a payment
 # -------------------------------
-def create_payment(db: Session, data: PaymentCreate):
+def create_payment(db: Session, data: PaymentCreate, before_commit: Optional[Callable] = None):
     """
     Creates a new payment for a reservation.
     It expects the user_id to be present in the 'data' schema.
+    With a quote token the amount comes from the quote, and the quote's discount and referral
+    bonus are consumed in the same transaction as the payment.
+    before_commit(payment) runs in the same transaction just before the commit.
     """
+    quote = None
+    if data.quote_token:
+        quote = crud_quotes.verify_quote(data.quote_token, user_id=data.user_id, reservation_id=data.reservation_id)
+    elif PAYMENTS_REQUIRE_QUOTE:
+        raise HTTPException(status_code=400, detail="A quote is required. Please request one from /quotes.")
+    elif data.amount is None:
+        raise HTTPException(status_code=400, detail="Either quote_token or amount is required.")
+
     # 1) Find the associated reservation
     reservation = db.query(Reservation).filter(Reservation.id == data.reservation_id).first()
     if not reservation:
@@ -28,34 +49,87 @@ def create_payment(db: Session, data: PaymentCreate):
         # if one already exists. Logic for updating a failed payment would go here.
         raise HTTPException(status_code=400, detail="A payment for this reservation already exists.")
 
-    # 3) Create new payment record
+    # 3) Consume what the quote was priced with; if either is gone, the quote is stale
+    if quote is not None:
+        if quote.get("did"):
+            try:
+                crud_discounts.apply_discount(db, discount_id=quote["did"], user_id=data.user_id, commit=False)
+            except HTTPException:
+                raise HTTPException(status_code=409, detail="The quoted discount is no longer available. Please request a new quote.")
+        if quote.get("ref"):
+            consumed = db.execute(
+                update(Referral)
+                .where(Referral.id == quote["ref"], Referral.used.is_(False))
+                .values(used=True)
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not consumed:
+                db.rollback()
+                raise HTTPException(status_code=409, detail="The quoted referral bonus was already used. Please request a new quote.")
+
+    # 4) Create new payment record
     new_payment = Payment(
         user_id=data.user_id,
         reservation_id=data.reservation_id,
-        amount=data.amount,
+        amount=quote["amt"] if quote is not None else data.amount,
+        discount_id=quote.get("did") if quote is not None else None,
+        discount_amount=quote.get("damt") if quote is not None else None,
         status="paid"  # Assume payment is successful upon creation
     )
     db.add(new_payment)
 
-    # 4) Update reservation payment status
-    reservation.payment_status = "paid"
-    
+    # 5) Update reservation payment status (and its version, so If-Match clients see the change)
+    db.execute(
+        update(Reservation)
+        .where(Reservation.id == reservation.id)
+        .values(payment_status="paid", version=Reservation.version + 1, updated_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+
+    # 6) Count the revenue towards the reservation's day in the reporting rollups
+    crud_reports.record_reservation(db, reservation, payments=1, revenue=new_payment.amount)
+
+    if before_commit is not None:
+        before_commit(new_payment)
     db.commit()
     db.refresh(new_payment)
     db.refresh(reservation) # Also refresh the reservation to get its updated state
-    
+    referral_analytics.mark_converted(data.user_id)
+
     return new_payment
 
+def sync_reservation_payments(db: Session, reservation, payment_status: str):
+    """
+    Makes a reservation's payments follow a payment_status change made on the reservation itself
+    (e.g. a refund through PATCH /reservations/{id}) and moves their revenue in the rollups.
+    Does not commit.
+    """
+    paid = payment_status == "paid"
+    amounts = db.scalars(
+        update(Payment)
+        .where(Payment.reservation_id == reservation.id, (Payment.status != "paid") if paid else (Payment.status == "paid"))
+        .values(status=payment_status)
+        .returning(Payment.amount)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if amounts:
+        sign = 1 if paid else -1
+        crud_reports.record_reservation(db, reservation, payments=sign * len(amounts), revenue=sign * sum(amounts))
+
 # -------------------------------
 # Get all payments for a user
 # -------------------------------
-def get_user_payments(db: Session, user_id: int):
-    return (
-        db.query(Payment)
-        .filter(Payment.user_id == user_id)
-        .order_by(Payment.created_at.desc())
-        .all()
-    )
+def get_user_payments(db: Session, user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                      status: Optional[str] = None, date_from=None, date_to=None):
+    """Retrieves one page of a user's payments, newest first. Returns (items, next_cursor)."""
+    query = db.query(Payment).filter(Payment.user_id == user_id)
+    if status is not None:
+        query = query.filter(Payment.status == status)
+    if date_from is not None:
+        query = query.filter(Payment.created_at >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.filter(Payment.created_at < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return keyset_paginate(query, [Payment.created_at, Payment.id], limit=limit, cursor=cursor)
 
 # -------------------------------
 # Get single payment
@@ -0,0 +1,113 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import or_, select
+from fastapi import HTTPException
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from jose import JWTError, jwt
+import os
+
+from models import Discount, Referral, Reservation
+from auth import ALGORITHM, SECRET_KEY
+from services.service_catalog import get_service_price
+
+# --- Quote Configuration ---
+# How long a quote can be paid with before a new one is needed
+QUOTE_TTL_SECONDS = int(os.getenv("QUOTE_TTL_SECONDS", "600"))
+# One-time bonus for an invited user who has not used their referral yet
+REFERRAL_DISCOUNT_PERCENT = int(os.getenv("REFERRAL_DISCOUNT_PERCENT", "10"))
+QUOTE_TOKEN_TYPE = "quote"
+
+def _discount_value(discount, price: float) -> float:
+    value = price * discount.percentage / 100
+    if discount.max_amount is not None:
+        value = min(value, discount.max_amount)
+    return float(round(value))
+
+# -------------------------------
+# Create a quote
+# -------------------------------
+def create_quote(db: Session, user_id: int, reservation_id: int, discount_code: Optional[str] = None):
+    """
+    Prices a reservation for its owner: the catalog price of the service minus the best usable
+    discount (or the given code) and a pending referral bonus. Runs two queries: the reservation
+    with the referral flag, then all usable discounts of the user at once.
+    Returns the breakdown and a signed, short-lived quote token for create_payment.
+    """
+    pending_referral = (
+        select(Referral.id)
+        .where(Referral.user_id == user_id, Referral.used.is_(False))
+        .order_by(Referral.id)
+        .limit(1)
+        .scalar_subquery()
+    )
+    reservation = db.execute(
+        select(
+            Reservation.id, Reservation.user_id, Reservation.service_type, Reservation.status,
+            Reservation.payment_status, pending_referral.label("referral_id"),
+        ).where(Reservation.id == reservation_id)
+    ).first()
+    if reservation is None:
+        raise HTTPException(status_code=404, detail="Reservation not found")
+    if reservation.user_id != user_id:
+        raise HTTPException(status_code=403, detail="Not authorized to pay for this reservation")
+    if reservation.payment_status == "paid" or reservation.status == "cancelled":
+        raise HTTPException(status_code=400, detail="This reservation cannot be paid")
+
+    now = datetime.now()
+    query = select(Discount.id, Discount.code, Discount.percentage, Discount.max_amount).where(
+        Discount.user_id == user_id,
+        Discount.used.is_(False),
+        or_(Discount.expires_at.is_(None), Discount.expires_at > now),
+    )
+    if discount_code:
+        query = query.where(Discount.code == discount_code.strip().upper())
+    discounts = db.execute(query).all()
+    if discount_code and not discounts:
+        raise HTTPException(status_code=400, detail="Discount code is not valid")
+
+    price = get_service_price(reservation.service_type)
+    best = max(discounts, key=lambda d: _discount_value(d, price), default=None)
+    discount_amount = _discount_value(best, price) if best else 0.0
+    referral_amount = float(round(price * REFERRAL_DISCOUNT_PERCENT / 100)) if reservation.referral_id else 0.0
+    amount = max(price - discount_amount - referral_amount, 0.0)
+
+    expires_at = datetime.now(timezone.utc) + timedelta(seconds=QUOTE_TTL_SECONDS)
+    token = jwt.encode(
+        {
+            "typ": QUOTE_TOKEN_TYPE,
+            "uid": user_id,
+            "rid": reservation.id,
+            "amt": amount,
+            "did": best.id if best else None,
+            "damt": discount_amount + referral_amount,
+            "ref": reservation.referral_id,
+            "exp": expires_at,
+        },
+        SECRET_KEY,
+        algorithm=ALGORITHM,
+    )
+    return {
+        "reservation_id": reservation.id,
+        "service_type": reservation.service_type,
+        "price": price,
+        "discount_id": best.id if best else None,
+        "discount_code": best.code if best else None,
+        "discount_amount": discount_amount,
+        "referral_amount": referral_amount,
+        "amount": amount,
+        "quote_token": token,
+        "expires_at": expires_at,
+    }
+
+# -------------------------------
+# Verify a quote (called by create_payment)
+# -------------------------------
+def verify_quote(token: str, user_id: int, reservation_id: int) -> dict:
+    """Checks signature, expiry, user and reservation of a quote token and returns its claims."""
+    try:
+        claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    except JWTError:
+        raise HTTPException(status_code=400, detail="Quote is invalid or has expired. Please request a new quote.")
+    if claims.get("typ") != QUOTE_TOKEN_TYPE or claims.get("uid") != user_id or claims.get("rid") != reservation_id:
+        raise HTTPException(status_code=400, detail="Quote does not match this payment.")
+    return claims
@@ -2,6 +2,7 @@ from sqlalchemy.orm import Session
 from fastapi import HTTPException
 from models import Referral, User
 from schemas import ReferralCreate
+from services.referral_analytics import full_name, public_stats, referral_analytics
 
 def create_referral(db: Session, referral: ReferralCreate, inviter_user: User):
     invited_user = db.query(User).filter(User.id == referral.invited_user_id).first()
@@ -18,9 +19,26 @@ def create_referral(db: Session, referral: ReferralCreate, inviter_user: User):
     db.add(db_referral)
     db.commit()
     db.refresh(db_referral)
+    referral_analytics.add_referral(
+        inviter_phone=inviter_user.phone_number, inviter_id=inviter_user.id,
+        inviter_name=full_name(inviter_user.first_name, inviter_user.last_name),
+        invitee_phone=invited_user.phone_number, invitee_id=invited_user.id,
+        invitee_name=full_name(invited_user.first_name, invited_user.last_name),
+    )
     return db_referral
 
 def get_referrals_by_user(db: Session, user_phone: str):
     # Now we get referrals based on the inviter's phone number
     return db.query(Referral).filter(Referral.invited_phone == user_phone).all()
 
+def get_referral_stats(db: Session, user_phone: str):
+    """Referral figures of one inviter, served from the cached referral graph."""
+    return referral_analytics.stats(db, user_phone)
+
+def get_referral_leaderboard(db: Session, limit: int = 10, public: bool = True):
+    """
+    Top inviters by direct invites, then converted invites, then network size.
+    Public entries carry masked names and no user ids; only admins get the full figures.
+    """
+    entries = referral_analytics.leaderboard(db, limit=limit)
+    return [public_stats(entry) for entry in entries] if public else entries
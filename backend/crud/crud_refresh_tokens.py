@@ -0,0 +1,103 @@
+import hashlib
+import os
+import secrets
+from datetime import datetime, timedelta
+
+from fastapi import HTTPException, status
+from sqlalchemy.orm import Session
+
+from models import RefreshToken, User
+
+REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "60"))
+
+
+def _hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _invalid_refresh_token(detail: str = "Invalid refresh token") -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail=detail,
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+
+
+def _new_token(db: Session, user_id: int, family_id: str):
+    token = secrets.token_urlsafe(48)
+    record = RefreshToken(
+        user_id=user_id,
+        token_hash=_hash_token(token),
+        family_id=family_id,
+        expires_at=datetime.now() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS),
+    )
+    db.add(record)
+    return token, record
+
+
+# -------------------------------
+# Issue a refresh token on login (starts a new family)
+# -------------------------------
+def issue_refresh_token(db: Session, user_id: int) -> str:
+    """Creates the first refresh token of a new session and returns its plaintext value."""
+    token, _ = _new_token(db, user_id=user_id, family_id=secrets.token_hex(16))
+    db.commit()
+    return token
+
+
+# -------------------------------
+# Rotate a refresh token
+# -------------------------------
+def rotate_refresh_token(db: Session, token: str):
+    """
+    Exchanges a valid refresh token for a new one in the same family and returns (user, new_token).
+    Presenting a token that was already rotated or revoked is treated as theft:
+    the whole family is revoked and the request is rejected.
+    """
+    now = datetime.now()
+    record = (
+        db.query(RefreshToken)
+        .filter(RefreshToken.token_hash == _hash_token(token))
+        .with_for_update()
+        .first()
+    )
+    if not record:
+        raise _invalid_refresh_token()
+
+    if record.revoked_at is not None:
+        revoke_family(db, family_id=record.family_id)
+        raise _invalid_refresh_token("Refresh token reuse detected; session revoked")
+
+    if record.expires_at < now:
+        raise _invalid_refresh_token("Refresh token expired")
+
+    user = db.query(User).filter(User.id == record.user_id).first()
+    if not user or not user.is_active:
+        revoke_family(db, family_id=record.family_id)
+        raise _invalid_refresh_token()
+
+    new_token, new_record = _new_token(db, user_id=record.user_id, family_id=record.family_id)
+    db.flush()
+    record.revoked_at = now
+    record.replaced_by_id = new_record.id
+    db.commit()
+    return user, new_token
+
+
+# -------------------------------
+# Revoke a session (logout / reuse detection)
+# -------------------------------
+def revoke_family(db: Session, family_id: str):
+    """Revokes every still-active token of a session family."""
+    db.query(RefreshToken).filter(
+        RefreshToken.family_id == family_id,
+        RefreshToken.revoked_at.is_(None),
+    ).update({RefreshToken.revoked_at: datetime.now()}, synchronize_session=False)
+    db.commit()
+
+
+def revoke_refresh_token(db: Session, token: str):
+    """Logs a session out by revoking the family of the given token. Unknown tokens are ignored."""
+    record = db.query(RefreshToken).filter(RefreshToken.token_hash == _hash_token(token)).first()
+    if record:
+        revoke_family(db, family_id=record.family_id)
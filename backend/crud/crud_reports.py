@@ -0,0 +1,155 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import and_, case, delete, func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from datetime import date, datetime, timedelta
+from typing import Iterable, Optional
+from models import DailyBookingRollup, DailyDiscountRollup, Discount, Payment, Reservation
+
+BOOKING_METRICS = ("bookings", "cancellations", "payments", "revenue")
+
+# -------------------------------
+# Incremental maintenance (called inside the writer's transaction)
+# -------------------------------
+def _coworker_key(coworker_id: Optional[int]) -> int:
+    return coworker_id if coworker_id is not None else 0
+
+def bump_booking_rollups(db: Session, rows: Iterable[dict]):
+    """
+    Adds deltas to the booking rollups with a single upsert. Each row holds day, service_type,
+    coworker_id and any of the BOOKING_METRICS. Does not commit: the deltas land together with
+    the change they describe, or not at all.
+    """
+    # One upsert cannot touch the same row twice, so merge deltas per key first
+    # (sorted, so concurrent writers lock rollup rows in the same order).
+    merged = {}
+    for row in rows:
+        key = (row["day"], row["service_type"], _coworker_key(row.get("coworker_id")))
+        totals = merged.setdefault(key, dict.fromkeys(BOOKING_METRICS, 0))
+        for metric in BOOKING_METRICS:
+            totals[metric] += row.get(metric, 0)
+    if not merged:
+        return
+    values = [
+        dict(day=day, service_type=service_type, coworker_id=coworker_id, **totals)
+        for (day, service_type, coworker_id), totals in sorted(merged.items())
+    ]
+    stmt = insert(DailyBookingRollup).values(values)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyBookingRollup.day, DailyBookingRollup.service_type, DailyBookingRollup.coworker_id],
+        set_={metric: getattr(DailyBookingRollup, metric) + getattr(stmt.excluded, metric) for metric in BOOKING_METRICS},
+    )
+    db.execute(stmt)
+
+def record_reservation(db: Session, reservation, **deltas):
+    """Shortcut for one reservation's rollup row, e.g. record_reservation(db, r, bookings=1)."""
+    bump_booking_rollups(db, [dict(
+        day=reservation.date.date(),
+        service_type=reservation.service_type,
+        coworker_id=reservation.coworker_id,
+        **deltas,
+    )])
+
+def record_discount_use(db: Session, day: date, discount_type: str):
+    """Counts one used discount. Does not commit."""
+    stmt = insert(DailyDiscountRollup).values(day=day, discount_type=discount_type, applied=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[DailyDiscountRollup.day, DailyDiscountRollup.discount_type],
+        set_={"applied": DailyDiscountRollup.applied + 1},
+    )
+    db.execute(stmt)
+
+# -------------------------------
+# Rebuild from the source tables
+# -------------------------------
+def rebuild_rollups(db: Session, date_from: date, date_to: date):
+    """
+    Recomputes both rollup tables for [date_from, date_to] from reservations, payments and discounts.
+    The rollup tables are locked against concurrent increments for the duration, so writers that
+    commit meanwhile are applied on top of the rebuilt rows instead of being lost or double counted.
+    Returns the number of rows written.
+    """
+    start = datetime.combine(date_from, datetime.min.time())
+    end = datetime.combine(date_to + timedelta(days=1), datetime.min.time())
+
+    db.execute(text("LOCK TABLE daily_booking_rollups, daily_discount_rollups IN SHARE ROW EXCLUSIVE MODE"))
+    db.execute(delete(DailyBookingRollup).where(DailyBookingRollup.day.between(date_from, date_to)))
+    db.execute(delete(DailyDiscountRollup).where(DailyDiscountRollup.day.between(date_from, date_to)))
+
+    paid = and_(Payment.id.isnot(None), Payment.status == "paid")
+    day = func.date(Reservation.date)
+    coworker = func.coalesce(Reservation.coworker_id, 0)
+    bookings = (
+        select(
+            day,
+            Reservation.service_type,
+            coworker,
+            func.count(Reservation.id.distinct()).label("bookings"),
+            func.count(Reservation.id.distinct()).filter(Reservation.status == "cancelled").label("cancellations"),
+            func.count(Payment.id).filter(paid).label("payments"),
+            func.coalesce(func.sum(case((paid, Payment.amount), else_=0)), 0).label("revenue"),
+        )
+        .select_from(Reservation)
+        .outerjoin(Payment, Payment.reservation_id == Reservation.id)
+        .where(Reservation.date >= start, Reservation.date < end)
+        .group_by(day, Reservation.service_type, coworker)
+    )
+    written = db.execute(
+        insert(DailyBookingRollup).from_select(["day", "service_type", "coworker_id", *BOOKING_METRICS], bookings)
+    ).rowcount
+
+    discounts = (
+        select(func.date(Discount.used_at), Discount.discount_type, func.count(Discount.id))
+        .where(Discount.used.is_(True), Discount.used_at >= start, Discount.used_at < end)
+        .group_by(func.date(Discount.used_at), Discount.discount_type)
+    )
+    written += db.execute(
+        insert(DailyDiscountRollup).from_select(["day", "discount_type", "applied"], discounts)
+    ).rowcount
+
+    db.commit()
+    return written
+
+# -------------------------------
+# Reports (read the rollups only)
+# -------------------------------
+def get_booking_report(db: Session, date_from: date, date_to: date, group_by: Optional[str] = None):
+    """
+    Per-day booking and revenue figures, optionally broken down by "service_type" or "coworker".
+    Reads at most one rollup row per day, service and coworker, however large the history is.
+    """
+    columns = [DailyBookingRollup.day]
+    if group_by == "service_type":
+        columns.append(DailyBookingRollup.service_type)
+    elif group_by == "coworker":
+        columns.append(DailyBookingRollup.coworker_id)
+    metrics = [func.sum(getattr(DailyBookingRollup, metric)).label(metric) for metric in BOOKING_METRICS]
+    rows = db.execute(
+        select(*columns, *metrics)
+        .where(DailyBookingRollup.day.between(date_from, date_to))
+        .group_by(*columns)
+        .order_by(*columns)
+    ).mappings().all()
+    return [
+        dict(row, coworker_id=row["coworker_id"] or None) if "coworker_id" in row else dict(row)
+        for row in rows
+    ]
+
+def get_discount_report(db: Session, date_from: date, date_to: date):
+    """Discounts used per day and discount type."""
+    return db.execute(
+        select(DailyDiscountRollup.day, DailyDiscountRollup.discount_type, DailyDiscountRollup.applied)
+        .where(DailyDiscountRollup.day.between(date_from, date_to))
+        .order_by(DailyDiscountRollup.day, DailyDiscountRollup.discount_type)
+    ).mappings().all()
+
+def get_report_summary(db: Session, date_from: date, date_to: date):
+    """Totals over the whole range."""
+    totals = db.execute(
+        select(*[func.coalesce(func.sum(getattr(DailyBookingRollup, metric)), 0).label(metric) for metric in BOOKING_METRICS])
+        .where(DailyBookingRollup.day.between(date_from, date_to))
+    ).mappings().one()
+    discounts_applied = db.execute(
+        select(func.coalesce(func.sum(DailyDiscountRollup.applied), 0))
+        .where(DailyDiscountRollup.day.between(date_from, date_to))
+    ).scalar_one()
+    return dict(totals, date_from=date_from, date_to=date_to, discounts_applied=discounts_applied)
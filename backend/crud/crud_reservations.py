@@ -1,35 +1,147 @@
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy import and_, case, column, or_, func, insert, select, text, update, values, DateTime, Integer
+from sqlalchemy.exc import OperationalError
 from fastapi import HTTPException
-from datetime import datetime
+from datetime import date as date_type, datetime, timedelta
+from typing import Callable, Optional
+import os
 
 from models import Reservation
-from schemas import ReservationCreate, ReservationUpdate
+from schemas import ReservationBulkCreate, ReservationCreate, ReservationUpdate
+from crud import crud_payments, crud_reports
+from crud.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from services.availability import availability_index
+from services.event_hub import publish_reservation
+from services.service_catalog import DEFAULT_SERVICE_DURATION_MINUTES, SERVICE_DURATIONS, get_service_duration, max_service_duration
+
+# How long a booking may wait for a concurrent booking of the same day / coworker before giving up.
+BOOKING_LOCK_TIMEOUT_MS = int(os.getenv("BOOKING_LOCK_TIMEOUT_MS", "5000"))
+# High 32 bits of the bigint advisory-lock keys used for per-day booking locks.
+_BOOKING_DAY_LOCK_NAMESPACE = 0x52455356  # "RESV"
 
 def get_reservation(db: Session, reservation_id: int):
     """Retrieves a single reservation by its ID."""
     return db.query(Reservation).filter(Reservation.id == reservation_id).first()
 
-def get_user_reservations(db: Session, user_id: int):
-    """Retrieves all reservations for a specific user."""
-    return db.query(Reservation).filter(Reservation.user_id == user_id).order_by(Reservation.date.desc()).all()
+def _filter_reservations(query, status=None, payment_status=None, date_from=None, date_to=None):
+    if status is not None:
+        query = query.filter(Reservation.status == status)
+    if payment_status is not None:
+        query = query.filter(Reservation.payment_status == payment_status)
+    if date_from is not None:
+        query = query.filter(Reservation.date >= datetime.combine(date_from, datetime.min.time()))
+    if date_to is not None:
+        query = query.filter(Reservation.date < datetime.combine(date_to + timedelta(days=1), datetime.min.time()))
+    return query
+
+def get_user_reservations(db: Session, user_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                          status=None, date_from=None, date_to=None):
+    """Retrieves one page of a user's reservations, newest first. Returns (items, next_cursor)."""
+    query = _filter_reservations(
+        db.query(Reservation).filter(Reservation.user_id == user_id),
+        status=status, date_from=date_from, date_to=date_to,
+    )
+    return keyset_paginate(query, [Reservation.date, Reservation.id], limit=limit, cursor=cursor)
+
+def get_all_reservations(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                         status=None, payment_status=None, date_from=None, date_to=None):
+    """Retrieves one page of all reservations, newest first (for admin). Returns (items, next_cursor)."""
+    query = _filter_reservations(
+        db.query(Reservation),
+        status=status, payment_status=payment_status, date_from=date_from, date_to=date_to,
+    )
+    return keyset_paginate(query, [Reservation.date, Reservation.id], limit=limit, cursor=cursor)
 
-def get_all_reservations(db: Session):
-    """Retrieves all reservations from the database (for admin)."""
-    return db.query(Reservation).order_by(Reservation.date.desc()).all()
+def get_reservations_calendar(db: Session, start_day: date_type, days: int = 1, include_cancelled: bool = False):
+    """
+    Retrieves the reservations of `days` days from `start_day` together with their customer,
+    coworker and payment in a fixed number of queries (one joined SELECT for the users, one
+    SELECT ... IN for the payments), however many reservations there are.
+    """
+    start = datetime.combine(start_day, datetime.min.time())
+    query = (
+        db.query(Reservation)
+        .options(
+            joinedload(Reservation.user),
+            joinedload(Reservation.coworker),
+            selectinload(Reservation.payment),
+        )
+        .filter(Reservation.date >= start, Reservation.date < start + timedelta(days=days))
+    )
+    if not include_cancelled:
+        query = query.filter(Reservation.status != "cancelled")
+    return query.order_by(Reservation.date, Reservation.id).all()
 
-def check_reservation_conflict(db: Session, date: datetime):
+def check_reservation_conflict(db: Session, date: datetime, service_type: Optional[str] = None, coworker_id: Optional[int] = None):
     """
-    Checks if a reservation already exists for a given datetime slot.
-    This is a simplified check. A real-world scenario would be more complex.
+    Returns a non-cancelled reservation that overlaps the requested slot, or None.
+    Overlap takes the duration of both services into account. With a coworker, only that
+    coworker's and unassigned reservations block the slot; without one, any reservation does.
     """
-    return db.query(Reservation).filter(Reservation.date == date, Reservation.status != "cancelled").first()
+    end = date + timedelta(minutes=get_service_duration(service_type))
+    query = db.query(Reservation).filter(
+        Reservation.status != "cancelled",
+        Reservation.date < end,
+        Reservation.date > date - timedelta(minutes=max_service_duration()),
+    )
+    if coworker_id is not None:
+        query = query.filter(or_(Reservation.coworker_id == coworker_id, Reservation.coworker_id.is_(None)))
+
+    for existing in query.all():
+        if existing.date + timedelta(minutes=get_service_duration(existing.service_type)) > date:
+            return existing
+    return None
+
+def booking_days(start: datetime, service_type: str):
+    """Every day the booking [start, start + duration) touches, in ascending order."""
+    end = start + timedelta(minutes=get_service_duration(service_type)) - timedelta(microseconds=1)
+    return [start.date() + timedelta(days=i) for i in range((end.date() - start.date()).days + 1)]
 
-def create_reservation(db: Session, reservation: ReservationCreate):
-    """Creates a new reservation record."""
+def lock_booking_slot(db: Session, day: date_type, coworker_id: Optional[int] = None):
+    """
+    Serializes bookings that could conflict, using transaction-scoped advisory locks:
+    - a booking for a coworker takes the day lock in shared mode plus an exclusive
+      (day, coworker) lock, so bookings for different coworkers run in parallel;
+    - a booking without a coworker conflicts with every lane and takes the day lock exclusively.
+    Bookings on other days never wait. The locks are released on commit or rollback.
+    A booking that runs past midnight must lock every day it touches (see booking_days), in
+    ascending order, so it serializes with bookings starting the next day without deadlocks.
+    """
+    day_key = (_BOOKING_DAY_LOCK_NAMESPACE << 32) | day.toordinal()
+    db.execute(text(f"SET LOCAL lock_timeout = {BOOKING_LOCK_TIMEOUT_MS}"))
+    if coworker_id is None:
+        db.execute(select(func.pg_advisory_xact_lock(day_key)))
+    else:
+        db.execute(select(
+            func.pg_advisory_xact_lock_shared(day_key),
+            func.pg_advisory_xact_lock(day.toordinal(), coworker_id),
+        ))
+
+def get_availability(db: Session, start_day, service_type: str, coworker_id: Optional[int] = None, days: int = 1):
+    """Returns the free start times per day, served from the in-memory availability index."""
+    return availability_index.free_slots(db, start_day, service_type=service_type, coworker_id=coworker_id, days=days)
+
+def create_reservation(db: Session, reservation: ReservationCreate, before_commit: Optional[Callable] = None):
+    """
+    Creates a new reservation record.
+    before_commit(reservation) runs in the same transaction just before the commit
+    (run_idempotent stores its response there).
+    """
     
-    # 1. Check for time conflicts
-    conflict = check_reservation_conflict(db, date=reservation.date)
+    # 1. Check for time conflicts while holding the booking locks for the booking's days / coworker,
+    #    so two concurrent requests cannot both pass the check.
+    try:
+        for day in booking_days(reservation.date, reservation.service_type):
+            lock_booking_slot(db, day=day, coworker_id=reservation.coworker_id)
+    except OperationalError:
+        db.rollback()
+        raise HTTPException(status_code=503, detail="Booking system is busy, please try again.")
+
+    conflict = check_reservation_conflict(
+        db, date=reservation.date, service_type=reservation.service_type, coworker_id=reservation.coworker_id
+    )
     if conflict:
+        db.rollback()
         raise HTTPException(
             status_code=409, # 409 Conflict is more appropriate
             detail="This time slot is already reserved.",
@@ -38,6 +150,7 @@ def create_reservation(db: Session, reservation: ReservationCreate):
     # 2. Create the new Reservation model instance
     db_reservation = Reservation(
         user_id=reservation.user_id,
+        coworker_id=reservation.coworker_id,
         service_type=reservation.service_type,
         date=reservation.date,
         notes=reservation.notes,
@@ -46,21 +159,166 @@ def create_reservation(db: Session, reservation: ReservationCreate):
     )
     
     db.add(db_reservation)
+    crud_reports.record_reservation(db, db_reservation, bookings=1)
+    if before_commit is not None:
+        before_commit(db_reservation)
     db.commit()
     db.refresh(db_reservation)
+    availability_index.refresh(db_reservation)
+    publish_reservation("created", db_reservation)
     return db_reservation
 
-def update_reservation(db: Session, reservation_id: int, data: ReservationUpdate):
-    """Updates a reservation's status or notes."""
-    db_reservation = get_reservation(db, reservation_id)
-    if not db_reservation:
-        raise HTTPException(status_code=404, detail="Reservation not found")
-    
-    update_data = data.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        setattr(db_reservation, key, value)
-        
+def _bulk_slots(data: ReservationBulkCreate):
+    if data.slots is not None:
+        return list(data.slots)
+    rule = data.recurrence
+    return [rule.start + timedelta(days=rule.interval_days * i) for i in range(rule.count)]
+
+def _find_bulk_conflicts(db: Session, slots, service_type: str, coworker_id: Optional[int]):
+    """
+    Checks every requested slot against existing bookings in one query: the slots are joined as a
+    VALUES list against live reservations, with the end of each existing booking computed from the
+    service catalog in SQL. Returns {slot index: conflicting reservation id}.
+    """
+    duration = timedelta(minutes=get_service_duration(service_type))
+    requested = values(
+        column("idx", Integer), column("start", DateTime), column("end", DateTime), name="requested"
+    ).data([(i, start, start + duration) for i, start in enumerate(slots)])
+    existing_duration = case(SERVICE_DURATIONS, value=Reservation.service_type, else_=DEFAULT_SERVICE_DURATION_MINUTES)
+    conditions = [
+        Reservation.status != "cancelled",
+        Reservation.date < requested.c.end,
+        # Bounds the index range scan; the exact overlap test follows.
+        Reservation.date > requested.c.start - timedelta(minutes=max_service_duration()),
+        Reservation.date + func.make_interval(0, 0, 0, 0, 0, existing_duration) > requested.c.start,
+    ]
+    if coworker_id is not None:
+        conditions.append(or_(Reservation.coworker_id == coworker_id, Reservation.coworker_id.is_(None)))
+    rows = db.execute(
+        select(requested.c.idx, func.min(Reservation.id))
+        .select_from(requested)
+        .join(Reservation, and_(*conditions))
+        .group_by(requested.c.idx)
+    ).all()
+    return {idx: reservation_id for idx, reservation_id in rows}
+
+def create_reservations_bulk(db: Session, user_id: int, data: ReservationBulkCreate, before_commit: Optional[Callable] = None):
+    """
+    Books a series of slots (explicit list or recurrence rule) in a single transaction:
+    one lock per affected day, one set-based conflict query, one multi-row INSERT and one commit.
+    Conflicting slots are skipped (or, with all_or_nothing, nothing is booked) and reported per slot.
+    before_commit(result) runs in the same transaction just before the commit.
+    """
+    slots = _bulk_slots(data)
+    duration = timedelta(minutes=get_service_duration(data.service_type))
+
+    # Lock the affected days in a fixed order so concurrent series cannot deadlock.
+    try:
+        for day in sorted({day for slot in slots for day in booking_days(slot, data.service_type)}):
+            lock_booking_slot(db, day=day, coworker_id=data.coworker_id)
+    except OperationalError:
+        db.rollback()
+        raise HTTPException(status_code=503, detail="Booking system is busy, please try again.")
+
+    conflicts = _find_bulk_conflicts(db, slots, data.service_type, data.coworker_id)
+
+    # Requested slots may also overlap each other (duplicates, intervals shorter than the service).
+    accepted = []
+    for i in sorted(range(len(slots)), key=lambda i: slots[i]):
+        if i in conflicts:
+            continue
+        if accepted and slots[accepted[-1]] + duration > slots[i]:
+            conflicts[i] = None
+            continue
+        accepted.append(i)
+
+    created = {}
+    if accepted and not (data.all_or_nothing and conflicts):
+        rows = [
+            dict(
+                user_id=user_id,
+                coworker_id=data.coworker_id,
+                service_type=data.service_type,
+                date=slots[i],
+                notes=data.notes,
+                status="pending",
+                payment_status="unpaid",
+            )
+            for i in accepted
+        ]
+        inserted = db.scalars(
+            insert(Reservation).returning(Reservation, sort_by_parameter_order=True), rows
+        ).all()
+        created = dict(zip(accepted, inserted))
+        crud_reports.bump_booking_rollups(db, [
+            dict(day=r.date.date(), service_type=r.service_type, coworker_id=r.coworker_id, bookings=1)
+            for r in inserted
+        ])
+        # Detach the returned rows so commit does not expire them (see update_reservation).
+        for db_reservation in inserted:
+            db.expunge(db_reservation)
+
+    results = []
+    for i, slot in enumerate(slots):
+        if i in created:
+            results.append({"date": slot, "status": "created", "reservation": created[i]})
+        elif i in conflicts:
+            results.append({"date": slot, "status": "conflict", "conflict_reservation_id": conflicts[i]})
+        else:
+            results.append({"date": slot, "status": "skipped"})
+    result = {"created": len(created), "conflicts": len(conflicts), "results": results}
+    if before_commit is not None:
+        before_commit(result)
     db.commit()
-    db.refresh(db_reservation)
-    return db_reservation
 
+    for db_reservation in created.values():
+        availability_index.refresh(db_reservation)
+        publish_reservation("created", db_reservation)
+    return result
+
+def update_reservation(db: Session, reservation_id: int, data: ReservationUpdate, expected_version: Optional[int] = None):
+    """
+    Updates a reservation's status, payment status or notes with a single conditional UPDATE ... RETURNING.
+    Cancellations and payment status changes (e.g. refunds) are applied to the reporting rollups.
+    With expected_version the update only applies if nobody changed the reservation in the
+    meantime; otherwise 412 is raised so the client can reload and retry.
+    """
+    update_data = data.model_dump(exclude_unset=True, mode="json")
+    # The previous statuses (locked, so they are the latest) are returned alongside the new row
+    # for the rollups.
+    previous = (
+        select(Reservation.id, Reservation.status, Reservation.payment_status)
+        .where(Reservation.id == reservation_id)
+        .with_for_update()
+        .subquery("previous")
+    )
+    stmt = update(Reservation).where(Reservation.id == previous.c.id)
+    if expected_version is not None:
+        stmt = stmt.where(Reservation.version == expected_version)
+    stmt = (
+        stmt.values(**update_data, version=Reservation.version + 1, updated_at=func.now())
+        .returning(Reservation, previous.c.status, previous.c.payment_status)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    )
+    row = db.execute(stmt).first()
+
+    if row is None:
+        db.rollback()
+        if get_reservation(db, reservation_id) is None:
+            raise HTTPException(status_code=404, detail="Reservation not found")
+        raise HTTPException(status_code=412, detail="Reservation was modified by someone else")
+
+    db_reservation, previous_status, previous_payment_status = row
+    was_cancelled, is_cancelled = previous_status == "cancelled", db_reservation.status == "cancelled"
+    if was_cancelled != is_cancelled:
+        crud_reports.record_reservation(db, db_reservation, cancellations=1 if is_cancelled else -1)
+    if (previous_payment_status == "paid") != (db_reservation.payment_status == "paid"):
+        crud_payments.sync_reservation_payments(db, db_reservation, db_reservation.payment_status)
+
+    # Detach the row returned by UPDATE ... RETURNING so commit does not expire it
+    # and serializing the response needs no extra SELECT.
+    db.expunge(db_reservation)
+    db.commit()
+    availability_index.refresh(db_reservation)
+    publish_reservation("cancelled" if db_reservation.status == "cancelled" else "updated", db_reservation)
+    return db_reservation
@@ -1,10 +1,17 @@
 from sqlalchemy.orm import Session
 from fastapi import HTTPException
 import random
-from datetime import datetime, timedelta, timezone
-from services import sms_service
-from models import User, OtpCode
-from schemas import UserRegister, UserUpdate
+from datetime import datetime
+from services import sms_outbox
+from services.otp_store import otp_store
+from sqlalchemy.dialects.postgresql import insert
+from services.principal_cache import principal_cache, token_version_cache
+from models import User, UserTokenVersion
+from schemas import UserRegister, UserUpdate, UserStatusUpdate
+from crud.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from typing import Optional
+from sqlalchemy import and_, func
+from services.persian_text import normalize_persian, normalize_phone_query
 
 def get_user_by_phone(db: Session, phone: str):
     """Retrieves a user by their phone number."""
@@ -14,9 +21,46 @@ def get_user_by_id(db: Session, user_id: int):
     """Retrieves a user by their ID."""
     return db.query(User).filter(User.id == user_id).first()
 
-def get_all_users(db: Session):
-    """Retrieves all users."""
-    return db.query(User).all()
+def get_all_users(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None,
+                  role: Optional[str] = None, is_active: Optional[bool] = None):
+    """Retrieves one page of users ordered by ID. Returns (items, next_cursor)."""
+    query = db.query(User)
+    if role is not None:
+        query = query.filter(User.role == role)
+    if is_active is not None:
+        query = query.filter(User.is_active == is_active)
+    return keyset_paginate(query, [User.id], limit=limit, cursor=cursor, descending=False)
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+def search_users(db: Session, q: str, limit: int = 10):
+    """
+    Typeahead search for admins. A numeric query matches phone-number prefixes through the
+    varchar_pattern_ops index; anything else must contain every word of the normalized query in
+    users.search_name (trigram index) and is ranked by similarity. Returns at most `limit` users.
+    """
+    phone = normalize_phone_query(q)
+    if phone is not None:
+        return (
+            db.query(User)
+            .filter(User.phone_number.like(phone + "%"))
+            .order_by(User.phone_number)
+            .limit(limit)
+            .all()
+        )
+
+    normalized = normalize_persian(q)
+    if not normalized:
+        return []
+    words = normalized.split(" ")
+    return (
+        db.query(User)
+        .filter(and_(*[User.search_name.like("%" + _escape_like(word) + "%", escape="\\") for word in words]))
+        .order_by(func.similarity(User.search_name, normalized).desc(), User.id)
+        .limit(limit)
+        .all()
+    )
 
 def create_user(db: Session, data: UserRegister):
     """Creates a new user record."""
@@ -37,36 +81,20 @@ def create_user(db: Session, data: UserRegister):
     return new_user
 
 def create_and_send_otp(db: Session, phone: str):
+    """Stores a fresh OTP for the phone (replacing any previous one) and queues its SMS."""
     code = str(random.randint(100000, 999999))
-    # Use naive datetime, which will be interpreted as Asia/Tehran by the DB
-    now = datetime.now()
-    expires_at = now + timedelta(minutes=3)
-    
-     # --- For Production: Enable real SMS sending ---
+    otp_store.save(db, phone=phone, code=code)
+
+    # --- The SMS is queued in the same transaction and delivered by the outbox worker ---
     message = f"کد ورود شما به سالن متین مفهوم: {code}\nلغو11"
-    sms_service.send_sms(phone_number=phone, message=message) # <--- فعال شد
+    sms_outbox.enqueue_sms(db, phone_number=phone, message=message)
     #print(f"--- OTP for {phone} is {code} ---")
-    db.query(OtpCode).filter(OtpCode.phone_number == phone).delete()
-    otp_record = OtpCode(
-        phone_number=phone,
-        code=code,
-        expires_at=expires_at,
-        created_at=now
-    )
-    db.add(otp_record)
     db.commit()
-    return otp_record
+    sms_outbox.notify()
 
 def verify_otp(db: Session, phone: str, code: str):
     """Verifies the OTP and creates a user if they don't exist."""
-    otp = db.query(OtpCode).filter(
-        OtpCode.phone_number == phone, 
-        OtpCode.code == code
-    ).order_by(OtpCode.id.desc()).first()
-    
-    # --- THE FINAL, CORRECT FIX ---
-    # We now use datetime.now() which is NAIVE, just like the data from the DB
-    if not otp or otp.expires_at < datetime.now():
+    if not otp_store.verify(db, phone=phone, code=code):
         raise HTTPException(status_code=400, detail="Invalid or expired OTP")
 
     user = get_user_by_phone(db, phone=phone)
@@ -100,5 +128,43 @@ def update_user(db: Session, user_id: int, data: UserUpdate):
         setattr(user, key, value)
     db.commit()
     db.refresh(user)
+    principal_cache.invalidate(user.phone_number)
     return {"user": user, "send_welcome_sms": is_first_profile_completion}
 
+
+def update_user_status(db: Session, user_id: int, data: UserStatusUpdate):
+    """Changes a user's role and/or active flag (admin operation)."""
+    user = get_user_by_id(db, user_id=user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    update_data = data.model_dump(exclude_unset=True)
+    for key, value in update_data.items():
+        setattr(user, key, value)
+    # Authorization data changed: revoke self-contained tokens that still carry the old claims.
+    bump_token_version(db, user_id=user.id)
+    db.commit()
+    db.refresh(user)
+    principal_cache.invalidate(user.phone_number)
+    token_version_cache.invalidate(user.id)
+    return user
+
+
+def get_token_version(db: Session, user_id: int) -> int:
+    """Returns the current access-token version of a user (0 if it was never bumped)."""
+    version = db.query(UserTokenVersion.version).filter(UserTokenVersion.user_id == user_id).scalar()
+    return version or 0
+
+
+def bump_token_version(db: Session, user_id: int) -> None:
+    """
+    Increments the user's access-token version in a single upsert.
+    The caller owns the transaction and must invalidate token_version_cache after commit.
+    """
+    stmt = insert(UserTokenVersion).values(user_id=user_id, version=1)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[UserTokenVersion.user_id],
+        set_={"version": UserTokenVersion.version + 1, "updated_at": datetime.now()},
+    )
+    db.execute(stmt)
+
@@ -0,0 +1,283 @@
+"""
+Runs EXPLAIN ANALYZE over the SQL emitted by every CRUD function and reports
+sequential scans on large tables.
+
+Each function runs inside an outer transaction that is rolled back at the end
+(the functions' own commits only release savepoints), so the database is left
+unchanged. Seed synthetic data first so the planner sees realistic table sizes.
+
+Usage:
+    python explain_crud.py --seed 200000      # insert synthetic rows (phones 099xxxxxxxx), then ANALYZE
+    python explain_crud.py                     # explain every CRUD function
+    python explain_crud.py --cleanup           # delete the synthetic rows
+"""
+import argparse
+import json
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi import HTTPException
+from sqlalchemy import event, exists, text
+from sqlalchemy.orm import Session
+
+from database import engine
+from models import Discount, Payment, Reservation, User
+from crud import crud_discounts, crud_occasions, crud_quotes, crud_reports, crud_payments, crud_referrals, crud_refresh_tokens, crud_reservations, crud_users
+from schemas import (
+    DiscountCampaignCreate, DiscountCreate, DiscountSegment, PaymentCreate, RecurrenceRule, ReferralCreate,
+    ReservationBulkCreate, ReservationCreate, ReservationUpdate, UserRegister, UserStatusUpdate, UserUpdate,
+)
+
+SEED_PHONE_PREFIX = "099"
+
+SEED_SQL = [
+    """
+    INSERT INTO users (phone_number, first_name, last_name, search_name, birth_md, role, is_active, created_at)
+    SELECT '099' || lpad(i::text, 8, '0'), 'Seed', 'User ' || i, 'seed user ' || i, (1 + i % 12) * 100 + 1 + i % 29,
+           CASE WHEN i % 500 = 0 THEN 'admin' WHEN i % 50 = 0 THEN 'coworker' ELSE 'customer' END,
+           i % 40 <> 0, now() - (i % 1000) * interval '1 day'
+    FROM generate_series(1, :n) AS i
+    ON CONFLICT (phone_number) DO NOTHING
+    """,
+    """
+    INSERT INTO reservations (user_id, coworker_id, service_type, date, status, payment_status, notes, created_at, updated_at)
+    SELECT u.id, NULL, (ARRAY['haircut','beard','haircut_beard','facial'])[1 + g % 4],
+           date_trunc('hour', now() - interval '730 days' + (random() * 900) * interval '1 day'),
+           (ARRAY['pending','confirmed','cancelled','done'])[1 + g % 4],
+           CASE WHEN g % 2 = 0 THEN 'paid' ELSE 'unpaid' END, 'seed', now(), now()
+    FROM users u CROSS JOIN generate_series(1, 5) AS g
+    WHERE u.phone_number LIKE '099%'
+    """,
+    """
+    INSERT INTO payments (user_id, reservation_id, amount, payment_type, status, created_at)
+    SELECT r.user_id, r.id, 500000, 'online', 'paid', r.date
+    FROM reservations r JOIN users u ON u.id = r.user_id
+    WHERE u.phone_number LIKE '099%' AND r.payment_status = 'paid'
+    """,
+    """
+    INSERT INTO discounts (user_id, code, discount_type, percentage, expires_at, created_at, used)
+    SELECT u.id, 'SEED' || u.id || '-' || g, 'seed', 10, now() + interval '30 days', now(), g = 1
+    FROM users u CROSS JOIN generate_series(1, 2) AS g
+    WHERE u.phone_number LIKE '099%'
+    ON CONFLICT (code) DO NOTHING
+    """,
+    """
+    INSERT INTO referrals (user_id, invited_phone, used, created_at)
+    SELECT u.id, '099' || lpad(((u.id * 7919) % :n + 1)::text, 8, '0'), false, now()
+    FROM users u
+    WHERE u.phone_number LIKE '099%' AND u.id % 2 = 0
+    """,
+]
+
+CLEANUP_SQL = [
+    "DELETE FROM referrals WHERE user_id IN (SELECT id FROM users WHERE phone_number LIKE '099%')",
+    "DELETE FROM discounts WHERE user_id IN (SELECT id FROM users WHERE phone_number LIKE '099%')",
+    "DELETE FROM payments WHERE user_id IN (SELECT id FROM users WHERE phone_number LIKE '099%')",
+    "DELETE FROM reservations WHERE user_id IN (SELECT id FROM users WHERE phone_number LIKE '099%')",
+    "DELETE FROM users WHERE phone_number LIKE '099%'",
+]
+
+
+def seed(rows: int):
+    with engine.begin() as conn:
+        for sql in SEED_SQL:
+            conn.execute(text(sql), {"n": rows})
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("ANALYZE"))
+    print(f"Seeded {rows} users and their reservations, payments, discounts and referrals.")
+
+
+def cleanup():
+    with engine.begin() as conn:
+        for sql in CLEANUP_SQL:
+            conn.execute(text(sql))
+    print("Removed synthetic rows.")
+
+
+def sample_ids(db: Session):
+    """Picks a seeded user that has reservations, payments and discounts to call the functions with."""
+    user = (
+        db.query(User)
+        .join(Reservation, Reservation.user_id == User.id)
+        .join(Payment, Payment.user_id == User.id)
+        .join(Discount, Discount.user_id == User.id)
+        .filter(User.phone_number.like(SEED_PHONE_PREFIX + "%"))
+        .first()
+    ) or db.query(User).first()
+    reservation = db.query(Reservation).filter(Reservation.user_id == user.id).first()
+    payment = db.query(Payment).filter(Payment.user_id == user.id).first()
+    unpaid = (
+        db.query(Reservation)
+        .filter(Reservation.user_id == user.id, ~exists().where(Payment.reservation_id == Reservation.id))
+        .first()
+    )
+    discount = db.query(Discount).filter(Discount.user_id == user.id).first()
+    other_user_id = db.query(User.id).filter(User.id != user.id).scalar()
+    return {
+        "user": user,
+        "other_user_id": other_user_id or 0,
+        "reservation_id": reservation.id if reservation else 0,
+        "unpaid_reservation_id": unpaid.id if unpaid else 0,
+        "payment_id": payment.id if payment else 0,
+        "discount_id": discount.id if discount else 0,
+        "discount_code": discount.code if discount else "-",
+    }
+
+
+def create_quoted_payment(db: Session, user: User, reservation_id: int):
+    quote = crud_quotes.create_quote(db, user_id=user.id, reservation_id=reservation_id)
+    return crud_payments.create_payment(db, PaymentCreate(user_id=user.id, reservation_id=reservation_id, quote_token=quote["quote_token"]))
+
+
+def crud_checks(ids):
+    """
+    (name, callable(db)) for every CRUD function the routers call. Write functions run too; everything
+    is rolled back. Helpers that only run through another function (rollup bumps, slot locks, token
+    version bumps, family revocation, quote verification, run_occasion_campaigns) are covered through
+    their callers; rebuild_rollups is a maintenance job (backfill_rollups.py) and is left out.
+    """
+    user = ids["user"]
+    slot = datetime.combine(date.today() + timedelta(days=400), datetime.min.time()) + timedelta(hours=10)
+    report_range = dict(date_from=date.today() - timedelta(days=365), date_to=date.today())
+    return [
+        ("crud_users.get_user_by_phone", lambda db: crud_users.get_user_by_phone(db, phone=user.phone_number)),
+        ("crud_users.get_user_by_id", lambda db: crud_users.get_user_by_id(db, user_id=user.id)),
+        ("crud_users.get_all_users", lambda db: crud_users.get_all_users(db, role="coworker")),
+        ("crud_users.search_users (phone)", lambda db: crud_users.search_users(db, q=user.phone_number[:6])),
+        ("crud_users.search_users (name)", lambda db: crud_users.search_users(db, q="user 123")),
+        ("crud_users.create_user", lambda db: crud_users.create_user(db, UserRegister(phone_number="09800000000", first_name="explain"))),
+        ("crud_users.update_user", lambda db: crud_users.update_user(db, user_id=user.id, data=UserUpdate(first_name=user.first_name, last_name=user.last_name))),
+        ("crud_users.update_user_status", lambda db: crud_users.update_user_status(db, user_id=user.id, data=UserStatusUpdate(is_active=True))),
+        ("crud_users.get_token_version", lambda db: crud_users.get_token_version(db, user_id=user.id)),
+        ("crud_users.create_and_send_otp", lambda db: crud_users.create_and_send_otp(db, phone=user.phone_number)),
+        ("crud_users.verify_otp", lambda db: crud_users.verify_otp(db, phone=user.phone_number, code="000000")),
+        ("crud_occasions.run_occasion_campaign (dry run)", lambda db: crud_occasions.run_occasion_campaign(db, "birthday", dry_run=True)),
+        ("crud_occasions.run_occasion_campaign", lambda db: crud_occasions.run_occasion_campaign(db, "birthday", batch_size=500)),
+        ("crud_reservations.get_reservation", lambda db: crud_reservations.get_reservation(db, ids["reservation_id"])),
+        ("crud_reservations.get_user_reservations", lambda db: crud_reservations.get_user_reservations(db, user_id=user.id)),
+        ("crud_reservations.get_all_reservations", lambda db: crud_reservations.get_all_reservations(db, status="pending")),
+        ("crud_reservations.get_reservations_calendar", lambda db: crud_reservations.get_reservations_calendar(db, start_day=slot.date(), days=7)),
+        ("crud_reservations.get_availability", lambda db: crud_reservations.get_availability(db, slot.date(), service_type="haircut", days=7)),
+        ("crud_reservations.check_reservation_conflict", lambda db: crud_reservations.check_reservation_conflict(db, date=slot, service_type="haircut")),
+        ("crud_reservations.create_reservation", lambda db: crud_reservations.create_reservation(
+            db, reservation=ReservationCreate(user_id=user.id, service_type="haircut", date=slot))),
+        ("crud_reservations.create_reservations_bulk", lambda db: crud_reservations.create_reservations_bulk(
+            db, user_id=user.id, data=ReservationBulkCreate(
+                service_type="haircut", recurrence=RecurrenceRule(start=slot, interval_days=14, count=6)))),
+        ("crud_reservations.update_reservation", lambda db: crud_reservations.update_reservation(
+            db, ids["reservation_id"], data=ReservationUpdate(notes="explain_crud"))),
+        ("crud_quotes.create_quote", lambda db: crud_quotes.create_quote(db, user_id=user.id, reservation_id=ids["reservation_id"])),
+        ("crud_payments.get_user_payments", lambda db: crud_payments.get_user_payments(db, user_id=user.id)),
+        ("crud_payments.get_payment", lambda db: crud_payments.get_payment(db, ids["payment_id"])),
+        ("crud_payments.create_payment (with quote)", lambda db: create_quoted_payment(db, user, ids["unpaid_reservation_id"])),
+        ("crud_discounts.get_user_discounts", lambda db: crud_discounts.get_user_discounts(db, user_id=user.id)),
+        ("crud_discounts.apply_discount", lambda db: crud_discounts.apply_discount(db, discount_id=ids["discount_id"], user_id=user.id)),
+        ("crud_discounts.redeem_discount_code", lambda db: crud_discounts.redeem_discount_code(db, code=ids["discount_code"], user_id=user.id)),
+        ("crud_discounts.create_discount", lambda db: crud_discounts.create_discount(
+            db, DiscountCreate(user_id=user.id, discount_type="explain", percentage=10))),
+        ("crud_discounts.create_discount_campaign", lambda db: crud_discounts.create_discount_campaign(
+            db, DiscountCampaignCreate(campaign="explain-crud", discount_type="explain", percentage=10, segment=DiscountSegment(role="coworker")))),
+        ("crud_reports.get_booking_report", lambda db: crud_reports.get_booking_report(db, **report_range, group_by="service_type")),
+        ("crud_reports.get_discount_report", lambda db: crud_reports.get_discount_report(db, **report_range)),
+        ("crud_reports.get_report_summary", lambda db: crud_reports.get_report_summary(db, **report_range)),
+        ("crud_referrals.get_referrals_by_user", lambda db: crud_referrals.get_referrals_by_user(db, user_phone=user.phone_number)),
+        ("crud_referrals.create_referral", lambda db: crud_referrals.create_referral(
+            db, referral=ReferralCreate(invited_user_id=ids["other_user_id"]), inviter_user=user)),
+        ("crud_referrals.get_referral_stats", lambda db: crud_referrals.get_referral_stats(db, user_phone=user.phone_number)),
+        ("crud_referrals.get_referral_leaderboard", lambda db: crud_referrals.get_referral_leaderboard(db)),
+        ("crud_refresh_tokens.issue_refresh_token", lambda db: crud_refresh_tokens.issue_refresh_token(db, user_id=user.id)),
+        ("crud_refresh_tokens.rotate_refresh_token", lambda db: crud_refresh_tokens.rotate_refresh_token(db, token="x" * 64)),
+        ("crud_refresh_tokens.revoke_refresh_token", lambda db: crud_refresh_tokens.revoke_refresh_token(db, token="x" * 64)),
+    ]
+
+
+def plan_scans(plan, found):
+    """Collects (node type, relation, index) for every scan node of a JSON plan."""
+    if "Relation Name" in plan:
+        found.append((plan["Node Type"], plan["Relation Name"], plan.get("Index Name")))
+    for child in plan.get("Plans", []):
+        plan_scans(child, found)
+    return found
+
+
+def table_sizes(conn):
+    rows = conn.execute(text("SELECT relname, reltuples FROM pg_class WHERE relkind = 'r'")).all()
+    return {name: tuples for name, tuples in rows}
+
+
+def explain_all(min_rows: int):
+    conn = engine.connect()
+    outer = conn.begin()
+    sizes = table_sizes(conn)
+    db = Session(bind=conn, join_transaction_mode="create_savepoint")
+    ids = sample_ids(db)
+
+    captured = []
+
+    def capture(_conn, _cursor, statement, parameters, _context, executemany):
+        if not executemany:
+            captured.append((statement, parameters))
+
+    failures = 0
+    try:
+        for name, call in crud_checks(ids):
+            captured.clear()
+            event.listen(engine, "before_cursor_execute", capture)
+            note = ""
+            try:
+                call(db)
+            except HTTPException as e:
+                db.rollback()
+                note = f" (raised {e.status_code})"
+            except Exception as e:
+                db.rollback()
+                note = f" (raised {type(e).__name__}: {e})"
+            finally:
+                event.remove(engine, "before_cursor_execute", capture)
+
+            statements = [(s, p) for s, p in captured if s.lstrip().split(None, 1)[0].upper() in ("SELECT", "UPDATE", "DELETE", "INSERT", "WITH")]
+            problems, used = [], []
+            for statement, parameters in statements:
+                raw = conn.connection.dbapi_connection.cursor()
+                raw.execute("SAVEPOINT explain_crud")
+                raw.execute("EXPLAIN (ANALYZE, FORMAT JSON) " + statement, parameters)
+                plan = raw.fetchone()[0]
+                raw.execute("ROLLBACK TO SAVEPOINT explain_crud")
+                if isinstance(plan, str):
+                    plan = json.loads(plan)
+                for node_type, relation, index in plan_scans(plan[0]["Plan"], []):
+                    used.append(index or f"{node_type} {relation}")
+                    if node_type == "Seq Scan" and sizes.get(relation, 0) >= min_rows:
+                        problems.append(f"Seq Scan on {relation} (~{int(sizes[relation])} rows)")
+
+            verdict = "OK " if not problems else "SEQ"
+            failures += bool(problems)
+            print(f"[{verdict}] {name}{note}: {len(statements)} statement(s); scans: {', '.join(used) or '-'}")
+            for problem in problems:
+                print(f"       {problem}")
+    finally:
+        db.close()
+        outer.rollback()
+        conn.close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, metavar="USERS", help="Insert synthetic data for this many users, then ANALYZE.")
+    parser.add_argument("--cleanup", action="store_true", help="Delete the synthetic data and exit.")
+    parser.add_argument("--min-rows", type=int, default=1000, help="Only report sequential scans on tables at least this large.")
+    args = parser.parse_args()
+
+    if args.cleanup:
+        cleanup()
+        return
+    if args.seed:
+        seed(args.seed)
+    raise SystemExit(1 if explain_all(args.min_rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
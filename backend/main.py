@@ -7,8 +7,10 @@ from fastapi.middleware.cors import CORSMiddleware
 import os
 
 # Import all active routers
-from routers import users, reservations, payments, discounts, referrals, auth
+from routers import users, reservations, payments, discounts, referrals, auth, sms, reports, quotes
 from database import Base, engine
+from services import sms_outbox
+from services.webhook_dispatcher import webhook_dispatcher
 
 # Create all database tables on startup if they don't exist
 Base.metadata.create_all(bind=engine)
@@ -28,6 +30,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag", "Idempotent-Replayed"],
 )
 
 # --- Include All Routers ---
@@ -37,6 +40,9 @@ app.include_router(reservations.router, prefix="/api/v1")
 app.include_router(payments.router, prefix="/api/v1")
 app.include_router(discounts.router, prefix="/api/v1")
 app.include_router(referrals.router, prefix="/api/v1")
+app.include_router(sms.router, prefix="/api/v1")
+app.include_router(reports.router, prefix="/api/v1")
+app.include_router(quotes.router, prefix="/api/v1")
 
 # --- Health Check Endpoint ---
 @app.get("/health", tags=["Health"])
@@ -46,7 +52,12 @@ def health_check():
 @app.on_event("startup")
 async def startup_event():
     print("Backend starting up...")
+    if sms_outbox.SMS_OUTBOX_ENABLED:
+        sms_outbox.outbox_worker.start()
+    webhook_dispatcher.start()
 
 @app.on_event("shutdown")
 def shutdown_event():
+    sms_outbox.outbox_worker.stop()
+    webhook_dispatcher.stop()
     print("Backend shutting down.")
@@ -1,9 +1,11 @@
 from sqlalchemy import (
-    Column, Integer, String, Boolean, DateTime, ForeignKey, Float, Text, Date
+    Column, Integer, SmallInteger, String, Boolean, DateTime, ForeignKey, Float, Text, Date, Index, DDL, event
 )
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, text
 from database import Base
+from services.persian_text import search_name
+from services.persian_calendar import jalali_month_day
 
 class User(Base):
     __tablename__ = "users"
@@ -15,6 +17,20 @@ class User(Base):
     birth_date = Column(Date, nullable=True)
     is_active = Column(Boolean, default=True, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Normalized "first last" (see services/persian_text.py), kept in sync on every ORM write
+    search_name = Column(String(201), nullable=True)
+    # Jalali month * 100 + day of birth_date (see services/persian_calendar.py), for "whose birthday is today"
+    birth_md = Column(SmallInteger, nullable=True)
+
+    __table_args__ = (
+        # Admin user list: filter by role, keyset-paginated by id
+        Index("ix_users_role_id", "role", "id"),
+        # User search: phone number prefixes (LIKE '0912%') and name substrings (trigrams)
+        Index("ix_users_phone_number_prefix", "phone_number", postgresql_ops={"phone_number": "varchar_pattern_ops"}),
+        Index("ix_users_search_name_trgm", "search_name", postgresql_using="gin", postgresql_ops={"search_name": "gin_trgm_ops"}),
+        # Birthday campaigns: today's month-day, walked in id order
+        Index("ix_users_birth_md_id", "birth_md", "id", postgresql_where=text("birth_md IS NOT NULL")),
+    )
     
     reservations = relationship("Reservation", foreign_keys="[Reservation.user_id]", back_populates="user")
     managed_coworkers = relationship("CoworkerInviteCode", foreign_keys="[CoworkerInviteCode.manager_id]", back_populates="manager")
@@ -24,11 +40,22 @@ class User(Base):
     # We will adjust or remove it. For now, let's keep it commented.
     # referral = relationship("Referral", back_populates="user", uselist=False)
 
+@event.listens_for(User, "before_insert")
+@event.listens_for(User, "before_update")
+def _update_derived_columns(mapper, connection, user):
+    user.search_name = search_name(user.first_name, user.last_name)
+    user.birth_md = jalali_month_day(user.birth_date)
+
+# The trigram index needs pg_trgm when create_all builds the table on a fresh database.
+event.listen(User.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class OtpCode(Base):
     __tablename__ = "otp_codes"
     id = Column(Integer, primary_key=True, index=True)
-    phone_number = Column(String(15), nullable=False, index=True)
+    # One live code per phone number, so a new request is a single upsert.
+    phone_number = Column(String(15), nullable=False, unique=True, index=True)
     code = Column(String(6), nullable=False)
+    attempts = Column(Integer, default=0, server_default="0", nullable=False)
     expires_at = Column(DateTime, nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
 
@@ -52,9 +79,25 @@ class Reservation(Base):
     notes = Column(Text, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+    # Optimistic-concurrency counter, exposed to clients as the ETag of the reservation.
+    version = Column(Integer, default=1, server_default="1", nullable=False)
     user = relationship("User", foreign_keys=[user_id], back_populates="reservations")
+    coworker = relationship("User", foreign_keys=[coworker_id])
     payment = relationship("Payment", back_populates="reservation", uselist=False)
 
+    __table_args__ = (
+        # Keyset pagination (date DESC, id DESC) for a user's, a status' and all reservations
+        Index("ix_reservations_user_id_date_id", "user_id", "date", "id"),
+        Index("ix_reservations_status_date_id", "status", "date", "id"),
+        Index("ix_reservations_date_id", "date", "id"),
+        # Conflict checks and the availability index only look at live bookings
+        Index(
+            "ix_reservations_active_date_coworker",
+            "date", "coworker_id",
+            postgresql_where=text("status <> 'cancelled'"),
+        ),
+    )
+
 class Payment(Base):
     __tablename__ = "payments"
     id = Column(Integer, primary_key=True, index=True)
@@ -64,9 +107,19 @@ class Payment(Base):
     payment_type = Column(String(20), nullable=True)
     status = Column(String(20), default="pending", nullable=False)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    # Set when the payment was made with a quote: the discount it used and the total reduction
+    discount_id = Column(Integer, ForeignKey("discounts.id"), nullable=True)
+    discount_amount = Column(Float, nullable=True)
     user = relationship("User", back_populates="payments")
     reservation = relationship("Reservation", back_populates="payment")
 
+    __table_args__ = (
+        # A user's payments, keyset-paginated by (created_at DESC, id DESC)
+        Index("ix_payments_user_id_created_at_id", "user_id", "created_at", "id"),
+        # "Does this reservation already have a payment?" in create_payment
+        Index("ix_payments_reservation_id", "reservation_id"),
+    )
+
 class Discount(Base):
     __tablename__ = "discounts"
     id = Column(Integer, primary_key=True, index=True)
@@ -78,6 +131,14 @@ class Discount(Base):
     expires_at = Column(DateTime, nullable=True)
     created_at = Column(DateTime, server_default=func.now(), nullable=False)
     used = Column(Boolean, default=False, nullable=False)
+    used_at = Column(DateTime, nullable=True)
+    # Name of the bulk campaign that generated the code, if any
+    campaign = Column(String(50), nullable=True, index=True)
+
+    __table_args__ = (
+        # A user's unused discounts, newest first
+        Index("ix_discounts_user_id_used_created_at", "user_id", "used", "created_at"),
+    )
 
 # ==============================
 # Referral System (Final Correction)
@@ -95,3 +156,161 @@ class Referral(Base):
     # Relationship to the invited user
     invited_user = relationship("User", foreign_keys=[user_id])
 
+    __table_args__ = (
+        # Referrals sent by an inviter are looked up by the inviter's phone
+        Index("ix_referrals_invited_phone", "invited_phone"),
+    )
+
+
+# ==============================
+# SMS Outbox (asynchronous delivery)
+# ==============================
+class SmsOutbox(Base):
+    __tablename__ = "sms_outbox"
+    id = Column(Integer, primary_key=True, index=True)
+    phone_number = Column(String(15), nullable=False, index=True)
+    message = Column(Text, nullable=False)
+    # pending -> sending -> sent | failed | unknown (may have been delivered; never resent automatically)
+    status = Column(String(20), default="pending", nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    # When the message becomes eligible for (re)delivery; also acts as the lease
+    # expiry while a worker holds the row in the "sending" state.
+    next_attempt_at = Column(DateTime, server_default=func.now(), nullable=False)
+    last_error = Column(Text, nullable=True)
+    provider_message_id = Column(String(50), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    sent_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index("ix_sms_outbox_status_next_attempt_at", "status", "next_attempt_at"),
+    )
+
+# ==============================
+# SMS broadcasts (one text to a whole segment, see services/sms_broadcast.py)
+# ==============================
+class SmsCampaign(Base):
+    __tablename__ = "sms_campaigns"
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String(100), nullable=False)
+    message = Column(Text, nullable=False)
+    # The recipient segment as JSON (schemas.DiscountSegment)
+    segment = Column(Text, nullable=False)
+    # pending -> running -> completed | failed | cancelled
+    status = Column(String(20), default="pending", nullable=False, index=True)
+    total_recipients = Column(Integer, default=0, nullable=False)
+    processed = Column(Integer, default=0, nullable=False)
+    sent = Column(Integer, default=0, nullable=False)
+    failed = Column(Integer, default=0, nullable=False)
+    # Checkpoint: recipients are walked in user id order, a resumed run continues after this ID.
+    last_user_id = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    started_at = Column(DateTime, nullable=True)
+    # Heartbeat of the running sender, bumped after every batch
+    updated_at = Column(DateTime, server_default=func.now(), nullable=False)
+    finished_at = Column(DateTime, nullable=True)
+
+class SmsCampaignFailure(Base):
+    __tablename__ = "sms_campaign_failures"
+    id = Column(Integer, primary_key=True, index=True)
+    campaign_id = Column(Integer, ForeignKey("sms_campaigns.id"), nullable=False)
+    user_id = Column(Integer, nullable=False)
+    phone_number = Column(String(15), nullable=False)
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    __table_args__ = (
+        # A campaign's failures, keyset-paginated by id
+        Index("ix_sms_campaign_failures_campaign_id_id", "campaign_id", "id"),
+    )
+
+# ==============================
+# Access-token revocation stamps
+# ==============================
+class UserTokenVersion(Base):
+    __tablename__ = "user_token_versions"
+    # Self-contained access tokens carry the version that was current when they were issued;
+    # bumping it revokes every outstanding token of the user.
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), nullable=False)
+
+# ==============================
+# Refresh Tokens (rotating sessions)
+# ==============================
+class RefreshToken(Base):
+    __tablename__ = "refresh_tokens"
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False, index=True)
+    # Only the SHA-256 of the token is stored; the unique index gives O(1) lookup on refresh.
+    token_hash = Column(String(64), unique=True, index=True, nullable=False)
+    # All tokens produced by rotating one login share a family, which is revoked as a whole on reuse.
+    family_id = Column(String(32), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False)
+    revoked_at = Column(DateTime, nullable=True)
+    replaced_by_id = Column(Integer, ForeignKey("refresh_tokens.id"), nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+# ==============================
+# Rate limiting (shared token buckets)
+# ==============================
+class RateLimitBucket(Base):
+    __tablename__ = "rate_limit_buckets"
+    # Losing buckets on a crash only resets the limits, so the table does not need WAL.
+    __table_args__ = {"prefixes": ["UNLOGGED"]}
+    key = Column(String(100), primary_key=True)
+    tokens = Column(Float, nullable=False)
+    allowed = Column(Boolean, nullable=False)
+    updated_at = Column(DateTime, nullable=False)
+
+# ==============================
+# Idempotency keys (replayable POST responses)
+# ==============================
+class IdempotencyRecord(Base):
+    __tablename__ = "idempotency_keys"
+    # SHA-256 of (user, operation, client key)
+    key = Column(String(64), primary_key=True)
+    # SHA-256 of the request body; reusing a key with a different body is rejected.
+    fingerprint = Column(String(64), nullable=False)
+    # NULL while the first request is still running
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+
+# ==============================
+# Reporting rollups (maintained incrementally, rebuilt by backfill_rollups.py)
+# ==============================
+class DailyBookingRollup(Base):
+    __tablename__ = "daily_booking_rollups"
+    # Day of the appointment (not of the booking), one row per service and coworker.
+    day = Column(Date, primary_key=True)
+    service_type = Column(String(50), primary_key=True)
+    # 0 stands for "no coworker assigned" so the column can be part of the primary key.
+    coworker_id = Column(Integer, primary_key=True)
+    bookings = Column(Integer, default=0, nullable=False)
+    cancellations = Column(Integer, default=0, nullable=False)
+    payments = Column(Integer, default=0, nullable=False)
+    revenue = Column(Float, default=0, nullable=False)
+
+class DailyDiscountRollup(Base):
+    __tablename__ = "daily_discount_rollups"
+    # Day the discounts were used
+    day = Column(Date, primary_key=True)
+    discount_type = Column(String(50), primary_key=True)
+    applied = Column(Integer, default=0, nullable=False)
+
+# ==============================
+# Outbound webhooks that could not be delivered
+# ==============================
+class WebhookDeadLetter(Base):
+    __tablename__ = "webhook_dead_letters"
+    id = Column(Integer, primary_key=True, index=True)
+    # X-Webhook-Id of the delivery, so a manual replay can be deduplicated by the receiver
+    delivery_id = Column(String(32), nullable=False, index=True)
+    event = Column(String(50), nullable=False)
+    url = Column(Text, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False, index=True)
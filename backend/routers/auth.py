@@ -1,14 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Request, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from pydantic import BaseModel, Field
 
 # Local Imports
 from database import get_db
-from crud import crud_users
-from auth import create_access_token, get_current_user
+from crud import crud_users, crud_refresh_tokens
+from auth import create_user_access_token, get_current_user, get_current_admin_principal
 from schemas import UserOut
 from models import User
+from services.principal_cache import principal_cache
+from services import rate_limiter
 
 # --- Router Definition ---
 router = APIRouter(
@@ -20,30 +22,58 @@ router = APIRouter(
 class OTPRequest(BaseModel):
     phone_number: str = Field(..., pattern=r"^09[0-9]{9}$", description="User's 11-digit phone number.")
 
+class RefreshRequest(BaseModel):
+    refresh_token: str = Field(..., min_length=16, description="The refresh token returned by /auth/token or /auth/refresh.")
+
 
 # --- Endpoints ---
 
 @router.post("/request-otp", status_code=status.HTTP_200_OK)
-def request_otp_code(data: OTPRequest, db: Session = Depends(get_db)):
+def request_otp_code(data: OTPRequest, request: Request, db: Session = Depends(get_db)):
     """
     Generates a new OTP, saves it to the database, and sends it via SMS.
+    Throttled per phone number and per client IP before any database or SMS work.
     """
+    rate_limiter.enforce(rate_limiter.OTP_REQUEST_PER_IP, rate_limiter.client_ip(request))
+    rate_limiter.enforce(rate_limiter.OTP_REQUEST_PER_PHONE, data.phone_number)
     crud_users.create_and_send_otp(db, phone=data.phone_number)
     return {"message": "OTP sent successfully"}
 
 
 @router.post("/token")
-def login_for_access_token(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
+def login_for_access_token(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(get_db)):
     """
-    Verifies the OTP and returns a JWT access token upon success.
+    Verifies the OTP and returns a JWT access token upon success,
+    together with a refresh token that starts a new session.
     Use 'username' for phone number and 'password' for the OTP code.
     """
+    rate_limiter.enforce(rate_limiter.OTP_VERIFY_PER_IP, rate_limiter.client_ip(request))
+    rate_limiter.enforce(rate_limiter.OTP_VERIFY_PER_PHONE, form_data.username)
     user = crud_users.verify_otp(db, phone=form_data.username, code=form_data.password)
     
-    # The 'sub' (subject) of the token should be a unique identifier.
-    access_token = create_access_token(data={"sub": user.phone_number})
+    access_token = create_user_access_token(db, user)
+    refresh_token = crud_refresh_tokens.issue_refresh_token(db, user_id=user.id)
     
-    return {"access_token": access_token, "token_type": "bearer"}
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/refresh")
+def refresh_access_token(data: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Exchanges a refresh token for a new access token and a new (rotated) refresh token.
+    Each refresh token can be used only once; reusing one revokes the whole session.
+    """
+    user, refresh_token = crud_refresh_tokens.rotate_refresh_token(db, token=data.refresh_token)
+    access_token = create_user_access_token(db, user)
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+
+
+@router.post("/logout", status_code=status.HTTP_204_NO_CONTENT)
+def logout(data: RefreshRequest, db: Session = Depends(get_db)):
+    """
+    Revokes the session the given refresh token belongs to.
+    """
+    crud_refresh_tokens.revoke_refresh_token(db, token=data.refresh_token)
 
 
 @router.get("/users/me", response_model=UserOut)
@@ -53,3 +83,10 @@ def read_current_user_profile(current_user: User = Depends(get_current_user)):
     """
     return current_user
 
+
+@router.get("/principal-cache", dependencies=[Depends(get_current_admin_principal)])
+def read_principal_cache_stats():
+    """
+    Returns size and hit/miss counters of the authenticated-principal cache (Admin only).
+    """
+    return principal_cache.stats()
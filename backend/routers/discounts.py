@@ -3,30 +3,63 @@ from sqlalchemy.orm import Session
 from typing import List
 
 from database import get_db
-from models import User
 from crud.crud_discounts import (
     create_discount as crud_create_discount,
+    create_discount_campaign,
     get_user_discounts,
     apply_discount as crud_apply_discount,
+    redeem_discount_code,
 )
-from schemas import DiscountCreate, DiscountResponse
-from auth import get_current_user, get_current_admin_user
+from crud.crud_occasions import run_occasion_campaigns
+from schemas import (
+    DiscountCampaignCreate, DiscountCampaignResult, DiscountCreate, DiscountRedeem, DiscountResponse,
+    OccasionCampaignResult, OccasionCampaignRun,
+)
+from auth import get_current_principal, get_current_admin_principal
+from services.principal_cache import Principal
 
 router = APIRouter(prefix="/discounts", tags=["Discounts"])
 
 @router.post("/", response_model=DiscountResponse, status_code=status.HTTP_201_CREATED)
-def create_new_discount(data: DiscountCreate, db: Session = Depends(get_db), admin_user: User = Depends(get_current_admin_user)):
+def create_new_discount(data: DiscountCreate, db: Session = Depends(get_db), admin_user: Principal = Depends(get_current_admin_principal)):
     return crud_create_discount(db, data)
 
+@router.post("/campaigns", response_model=DiscountCampaignResult, status_code=status.HTTP_201_CREATED)
+def create_campaign(data: DiscountCampaignCreate, db: Session = Depends(get_db), admin_user: Principal = Depends(get_current_admin_principal)):
+    """
+    Generates one unique discount code for every user of a segment (Admin only).
+    Reports how many codes were written and the throughput; set return_codes to get the codes back.
+    """
+    return create_discount_campaign(db, data)
+
+@router.post("/occasions", response_model=List[OccasionCampaignResult])
+def run_occasions(data: OccasionCampaignRun, db: Session = Depends(get_db), admin_user: Principal = Depends(get_current_admin_principal)):
+    """
+    Runs the birthday / anniversary job for a day (Admin only), normally done daily by run_occasion_campaigns.py.
+    Already rewarded users are skipped; use dry_run to only count the recipients.
+    """
+    return run_occasion_campaigns(
+        db, day=data.day, occasions=data.occasions, dry_run=data.dry_run,
+        percentage=data.percentage, valid_days=data.valid_days,
+    )
+
 @router.get("/me", response_model=List[DiscountResponse])
-def read_my_discounts(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def read_my_discounts(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return get_user_discounts(db, user_id=current_user.id)
 
 @router.post("/apply/{discount_id}", response_model=DiscountResponse)
-def apply_user_discount(discount_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def apply_user_discount(discount_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     try:
         return crud_apply_discount(db, discount_id=discount_id, user_id=current_user.id)
     except HTTPException as e:
         raise e
     except Exception:
         raise HTTPException(status_code=500, detail="An internal error occurred while applying discount.")
+
+@router.post("/redeem", response_model=DiscountResponse)
+def redeem_user_discount(data: DiscountRedeem, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    Redeems one of the current user's discounts by its code.
+    404: unknown code, 403: someone else's code, 409: already used, 400: expired.
+    """
+    return redeem_discount_code(db, code=data.code, user_id=current_user.id)
@@ -1,17 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
+from datetime import date
 
 # Import dependencies and models
 from database import get_db
-from models import User
 from crud.crud_payments import (
     create_payment as crud_create_payment,
     get_user_payments,
     get_payment as crud_get_payment,
 )
 from schemas import PaymentCreate, PaymentResponse
-from auth import get_current_user, get_current_admin_user
+from crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from auth import get_current_principal
+from services.principal_cache import Principal
+from services.idempotency import run_idempotent
 
 router = APIRouter(prefix="/payments", tags=["Payments"])
 
@@ -19,20 +22,42 @@ router = APIRouter(prefix="/payments", tags=["Payments"])
 # Get all payments for the CURRENT logged-in user
 # =====================================================
 @router.get("/me", response_model=List[PaymentResponse])
-def read_my_payments(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def read_my_payments(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    payment_status: Optional[str] = Query(None, alias="status"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
     """
-    Retrieves all payments for the currently authenticated user.
+    Retrieves the payments of the currently authenticated user, newest first.
+    When more results exist, the X-Next-Cursor response header holds the cursor for the next page.
     """
-    return get_user_payments(db, user_id=current_user.id)
+    items, next_cursor = get_user_payments(
+        db, user_id=current_user.id, limit=limit, cursor=cursor,
+        status=payment_status, date_from=date_from, date_to=date_to,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 # =====================================================
 # Create a new payment for the CURRENT logged-in user
 # =====================================================
 @router.post("/", response_model=PaymentResponse, status_code=status.HTTP_201_CREATED)
-def create_new_payment(data: PaymentCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_new_payment(
+    data: PaymentCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
     """
     Creates a new payment.
     Ensures that a user can only create a payment for themselves.
+    Retries carrying the same Idempotency-Key header get the original response replayed.
     """
     # Security: Ensure the user_id in the payload matches the logged-in user
     if data.user_id != current_user.id:
@@ -42,13 +67,17 @@ def create_new_payment(data: PaymentCreate, db: Session = Depends(get_db), curre
         )
     
     # We pass the complete 'data' object to the CRUD function
-    return crud_create_payment(db, data)
+    return run_idempotent(
+        db, idempotency_key, user_id=current_user.id, operation="payments.create", payload=data,
+        call=lambda before_commit: crud_create_payment(db, data, before_commit=before_commit),
+        response_model=PaymentResponse, status_code=status.HTTP_201_CREATED,
+    )
 
 # =====================================================
 # Get single payment by ID (with authorization)
 # =====================================================
 @router.get("/{payment_id}", response_model=PaymentResponse)
-def get_single_payment(payment_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_single_payment(payment_id: int, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     """
     Retrieves a single payment by its ID.
     A user can only see their own payment unless they are an admin.
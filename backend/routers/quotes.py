@@ -0,0 +1,21 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from database import get_db
+from crud import crud_quotes
+from schemas import QuoteRequest, QuoteResponse
+from auth import get_current_principal
+from services.principal_cache import Principal
+
+router = APIRouter(prefix="/quotes", tags=["Quotes"])
+
+@router.post("/", response_model=QuoteResponse)
+def create_quote(data: QuoteRequest, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """
+    Prices one of the current user's reservations: catalog price, the best usable discount
+    (or the given discount_code) and any pending referral bonus.
+    Pay with the returned quote_token before expires_at; POST /payments/ then charges exactly this amount.
+    """
+    return crud_quotes.create_quote(
+        db, user_id=current_user.id, reservation_id=data.reservation_id, discount_code=data.discount_code
+    )
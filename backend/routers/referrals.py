@@ -1,21 +1,31 @@
-from fastapi import APIRouter, Depends
+from fastapi import APIRouter, Depends, Query
 from sqlalchemy.orm import Session
 from typing import List
 
 from database import get_db
-from models import User
 from crud import crud_referrals
-from schemas import ReferralCreate, ReferralResponse
-from auth import get_current_user
+from schemas import ReferralCreate, ReferralLeaderboardEntry, ReferralResponse, ReferralStats
+from auth import get_current_principal
+from services.principal_cache import Principal
 
 router = APIRouter(prefix="/referrals", tags=["Referrals"])
 
 @router.post("/", response_model=ReferralResponse)
-def create_new_referral(referral_data: ReferralCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_new_referral(referral_data: ReferralCreate, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     return crud_referrals.create_referral(db, referral=referral_data, inviter_user=current_user)
 
 @router.get("/me", response_model=List[ReferralResponse])
-def read_my_sent_referrals(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def read_my_sent_referrals(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     # We now pass the user's phone number to the CRUD function
     return crud_referrals.get_referrals_by_user(db, user_phone=current_user.phone_number)
 
+@router.get("/leaderboard", response_model=List[ReferralLeaderboardEntry])
+def read_referral_leaderboard(limit: int = Query(10, ge=1, le=100), db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """Top inviters with their conversion and network figures (names and phone numbers masked for non-admins)."""
+    return crud_referrals.get_referral_leaderboard(db, limit=limit, public=current_user.role != "admin")
+
+@router.get("/stats/me", response_model=ReferralStats)
+def read_my_referral_stats(db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
+    """The current user's invites, how many of them paid, and their downstream referral network."""
+    stats = crud_referrals.get_referral_stats(db, user_phone=current_user.phone_number)
+    return dict(stats, user_id=current_user.id)
@@ -0,0 +1,45 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from datetime import date
+
+from database import get_db
+from crud import crud_reports
+from schemas import BookingReportRow, DiscountReportRow, ReportSummary
+from auth import get_current_admin_principal
+
+router = APIRouter(prefix="/reports", tags=["Reports"], dependencies=[Depends(get_current_admin_principal)])
+
+MAX_REPORT_DAYS = 366
+
+def _check_range(date_from: date, date_to: date):
+    if date_to < date_from:
+        raise HTTPException(status_code=400, detail="date_to must not be before date_from")
+    if (date_to - date_from).days >= MAX_REPORT_DAYS:
+        raise HTTPException(status_code=400, detail=f"The report range is limited to {MAX_REPORT_DAYS} days")
+
+@router.get("/bookings", response_model=List[BookingReportRow])
+def read_booking_report(
+    date_from: date,
+    date_to: date,
+    group_by: Optional[str] = Query(None, pattern=r"^(service_type|coworker)$"),
+    db: Session = Depends(get_db),
+):
+    """
+    Bookings, cancellations, payments and revenue per day of appointment,
+    optionally broken down by service or coworker (Admin only).
+    """
+    _check_range(date_from, date_to)
+    return crud_reports.get_booking_report(db, date_from=date_from, date_to=date_to, group_by=group_by)
+
+@router.get("/discounts", response_model=List[DiscountReportRow])
+def read_discount_report(date_from: date, date_to: date, db: Session = Depends(get_db)):
+    """Discounts used per day and discount type (Admin only)."""
+    _check_range(date_from, date_to)
+    return crud_reports.get_discount_report(db, date_from=date_from, date_to=date_to)
+
+@router.get("/summary", response_model=ReportSummary)
+def read_report_summary(date_from: date, date_to: date, db: Session = Depends(get_db)):
+    """Totals for a date range (Admin only)."""
+    _check_range(date_from, date_to)
+    return crud_reports.get_report_summary(db, date_from=date_from, date_to=date_to)
@@ -1,35 +1,213 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from typing import List
+import asyncio
+import os
+from typing import List, Optional
+from datetime import date, timedelta
 
 # Local Imports
 from database import get_db
-from models import User, Reservation
 from crud import crud_reservations
-from schemas import ReservationCreate, ReservationResponse, ReservationUpdate
-from auth import get_current_user, get_current_admin_user
+from schemas import ReservationCreate, ReservationBulkCreate, ReservationBulkResponse, ReservationResponse, ReservationUpdate, AvailabilityResponse, ReservationStatus, PaymentStatus, CalendarResponse
+from crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.service_catalog import get_service_duration
+from auth import get_current_principal, get_current_admin_principal, get_current_staff_principal, get_stream_principal
+from services.principal_cache import Principal
+from services.event_hub import event_hub, format_sse
+from services.idempotency import run_idempotent
 
 router = APIRouter(prefix="/reservations", tags=["Reservations"])
 
+# Idle streams send a comment this often so proxies keep the connection open.
+STREAM_KEEPALIVE_SECONDS = float(os.getenv("STREAM_KEEPALIVE_SECONDS", "15"))
+
 @router.get("/me", response_model=List[ReservationResponse])
-def read_my_reservations(db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    """Retrieves all reservations for the currently authenticated user."""
-    return crud_reservations.get_user_reservations(db, user_id=current_user.id)
+def read_my_reservations(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    reservation_status: Optional[ReservationStatus] = Query(None, alias="status"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Retrieves the reservations of the currently authenticated user, newest first.
+    When more results exist, the X-Next-Cursor response header holds the cursor for the next page.
+    """
+    items, next_cursor = crud_reservations.get_user_reservations(
+        db, user_id=current_user.id, limit=limit, cursor=cursor,
+        status=reservation_status.value if reservation_status else None, date_from=date_from, date_to=date_to,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 @router.post("/", response_model=ReservationResponse, status_code=status.HTTP_201_CREATED)
-def create_new_reservation(data: ReservationCreate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def create_new_reservation(
+    data: ReservationCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
     """
     Creates a new reservation for the currently authenticated user.
     It automatically assigns the user_id from the token, ignoring any user_id in the request body.
+    Retries carrying the same Idempotency-Key header get the original response replayed.
     """
     # Override user_id from payload with the one from the token for security
     data.user_id = current_user.id
-    
-    # We will also need to create the CRUD function for this
-    return crud_reservations.create_reservation(db, reservation=data)
+
+    return run_idempotent(
+        db, idempotency_key, user_id=current_user.id, operation="reservations.create", payload=data,
+        call=lambda before_commit: crud_reservations.create_reservation(db, reservation=data, before_commit=before_commit),
+        response_model=ReservationResponse, status_code=status.HTTP_201_CREATED,
+    )
+
+@router.post("/bulk", response_model=ReservationBulkResponse)
+def create_reservation_series(
+    data: ReservationBulkCreate,
+    idempotency_key: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Books several slots for the current user at once, from a list of start times or a
+    recurrence rule (e.g. every 14 days, 6 times). Returns the outcome of every slot:
+    "created", "conflict" or, with all_or_nothing, "skipped".
+    Honors the Idempotency-Key header like POST /reservations/.
+    """
+    return run_idempotent(
+        db, idempotency_key, user_id=current_user.id, operation="reservations.bulk", payload=data,
+        call=lambda before_commit: crud_reservations.create_reservations_bulk(
+            db, user_id=current_user.id, data=data, before_commit=before_commit),
+        response_model=ReservationBulkResponse, status_code=status.HTTP_200_OK,
+    )
+
+@router.get("/availability", response_model=AvailabilityResponse)
+def read_availability(
+    day: date = Query(..., alias="date", description="First day to check (YYYY-MM-DD)."),
+    service_type: str = Query(...),
+    coworker_id: Optional[int] = Query(None),
+    days: int = Query(1, ge=1, le=14, description="Number of consecutive days, e.g. 7 for a week."),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_principal),
+):
+    """
+    Returns the free start times for a service on one or more consecutive days,
+    so the booking screen can show a whole week with a single request.
+    """
+    free_slots = crud_reservations.get_availability(
+        db, start_day=day, service_type=service_type, coworker_id=coworker_id, days=days
+    )
+    return {
+        "service_type": service_type,
+        "coworker_id": coworker_id,
+        "duration_minutes": get_service_duration(service_type),
+        "days": [{"date": slot_day, "slots": slots} for slot_day, slots in free_slots.items()],
+    }
+
+def _full_name(user) -> Optional[str]:
+    if user is None:
+        return None
+    return " ".join(part for part in (user.first_name, user.last_name) if part) or None
+
+def _calendar(db: Session, start_day: date, days: int, include_cancelled: bool):
+    reservations = crud_reservations.get_reservations_calendar(
+        db, start_day=start_day, days=days, include_cancelled=include_cancelled
+    )
+    return {
+        "date_from": start_day,
+        "date_to": start_day + timedelta(days=days - 1),
+        "reservations": [
+            {
+                "id": r.id,
+                "date": r.date,
+                "end": r.date + timedelta(minutes=get_service_duration(r.service_type)),
+                "service_type": r.service_type,
+                "status": r.status,
+                "payment_status": r.payment_status,
+                "notes": r.notes,
+                "version": r.version,
+                "customer_id": r.user_id,
+                "customer_name": _full_name(r.user),
+                "customer_phone": r.user.phone_number,
+                "coworker_id": r.coworker_id,
+                "coworker_name": _full_name(r.coworker),
+                "payment_id": r.payment.id if r.payment else None,
+                "payment_amount": r.payment.amount if r.payment else None,
+                "payment_state": r.payment.status if r.payment else None,
+            }
+            for r in reservations
+        ],
+    }
+
+@router.get("/day/{day}", response_model=CalendarResponse, dependencies=[Depends(get_current_staff_principal)])
+def read_day_view(day: date, include_cancelled: bool = False, db: Session = Depends(get_db)):
+    """
+    Returns one day's reservations with customer, coworker and payment details (staff only).
+    """
+    return _calendar(db, start_day=day, days=1, include_cancelled=include_cancelled)
+
+@router.get("/week/{day}", response_model=CalendarResponse, dependencies=[Depends(get_current_staff_principal)])
+def read_week_view(day: date, include_cancelled: bool = False, db: Session = Depends(get_db)):
+    """
+    Returns seven days of reservations starting at `day`, with customer, coworker and payment details (staff only).
+    """
+    return _calendar(db, start_day=day, days=7, include_cancelled=include_cancelled)
+
+@router.get("/stream", dependencies=[Depends(get_stream_principal)])
+async def stream_reservation_events(request: Request, day: Optional[date] = None, coworker_id: Optional[int] = None):
+    """
+    Server-Sent Events stream of reservation.created / .updated / .cancelled events,
+    optionally limited to one day and/or coworker. Replaces polling the reservation list.
+    Events carry no customer details; staff reload the day view for those.
+    """
+    subscription = event_hub.subscribe(day=day, coworker_id=coworker_id)
+
+    async def events():
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    if await request.is_disconnected():
+                        return
+                    yield ": keepalive\n\n"
+                    continue
+                if event is None:
+                    # Fell too far behind; the client reconnects and reloads.
+                    return
+                yield format_sse(event)
+        finally:
+            event_hub.unsubscribe(subscription)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+def _etag(reservation) -> str:
+    return f'"{reservation.version}"'
+
+def _parse_if_match(if_match: Optional[str]) -> Optional[int]:
+    """Returns the version named by an If-Match header, or None when absent or '*'."""
+    if if_match is None or if_match.strip() == "*":
+        return None
+    tag = if_match.split(",")[0].strip()
+    if tag.startswith("W/"):
+        tag = tag[2:]
+    try:
+        return int(tag.strip('"'))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid If-Match header")
 
 @router.get("/{reservation_id}", response_model=ReservationResponse)
-def get_single_reservation(reservation_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+def get_single_reservation(reservation_id: int, response: Response, db: Session = Depends(get_db), current_user: Principal = Depends(get_current_principal)):
     """
     Retrieves a single reservation by its ID.
     A user can only see their own reservation unless they are an admin.
@@ -41,13 +219,52 @@ def get_single_reservation(reservation_id: int, db: Session = Depends(get_db), c
     if reservation.user_id != current_user.id and current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized to view this reservation")
         
+    response.headers["ETag"] = _etag(reservation)
     return reservation
 
-# --- ADMIN ONLY ---
-@router.get("/", response_model=List[ReservationResponse], dependencies=[Depends(get_current_admin_user)])
-def list_all_reservations(db: Session = Depends(get_db)):
-    """Retrieves all reservations from all users (Admin only)."""
-    return crud_reservations.get_all_reservations(db)
+@router.patch("/{reservation_id}", response_model=ReservationResponse)
+def update_single_reservation(
+    reservation_id: int,
+    data: ReservationUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: Session = Depends(get_db),
+    current_user: Principal = Depends(get_current_staff_principal),
+):
+    """
+    Updates a reservation's status, payment status or notes (staff only).
+    Send the ETag from a previous read as If-Match to avoid overwriting a concurrent change;
+    a stale ETag is answered with 412 Precondition Failed.
+    """
+    reservation = crud_reservations.update_reservation(
+        db, reservation_id, data, expected_version=_parse_if_match(if_match)
+    )
+    response.headers["ETag"] = _etag(reservation)
+    return reservation
 
-# We might need a PATCH endpoint here later to update reservation status
+# --- ADMIN ONLY ---
+@router.get("/", response_model=List[ReservationResponse], dependencies=[Depends(get_current_admin_principal)])
+def list_all_reservations(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    reservation_status: Optional[ReservationStatus] = Query(None, alias="status"),
+    payment_status: Optional[PaymentStatus] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Retrieves reservations from all users, newest first (Admin only).
+    When more results exist, the X-Next-Cursor response header holds the cursor for the next page.
+    """
+    items, next_cursor = crud_reservations.get_all_reservations(
+        db, limit=limit, cursor=cursor,
+        status=reservation_status.value if reservation_status else None,
+        payment_status=payment_status.value if payment_status else None,
+        date_from=date_from, date_to=date_to,
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
@@ -0,0 +1,73 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+from database import get_db
+from services import sms_broadcast, sms_outbox
+from schemas import SmsBroadcastCreate, SmsCampaignFailureResponse, SmsCampaignResponse, SmsOutboxResponse
+from crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from auth import get_current_admin_principal
+
+router = APIRouter(prefix="/sms", tags=["SMS"], dependencies=[Depends(get_current_admin_principal)])
+
+@router.get("/outbox/stats", response_model=Dict[str, int])
+def read_outbox_stats(db: Session = Depends(get_db)):
+    """Returns the number of outbox messages per delivery status (Admin only)."""
+    return sms_outbox.get_outbox_stats(db)
+
+@router.get("/outbox/{message_id}", response_model=SmsOutboxResponse)
+def read_outbox_message(message_id: int, db: Session = Depends(get_db)):
+    """Returns the delivery status of a single outbox message (Admin only)."""
+    message = sms_outbox.get_outbox_message(db, message_id)
+    if not message:
+        raise HTTPException(status_code=404, detail="Message not found")
+    return message
+
+# --- Broadcasts ---
+
+@router.post("/campaigns", response_model=SmsCampaignResponse, status_code=status.HTTP_202_ACCEPTED)
+def create_broadcast(data: SmsBroadcastCreate, db: Session = Depends(get_db)):
+    """Sends one text to every user of a segment in the background (Admin only). Poll the campaign for progress."""
+    return sms_broadcast.describe_campaign(sms_broadcast.create_broadcast(db, data))
+
+@router.get("/campaigns", response_model=List[SmsCampaignResponse])
+def read_broadcasts(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Campaigns, newest first, with progress and throughput (Admin only). Next page cursor in X-Next-Cursor."""
+    items, next_cursor = sms_broadcast.get_campaigns(db, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [sms_broadcast.describe_campaign(campaign) for campaign in items]
+
+@router.get("/campaigns/{campaign_id}", response_model=SmsCampaignResponse)
+def read_broadcast(campaign_id: int, db: Session = Depends(get_db)):
+    """Progress (processed / sent / failed of total_recipients) and messages per second (Admin only)."""
+    return sms_broadcast.describe_campaign(sms_broadcast.get_campaign(db, campaign_id))
+
+@router.get("/campaigns/{campaign_id}/failures", response_model=List[SmsCampaignFailureResponse])
+def read_broadcast_failures(
+    campaign_id: int,
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """Recipients the campaign could not reach, with the provider's error (Admin only)."""
+    items, next_cursor = sms_broadcast.get_campaign_failures(db, campaign_id, limit=limit, cursor=cursor)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
+
+@router.post("/campaigns/{campaign_id}/cancel", response_model=SmsCampaignResponse)
+def cancel_broadcast(campaign_id: int, db: Session = Depends(get_db)):
+    """Stops a pending or running campaign after its current batch (Admin only)."""
+    return sms_broadcast.describe_campaign(sms_broadcast.cancel_broadcast(db, campaign_id))
+
+@router.post("/campaigns/{campaign_id}/resume", response_model=SmsCampaignResponse)
+def resume_broadcast(campaign_id: int, db: Session = Depends(get_db)):
+    """Continues a failed, cancelled or interrupted campaign from its last checkpoint (Admin only)."""
+    return sms_broadcast.describe_campaign(sms_broadcast.resume_broadcast(db, campaign_id))
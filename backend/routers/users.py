@@ -1,15 +1,16 @@
 import os
-import requests
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 # Local Imports
 from database import get_db
 from crud import crud_users
-from schemas import UserOut, UserUpdate
+from schemas import UserOut, UserUpdate, UserStatusUpdate
 from models import User
-from auth import get_current_user, get_current_admin_user
+from auth import get_current_user, get_current_admin_principal
+from crud.pagination import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from services.webhook_dispatcher import webhook_dispatcher
 
 # --- Router Definition ---
 router = APIRouter(
@@ -28,34 +29,55 @@ def update_current_user_profile(data: UserUpdate, db: Session = Depends(get_db),
     result = crud_users.update_user(db, user_id=current_user.id, data=data)
     updated_user = result["user"]
     
-    # If the CRUD function signals a first-time completion, call the n8n webhook
+    # If the CRUD function signals a first-time completion, call the n8n webhook.
+    # It is delivered (and retried) in the background, so a slow n8n never delays this response.
     if result["send_welcome_sms"]:
         webhook_url = os.getenv("N8N_WELCOME_SMS_WEBHOOK")
         if webhook_url:
-            try:
-                requests.post(webhook_url, json={
-                    "phone_number": updated_user.phone_number,
-                    "first_name": updated_user.first_name,
-                    "last_name": updated_user.last_name
-                }, timeout=5)
-            except requests.RequestException as e:
-                # Log the error but do not fail the main API request
-                print(f"ERROR: Could not call n8n webhook: {e}")
+            webhook_dispatcher.submit(webhook_url, "user.welcome", {
+                "phone_number": updated_user.phone_number,
+                "first_name": updated_user.first_name,
+                "last_name": updated_user.last_name
+            })
 
     return updated_user
 
 
 # --- ADMIN-ONLY Endpoints ---
 
-@router.get("/", response_model=List[UserOut], dependencies=[Depends(get_current_admin_user)])
-def read_all_users(db: Session = Depends(get_db)):
+@router.get("/", response_model=List[UserOut], dependencies=[Depends(get_current_admin_principal)])
+def read_all_users(
+    response: Response,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    role: Optional[str] = None,
+    is_active: Optional[bool] = None,
+    db: Session = Depends(get_db),
+):
     """
-    Retrieves a list of all users. Requires admin privileges.
+    Retrieves users ordered by ID, optionally filtered by role and active flag. Requires admin privileges.
+    When more results exist, the X-Next-Cursor response header holds the cursor for the next page.
     """
-    return crud_users.get_all_users(db)
+    items, next_cursor = crud_users.get_all_users(db, limit=limit, cursor=cursor, role=role, is_active=is_active)
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return items
 
 
-@router.get("/{user_id}", response_model=UserOut, dependencies=[Depends(get_current_admin_user)])
+@router.get("/search", response_model=List[UserOut], dependencies=[Depends(get_current_admin_principal)])
+def search_users(
+    q: str = Query(..., min_length=2, max_length=100),
+    limit: int = Query(10, ge=1, le=50),
+    db: Session = Depends(get_db),
+):
+    """
+    Typeahead search by phone-number prefix (e.g. 0912, +98912, Persian digits) or by part of
+    the first/last name, Arabic and Persian letter variants treated alike. Requires admin privileges.
+    """
+    return crud_users.search_users(db, q=q, limit=limit)
+
+
+@router.get("/{user_id}", response_model=UserOut, dependencies=[Depends(get_current_admin_principal)])
 def read_user_by_id(user_id: int, db: Session = Depends(get_db)):
     """
     Retrieves a single user by their ID. Requires admin privileges.
@@ -65,3 +87,10 @@ def read_user_by_id(user_id: int, db: Session = Depends(get_db)):
         raise HTTPException(status_code=404, detail="User not found")
     return user
 
+
+@router.patch("/{user_id}/status", response_model=UserOut, dependencies=[Depends(get_current_admin_principal)])
+def update_user_status(user_id: int, data: UserStatusUpdate, db: Session = Depends(get_db)):
+    """
+    Changes a user's role or active flag. Requires admin privileges.
+    """
+    return crud_users.update_user_status(db, user_id=user_id, data=data)
@@ -0,0 +1,52 @@
+"""
+Daily birthday / marriage-anniversary campaign.
+
+Finds everyone whose birthday (users.birth_date, CRM birth_date) or marriage
+anniversary (CRM marriage_date) falls on the day in the Persian calendar, gives
+each of them a personal discount and queues a greeting SMS with the code in the
+outbox. Safe to run more than once a day: already rewarded users are skipped.
+Schedule it once a day, e.g. from cron:
+
+    0 9 * * *  cd /path/to/backend && python run_occasion_campaigns.py
+
+Usage:
+    python run_occasion_campaigns.py                        # today, all occasions
+    python run_occasion_campaigns.py --dry-run              # only count recipients
+    python run_occasion_campaigns.py --day 2026-03-20 --occasion birthday
+"""
+import argparse
+from datetime import date
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from database import SessionLocal
+from crud.crud_occasions import OCCASIONS, run_occasion_campaigns
+from crud.crud_discounts import DISCOUNT_CAMPAIGN_BATCH_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--day", type=date.fromisoformat, default=None, help="Gregorian date (default: today).")
+    parser.add_argument("--occasion", choices=OCCASIONS, action="append", dest="occasions")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--percentage", type=int, default=None)
+    parser.add_argument("--valid-days", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=DISCOUNT_CAMPAIGN_BATCH_SIZE)
+    args = parser.parse_args()
+
+    db = SessionLocal()
+    try:
+        results = run_occasion_campaigns(
+            db, day=args.day, occasions=args.occasions, dry_run=args.dry_run,
+            percentage=args.percentage, valid_days=args.valid_days, batch_size=args.batch_size,
+        )
+    finally:
+        db.close()
+    for r in results:
+        print(f"{r['campaign']}: {r['recipients']} recipients, {r['discounts_created']} discounts, "
+              f"{r['sms_queued']} SMS queued, {r['elapsed_ms']:.0f} ms ({r['recipients_per_second']:.0f}/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from datetime import datetime, date
 from typing import Optional, List
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, model_validator
 from enum import Enum
 
 class ReservationStatus(str, Enum):
@@ -22,6 +22,10 @@ class UserUpdate(BaseModel):
     last_name: Optional[str] = None
     birth_date: Optional[date] = None
 
+class UserStatusUpdate(BaseModel):
+    role: Optional[str] = Field(None, pattern=r"^(customer|coworker|manager|admin)$")
+    is_active: Optional[bool] = None
+
 class UserOut(BaseModel):
     id: int; phone_number: str; first_name: Optional[str]; last_name: Optional[str]; role: str; is_active: bool; created_at: datetime
     class Config: from_attributes = True
@@ -30,24 +34,89 @@ class UserCreate(UserBase): role: Optional[str] = "customer"
 
 class ReservationBase(BaseModel):
     user_id: int; service_type: str; date: datetime; notes: Optional[str] = None
-class ReservationCreate(ReservationBase): pass
+class ReservationCreate(ReservationBase): coworker_id: Optional[int] = None
+class RecurrenceRule(BaseModel):
+    start: datetime; interval_days: int = Field(..., ge=1, le=90); count: int = Field(..., ge=1, le=100)
+class ReservationBulkCreate(BaseModel):
+    service_type: str; coworker_id: Optional[int] = None; notes: Optional[str] = None
+    # Either an explicit list of start times or a recurrence rule
+    slots: Optional[List[datetime]] = Field(None, min_length=1, max_length=100)
+    recurrence: Optional[RecurrenceRule] = None
+    # Insert nothing if any slot conflicts
+    all_or_nothing: bool = False
+
+    @model_validator(mode="after")
+    def check_slots_or_recurrence(self):
+        if (self.slots is None) == (self.recurrence is None):
+            raise ValueError("Provide either slots or recurrence")
+        return self
+
 class ReservationUpdate(BaseModel):
     status: Optional[ReservationStatus] = None; payment_status: Optional[PaymentStatus] = None; notes: Optional[str] = None
 class ReservationResponse(ReservationBase):
-    id: int; coworker_id: Optional[int]; status: ReservationStatus; payment_status: PaymentStatus; created_at: datetime; updated_at: datetime
+    id: int; coworker_id: Optional[int]; status: ReservationStatus; payment_status: PaymentStatus; created_at: datetime; updated_at: datetime; version: int
     class Config: from_attributes = True
 
+class BulkSlotResult(BaseModel):
+    date: datetime; status: str; reservation: Optional[ReservationResponse] = None; conflict_reservation_id: Optional[int] = None
+class ReservationBulkResponse(BaseModel):
+    created: int; conflicts: int; results: List[BulkSlotResult]
+
+class CalendarReservation(BaseModel):
+    id: int; date: datetime; end: datetime; service_type: str; status: ReservationStatus; payment_status: PaymentStatus
+    notes: Optional[str] = None; version: int
+    customer_id: int; customer_name: Optional[str] = None; customer_phone: str
+    coworker_id: Optional[int] = None; coworker_name: Optional[str] = None
+    payment_id: Optional[int] = None; payment_amount: Optional[float] = None; payment_state: Optional[str] = None
+class CalendarResponse(BaseModel):
+    date_from: date; date_to: date; reservations: List[CalendarReservation]
+
+class DayAvailability(BaseModel):
+    date: date; slots: List[datetime]
+class AvailabilityResponse(BaseModel):
+    service_type: str; coworker_id: Optional[int]; duration_minutes: int; days: List[DayAvailability]
+
 class PaymentBase(BaseModel): user_id: int; reservation_id: int; amount: float
-class PaymentCreate(PaymentBase): pass
+class PaymentCreate(BaseModel):
+    user_id: int; reservation_id: int
+    # Either a quote from POST /quotes (preferred) or a client-supplied amount
+    quote_token: Optional[str] = None; amount: Optional[float] = None
 class PaymentResponse(PaymentBase):
-    id: int; status: PaymentStatus; created_at: datetime
+    id: int; status: PaymentStatus; created_at: datetime; discount_id: Optional[int] = None; discount_amount: Optional[float] = None
     class Config: from_attributes = True
 
 class DiscountCreate(BaseModel): user_id: int; discount_type: str; percentage: int; expires_at: Optional[datetime] = None
+class DiscountRedeem(BaseModel): code: str = Field(..., min_length=1, max_length=50)
+class DiscountSegment(BaseModel):
+    # Explicit recipients, or every user with the given role
+    user_ids: Optional[List[int]] = None; role: Optional[str] = "customer"; active_only: bool = True
+class DiscountCampaignCreate(BaseModel):
+    campaign: str = Field(..., min_length=1, max_length=50); discount_type: str; percentage: int = Field(..., ge=1, le=100)
+    max_amount: Optional[float] = None; expires_at: Optional[datetime] = None
+    segment: DiscountSegment = DiscountSegment(); code_length: int = Field(8, ge=6, le=16); return_codes: bool = False
+class DiscountCampaignResult(BaseModel):
+    campaign: str; recipients: int; created: int; batches: int; elapsed_ms: float; codes_per_second: float
+    codes: Optional[List[str]] = None
+class OccasionCampaignRun(BaseModel):
+    # Defaults: today, every occasion, OCCASION_DISCOUNT_PERCENT / OCCASION_DISCOUNT_VALID_DAYS
+    day: Optional[date] = None; occasions: Optional[List[str]] = None; dry_run: bool = False
+    percentage: Optional[int] = Field(None, ge=1, le=100); valid_days: Optional[int] = Field(None, ge=1, le=90)
+class OccasionCampaignResult(BaseModel):
+    occasion: str; day: date; campaign: str; month_days: List[int]; dry_run: bool
+    recipients: int; discounts_created: int; sms_queued: int; batches: int; elapsed_ms: float; recipients_per_second: float
 class DiscountResponse(BaseModel):
     id: int; code: str; percentage: int; used: bool
     class Config: from_attributes = True
 
+# ==============================
+# Quotes
+# ==============================
+class QuoteRequest(BaseModel): reservation_id: int; discount_code: Optional[str] = None
+class QuoteResponse(BaseModel):
+    reservation_id: int; service_type: str; price: float
+    discount_id: Optional[int] = None; discount_code: Optional[str] = None; discount_amount: float; referral_amount: float
+    amount: float; quote_token: str; expires_at: datetime
+
 # ==============================
 # Referrals (Corrected)
 # ==============================
@@ -65,3 +134,51 @@ class ReferralResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class ReferralStats(BaseModel):
+    user_id: Optional[int] = None; name: Optional[str] = None; phone: str
+    direct_invites: int; converted_invites: int; conversion_rate: float
+    # Everyone reached through chains of invites, and the longest chain
+    network_size: int; chain_depth: int; invited_by_user_id: Optional[int] = None
+class ReferralLeaderboardEntry(ReferralStats): rank: int
+
+# ==============================
+# SMS Outbox
+# ==============================
+class SmsOutboxResponse(BaseModel):
+    id: int
+    phone_number: str
+    status: str
+    attempts: int
+    next_attempt_at: datetime
+    last_error: Optional[str] = None
+    provider_message_id: Optional[str] = None
+    created_at: datetime
+    sent_at: Optional[datetime] = None
+
+    class Config:
+        from_attributes = True
+
+class SmsBroadcastCreate(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100); message: str = Field(..., min_length=1, max_length=700)
+    # Same recipient selection as discount campaigns
+    segment: DiscountSegment = DiscountSegment()
+class SmsCampaignResponse(BaseModel):
+    id: int; name: str; status: str; total_recipients: int; processed: int; sent: int; failed: int
+    last_error: Optional[str] = None; created_at: datetime; started_at: Optional[datetime] = None; finished_at: Optional[datetime] = None
+    # Derived: share of recipients processed, and messages handled per second since the start
+    progress: float = 0.0; elapsed_seconds: float = 0.0; messages_per_second: float = 0.0
+    class Config: from_attributes = True
+class SmsCampaignFailureResponse(BaseModel):
+    id: int; user_id: int; phone_number: str; error: Optional[str] = None; created_at: datetime
+    class Config: from_attributes = True
+
+# ==============================
+# Reports
+# ==============================
+class BookingReportRow(BaseModel):
+    day: date; service_type: Optional[str] = None; coworker_id: Optional[int] = None
+    bookings: int; cancellations: int; payments: int; revenue: float
+class DiscountReportRow(BaseModel):
+    day: date; discount_type: str; applied: int
+class ReportSummary(BaseModel):
+    date_from: date; date_to: date; bookings: int; cancellations: int; payments: int; revenue: float; discounts_applied: int
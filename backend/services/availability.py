@@ -0,0 +1,147 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy.orm import Session
+
+from models import Reservation
+from services.service_catalog import CLOSING_HOUR, OPENING_HOUR, get_service_duration
+
+# --- Availability Configuration ---
+SLOT_MINUTES = 15  # resolution of the per-day bitmaps
+AVAILABILITY_STEP_MINUTES = int(os.getenv("AVAILABILITY_STEP_MINUTES", "60"))
+# Other worker processes book too, so a cached day is reloaded after this many seconds.
+AVAILABILITY_INDEX_TTL_SECONDS = float(os.getenv("AVAILABILITY_INDEX_TTL_SECONDS", "30"))
+AVAILABILITY_INDEX_MAX_DAYS = int(os.getenv("AVAILABILITY_INDEX_MAX_DAYS", "120"))
+
+
+def reservation_mask(start: datetime, service_type: str) -> int:
+    """Bitmap of the SLOT_MINUTES slots of its day that a reservation occupies."""
+    first_slot = (start.hour * 60 + start.minute) // SLOT_MINUTES
+    end_minute = start.hour * 60 + start.minute + get_service_duration(service_type)
+    last_slot = -(-end_minute // SLOT_MINUTES)  # ceil
+    return ((1 << (last_slot - first_slot)) - 1) << first_slot
+
+
+class DayIndex:
+    """
+    Occupied slots of one day, one bitmap per coworker lane.
+    Lane None holds reservations without an assigned coworker.
+    """
+
+    def __init__(self):
+        self.loaded_at = time.monotonic()
+        self._reservations: Dict[Optional[int], Dict[int, int]] = {}
+        self._lanes: Dict[Optional[int], int] = {}
+
+    def add(self, reservation_id: int, coworker_id: Optional[int], mask: int):
+        lane = self._reservations.setdefault(coworker_id, {})
+        lane[reservation_id] = mask
+        self._lanes[coworker_id] = self._lanes.get(coworker_id, 0) | mask
+
+    def remove(self, reservation_id: int):
+        for coworker_id, lane in self._reservations.items():
+            if lane.pop(reservation_id, None) is not None:
+                # Rebuild the lane so overlapping reservations keep their bits.
+                bitmap = 0
+                for mask in lane.values():
+                    bitmap |= mask
+                self._lanes[coworker_id] = bitmap
+                return
+
+    def busy(self, coworker_id: Optional[int]) -> int:
+        """
+        Slots that block a booking: the coworker's own lane plus unassigned reservations,
+        or every lane when no coworker is requested (salon-wide check).
+        """
+        if coworker_id is None:
+            bitmap = 0
+            for lane in self._lanes.values():
+                bitmap |= lane
+            return bitmap
+        return self._lanes.get(coworker_id, 0) | self._lanes.get(None, 0)
+
+
+class AvailabilityIndex:
+    """
+    In-memory per-day interval index built from non-cancelled reservations.
+    Days are loaded lazily (a whole range in one query), kept up to date by the
+    reservation CRUD functions and expire after AVAILABILITY_INDEX_TTL_SECONDS.
+    """
+
+    def __init__(self, ttl: float = AVAILABILITY_INDEX_TTL_SECONDS, max_days: int = AVAILABILITY_INDEX_MAX_DAYS):
+        self.ttl = ttl
+        self.max_days = max_days
+        self._days: "OrderedDict[date, DayIndex]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fresh(self, day: date) -> Optional[DayIndex]:
+        index = self._days.get(day)
+        if index is None or time.monotonic() - index.loaded_at > self.ttl:
+            return None
+        return index
+
+    def _load(self, db: Session, days: List[date]) -> Dict[date, DayIndex]:
+        start = datetime.combine(min(days), datetime.min.time())
+        end = datetime.combine(max(days) + timedelta(days=1), datetime.min.time())
+        rows = (
+            db.query(Reservation.id, Reservation.date, Reservation.service_type, Reservation.coworker_id)
+            .filter(Reservation.date >= start, Reservation.date < end, Reservation.status != "cancelled")
+            .all()
+        )
+        loaded = {day: DayIndex() for day in days}
+        for row in rows:
+            index = loaded.get(row.date.date())
+            if index is not None:
+                index.add(row.id, row.coworker_id, reservation_mask(row.date, row.service_type))
+        with self._lock:
+            for day, index in loaded.items():
+                self._days[day] = index
+                self._days.move_to_end(day)
+            while len(self._days) > self.max_days:
+                self._days.popitem(last=False)
+        return loaded
+
+    def free_slots(
+        self, db: Session, start_day: date, service_type: str, coworker_id: Optional[int] = None, days: int = 1
+    ) -> Dict[date, List[datetime]]:
+        """Returns the free start times for `service_type` on each of `days` days from `start_day`."""
+        wanted = [start_day + timedelta(days=offset) for offset in range(days)]
+        with self._lock:
+            indexes = {day: self._fresh(day) for day in wanted}
+        missing = [day for day, index in indexes.items() if index is None]
+        if missing:
+            indexes.update(self._load(db, missing))
+
+        duration = get_service_duration(service_type)
+        now = datetime.now()
+        result = {}
+        with self._lock:
+            for day in wanted:
+                busy = indexes[day].busy(coworker_id)
+                day_start = datetime.combine(day, datetime.min.time())
+                slots = []
+                minute = OPENING_HOUR * 60
+                while minute + duration <= CLOSING_HOUR * 60:
+                    slot = day_start + timedelta(minutes=minute)
+                    if slot > now and not busy & reservation_mask(slot, service_type):
+                        slots.append(slot)
+                    minute += AVAILABILITY_STEP_MINUTES
+                result[day] = slots
+        return result
+
+    def refresh(self, reservation: Reservation) -> None:
+        """Re-indexes one reservation after it was created, updated or cancelled."""
+        with self._lock:
+            index = self._days.get(reservation.date.date())
+            if index is None:
+                return
+            index.remove(reservation.id)
+            if reservation.status != "cancelled":
+                index.add(reservation.id, reservation.coworker_id, reservation_mask(reservation.date, reservation.service_type))
+
+
+availability_index = AvailabilityIndex()
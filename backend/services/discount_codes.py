@@ -0,0 +1,34 @@
+import os
+import secrets
+from typing import Iterable, Set
+
+# --- Discount Code Configuration ---
+# Upper-case letters and digits without the look-alikes 0/O, 1/I/L, so codes survive being read out or retyped.
+CODE_ALPHABET = "23456789ABCDEFGHJKMNPQRSTUVWXYZ"
+# 31^8 ≈ 8.5e11 possible codes: guessing a live one among 100k takes ~10^7 attempts on average.
+DISCOUNT_CODE_LENGTH = int(os.getenv("DISCOUNT_CODE_LENGTH", "8"))
+
+
+def generate_code(length: int = DISCOUNT_CODE_LENGTH) -> str:
+    """Returns one random code from a cryptographically secure source."""
+    # One random draw per code, spelled out in base len(CODE_ALPHABET).
+    value = secrets.randbelow(len(CODE_ALPHABET) ** length)
+    chars = []
+    for _ in range(length):
+        value, digit = divmod(value, len(CODE_ALPHABET))
+        chars.append(CODE_ALPHABET[digit])
+    return "".join(chars)
+
+
+def generate_codes(count: int, length: int = DISCOUNT_CODE_LENGTH, exclude: Iterable[str] = ()) -> Set[str]:
+    """
+    Returns `count` distinct codes. Duplicates (and codes in `exclude`) are discarded in memory,
+    so the set is collision-free before it ever reaches the database.
+    """
+    excluded = set(exclude)
+    codes: Set[str] = set()
+    while len(codes) < count:
+        code = generate_code(length)
+        if code not in excluded:
+            codes.add(code)
+    return codes
@@ -0,0 +1,126 @@
+import asyncio
+import itertools
+import json
+import os
+import threading
+from datetime import date, timedelta
+from typing import Dict, Optional, Set
+
+from services.service_catalog import get_service_duration
+
+# --- Event Hub Configuration ---
+# Events a slow subscriber may fall behind before it is disconnected (clients reconnect and reload).
+EVENT_HUB_QUEUE_SIZE = int(os.getenv("EVENT_HUB_QUEUE_SIZE", "100"))
+
+
+class Subscription:
+    """One connected client: an asyncio queue bound to the event loop it was created on, plus its filters."""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, day: Optional[date], coworker_id: Optional[int]):
+        self.loop = loop
+        self.day = day
+        self.coworker_id = coworker_id
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=EVENT_HUB_QUEUE_SIZE)
+        self.overflowed = False
+
+    def matches(self, event: dict) -> bool:
+        return self.coworker_id is None or event.get("coworker_id") == self.coworker_id
+
+    def _put(self, item):
+        # Runs on the subscriber's event loop.
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(item)
+        except asyncio.QueueFull:
+            self.overflowed = True
+            self.queue.get_nowait()
+            self.queue.put_nowait(None)  # tells the stream to close
+
+
+class EventHub:
+    """
+    In-process fan-out of reservation events to streaming clients.
+
+    Subscribers are indexed by day, so publishing only touches the clients watching that day
+    (plus the unfiltered ones) and idle clients cost nothing but a parked coroutine.
+    publish() is thread-safe and never blocks: CRUD functions run in FastAPI's thread pool,
+    so events are handed to each subscriber's loop with call_soon_threadsafe.
+
+    Only clients connected to the same process see an event. A broker-backed hub
+    (Redis pub/sub, Postgres LISTEN/NOTIFY) can replace it by providing the same
+    subscribe / unsubscribe / publish methods.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._by_day: Dict[Optional[date], Set[Subscription]] = {}
+        self._ids = itertools.count(1)
+
+    def subscribe(self, day: Optional[date] = None, coworker_id: Optional[int] = None) -> Subscription:
+        """Registers a subscriber on the running event loop. day=None receives events of every day."""
+        subscription = Subscription(asyncio.get_running_loop(), day, coworker_id)
+        with self._lock:
+            self._by_day.setdefault(day, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        with self._lock:
+            subscribers = self._by_day.get(subscription.day)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._by_day[subscription.day]
+
+    def publish(self, event: dict):
+        """Delivers an event to every matching subscriber. Events carry the day(s) they touch in "days"."""
+        event = dict(event, id=next(self._ids))
+        with self._lock:
+            targets = set(self._by_day.get(None, ()))
+            for day in event.pop("days"):
+                targets.update(self._by_day.get(day, ()))
+        for subscription in targets:
+            if subscription.matches(event):
+                try:
+                    subscription.loop.call_soon_threadsafe(subscription._put, event)
+                except RuntimeError:
+                    # The subscriber's loop is closed; it will be dropped when its stream ends.
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                "subscribers": sum(len(subscribers) for subscribers in self._by_day.values()),
+                "days": len(self._by_day),
+            }
+
+
+event_hub = EventHub()
+
+
+def reservation_event(action: str, reservation) -> dict:
+    """
+    Builds the public event for a reservation change. It carries no customer details, so any
+    authenticated client may receive it; staff reload the day view for names and payments.
+    """
+    return {
+        "type": f"reservation.{action}",
+        "days": [reservation.date.date()],
+        "reservation_id": reservation.id,
+        "date": reservation.date.isoformat(),
+        "end": (reservation.date + timedelta(minutes=get_service_duration(reservation.service_type))).isoformat(),
+        "service_type": reservation.service_type,
+        "status": reservation.status,
+        "coworker_id": reservation.coworker_id,
+        "version": reservation.version,
+    }
+
+
+def publish_reservation(action: str, reservation):
+    """Publishes a created / updated / cancelled event. Call it after the transaction has committed."""
+    event_hub.publish(reservation_event(action, reservation))
+
+
+def format_sse(event: dict) -> str:
+    """Serializes an event as a Server-Sent Events message."""
+    return f"id: {event['id']}\nevent: {event['type']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
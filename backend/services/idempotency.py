@@ -0,0 +1,240 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+from datetime import datetime, timedelta
+from typing import Callable, Optional
+
+from fastapi import HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from sqlalchemy import delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import IdempotencyRecord
+
+# --- Idempotency Configuration ---
+# "postgres" works with any number of workers; "memory" must only be used with a single process.
+IDEMPOTENCY_STORE_BACKEND = os.getenv("IDEMPOTENCY_STORE", "postgres").lower()
+# How long a completed response can be replayed.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+# How long a request may hold its key before a retry may take over (e.g. after a crash).
+IDEMPOTENCY_LOCK_SECONDS = int(os.getenv("IDEMPOTENCY_LOCK_SECONDS", "60"))
+IDEMPOTENCY_SWEEP_INTERVAL_SECONDS = int(os.getenv("IDEMPOTENCY_SWEEP_INTERVAL_SECONDS", "600"))
+MAX_IDEMPOTENCY_KEY_LENGTH = 255
+
+# status_code is None while the original request is still in progress.
+StoredResponse = namedtuple("StoredResponse", ["fingerprint", "status_code", "body"])
+
+
+class IdempotencyStore(ABC):
+    """
+    Remembers the response of each (user, operation, Idempotency-Key).
+    claim() returns None when the caller now owns the key and must run the request,
+    otherwise the stored (or in-progress) entry. save() does not commit, so the response is
+    stored in the same transaction as the write it describes; release() is only called by the
+    owner of the key and drops it.
+    """
+
+    @abstractmethod
+    def claim(self, db: Session, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        ...
+
+    @abstractmethod
+    def save(self, db: Session, key: str, fingerprint: str, status_code: int, body: str) -> None:
+        ...
+
+    @abstractmethod
+    def release(self, db: Session, key: str) -> None:
+        ...
+
+
+class PostgresIdempotencyStore(IdempotencyStore):
+    """Idempotency store backed by the idempotency_keys table."""
+
+    def __init__(self):
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def claim(self, db: Session, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        now = datetime.now()
+        stmt = insert(IdempotencyRecord).values(
+            key=key, fingerprint=fingerprint, created_at=now, expires_at=now + timedelta(seconds=IDEMPOTENCY_LOCK_SECONDS)
+        )
+        # An expired entry (finished or abandoned) is taken over in the same statement.
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[IdempotencyRecord.key],
+            set_={
+                "fingerprint": stmt.excluded.fingerprint,
+                "status_code": None,
+                "response_body": None,
+                "created_at": stmt.excluded.created_at,
+                "expires_at": stmt.excluded.expires_at,
+            },
+            where=IdempotencyRecord.expires_at < now,
+        )
+        claimed = db.execute(stmt.returning(IdempotencyRecord.key)).first()
+        if claimed is not None:
+            self._maybe_sweep(db)
+            # Commit so concurrent retries see the key as taken.
+            db.commit()
+            return None
+
+        row = db.query(
+            IdempotencyRecord.fingerprint, IdempotencyRecord.status_code, IdempotencyRecord.response_body
+        ).filter(IdempotencyRecord.key == key).first()
+        db.rollback()
+        if row is None:
+            # Swept between the two statements; report it as busy and let the client retry.
+            return StoredResponse(fingerprint, None, None)
+        return StoredResponse(*row)
+
+    def save(self, db: Session, key: str, fingerprint: str, status_code: int, body: str) -> None:
+        db.query(IdempotencyRecord).filter(IdempotencyRecord.key == key).update(
+            {
+                "status_code": status_code,
+                "response_body": body,
+                "expires_at": datetime.now() + timedelta(seconds=IDEMPOTENCY_TTL_SECONDS),
+            },
+            synchronize_session=False,
+        )
+
+    def release(self, db: Session, key: str) -> None:
+        db.rollback()
+        db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.key == key, IdempotencyRecord.status_code.is_(None)))
+        db.commit()
+
+    def _maybe_sweep(self, db: Session) -> None:
+        """Deletes expired entries at most once per IDEMPOTENCY_SWEEP_INTERVAL_SECONDS (per process)."""
+        now = time.monotonic()
+        with self._sweep_lock:
+            if now - self._last_sweep < IDEMPOTENCY_SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        db.execute(delete(IdempotencyRecord).where(IdempotencyRecord.expires_at < datetime.now()))
+
+
+class MemoryIdempotencyStore(IdempotencyStore):
+    """In-process idempotency store with TTL expiry, for single-node deployments."""
+
+    def __init__(self):
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def claim(self, db: Session, key: str, fingerprint: str) -> Optional[StoredResponse]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_sweep >= IDEMPOTENCY_SWEEP_INTERVAL_SECONDS:
+                self._last_sweep = now
+                for expired in [k for k, (_, expires_at) in self._entries.items() if expires_at < now]:
+                    del self._entries[expired]
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] >= now:
+                return entry[0]
+            self._entries[key] = (StoredResponse(fingerprint, None, None), now + IDEMPOTENCY_LOCK_SECONDS)
+            return None
+
+    def save(self, db: Session, key: str, fingerprint: str, status_code: int, body: str) -> None:
+        with self._lock:
+            self._entries[key] = (
+                StoredResponse(fingerprint, status_code, body),
+                time.monotonic() + IDEMPOTENCY_TTL_SECONDS,
+            )
+
+    def release(self, db: Session, key: str) -> None:
+        # Unlike the table, this store is not rolled back with the session: drop a saved response too.
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+def _build_store() -> IdempotencyStore:
+    if IDEMPOTENCY_STORE_BACKEND == "memory":
+        return MemoryIdempotencyStore()
+    return PostgresIdempotencyStore()
+
+
+idempotency_store = _build_store()
+
+
+def _replay(stored: StoredResponse) -> JSONResponse:
+    return JSONResponse(
+        content=json.loads(stored.body),
+        status_code=stored.status_code,
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+def run_idempotent(
+    db: Session,
+    idempotency_key: Optional[str],
+    user_id: int,
+    operation: str,
+    payload,
+    call: Callable,
+    response_model,
+    status_code: int,
+):
+    """
+    Runs call(before_commit) at most once per (user, operation, Idempotency-Key) and replays its
+    stored response to retries. Without a key the call simply runs (with before_commit=None).
+    The CRUD function must call before_commit(result) right before its commit, so the response is
+    stored in the same transaction as the write: a crash in between leaves neither behind.
+
+    Final outcomes (success and client errors such as 409) are stored; server errors release the key
+    so the client may retry. Reusing a key with a different body gives 422, and a retry that arrives
+    while the first request is still running gives 409.
+    """
+    if not idempotency_key:
+        return call(None)
+    if len(idempotency_key) > MAX_IDEMPOTENCY_KEY_LENGTH:
+        raise HTTPException(status_code=400, detail="Idempotency-Key is too long.")
+
+    key = hashlib.sha256(f"{user_id}:{operation}:{idempotency_key}".encode()).hexdigest()
+    body = json.dumps(jsonable_encoder(payload), sort_keys=True, separators=(",", ":"))
+    fingerprint = hashlib.sha256(body.encode()).hexdigest()
+
+    stored = idempotency_store.claim(db, key, fingerprint)
+    if stored is not None:
+        if stored.fingerprint != fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used with a different request.")
+        if stored.status_code is None:
+            raise HTTPException(
+                status_code=409,
+                detail="A request with this Idempotency-Key is still being processed.",
+                headers={"Retry-After": "1"},
+            )
+        return _replay(stored)
+
+    stored_content = []
+
+    def save_response(result):
+        db.flush()
+        content = jsonable_encoder(response_model.model_validate(result, from_attributes=True))
+        idempotency_store.save(db, key, fingerprint, status_code, json.dumps(content, ensure_ascii=False))
+        stored_content.append(content)
+
+    try:
+        result = call(save_response)
+    except HTTPException as e:
+        if e.status_code >= 500:
+            idempotency_store.release(db, key)
+        else:
+            db.rollback()
+            idempotency_store.save(db, key, fingerprint, e.status_code, json.dumps({"detail": jsonable_encoder(e.detail)}))
+            db.commit()
+        raise
+    except Exception:
+        idempotency_store.release(db, key)
+        raise
+
+    if stored_content:
+        return stored_content[0]
+    # The call finished without committing through before_commit (nothing to write).
+    save_response(result)
+    db.commit()
+    return stored_content[0]
@@ -0,0 +1,175 @@
+import hmac
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import delete, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import Session
+
+from models import OtpCode
+from services.persian_text import normalize_persian
+
+# --- OTP Store Configuration ---
+# "postgres" works with any number of workers; "memory" avoids the database entirely
+# but must only be used when the API runs as a single process.
+OTP_STORE_BACKEND = os.getenv("OTP_STORE", "postgres").lower()
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "180"))
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+OTP_SWEEP_INTERVAL_SECONDS = int(os.getenv("OTP_SWEEP_INTERVAL_SECONDS", "300"))
+
+
+def _too_many_attempts() -> HTTPException:
+    return HTTPException(status_code=429, detail="Too many attempts. Please request a new code.")
+
+
+def _codes_match(stored: str, submitted: str) -> bool:
+    """
+    Constant-time comparison of the stored code with what the user typed. Persian / Arabic-Indic
+    digits are accepted; anything else that is not a plain ASCII number simply does not match.
+    """
+    submitted = normalize_persian(submitted)
+    if not (submitted.isascii() and submitted.isdigit()):
+        return False
+    return hmac.compare_digest(stored.encode(), submitted.encode())
+
+
+class OtpStore(ABC):
+    """
+    Stores the single live OTP of each phone number.
+    save() does not commit, so the code can be written in the same transaction as its SMS;
+    verify() consumes the code on success and counts failed attempts.
+    """
+
+    @abstractmethod
+    def save(self, db: Session, phone: str, code: str, ttl_seconds: int = OTP_TTL_SECONDS) -> None:
+        ...
+
+    @abstractmethod
+    def verify(self, db: Session, phone: str, code: str) -> bool:
+        ...
+
+    @abstractmethod
+    def purge_expired(self, db: Optional[Session] = None) -> int:
+        ...
+
+
+class PostgresOtpStore(OtpStore):
+    """OTP store backed by the otp_codes table (one row per phone number)."""
+
+    def __init__(self):
+        self._last_sweep = 0.0
+        self._sweep_lock = threading.Lock()
+
+    def save(self, db: Session, phone: str, code: str, ttl_seconds: int = OTP_TTL_SECONDS) -> None:
+        # Use naive datetime, which will be interpreted as Asia/Tehran by the DB
+        now = datetime.now()
+        stmt = insert(OtpCode).values(
+            phone_number=phone, code=code, attempts=0, expires_at=now + timedelta(seconds=ttl_seconds), created_at=now
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[OtpCode.phone_number],
+            set_={
+                "code": stmt.excluded.code,
+                "attempts": 0,
+                "expires_at": stmt.excluded.expires_at,
+                "created_at": stmt.excluded.created_at,
+            },
+        )
+        db.execute(stmt)
+        self._maybe_sweep(db)
+
+    def verify(self, db: Session, phone: str, code: str) -> bool:
+        now = datetime.now()
+        # Count the attempt and read the live code in one statement.
+        row = db.execute(
+            update(OtpCode)
+            .where(OtpCode.phone_number == phone, OtpCode.expires_at >= now)
+            .values(attempts=OtpCode.attempts + 1)
+            .returning(OtpCode.code, OtpCode.attempts)
+            .execution_options(synchronize_session=False)
+        ).first()
+        if row is None:
+            return False
+
+        if row.attempts > OTP_MAX_ATTEMPTS:
+            db.execute(delete(OtpCode).where(OtpCode.phone_number == phone))
+            db.commit()
+            raise _too_many_attempts()
+
+        if not _codes_match(row.code, code):
+            db.commit()
+            return False
+
+        db.execute(delete(OtpCode).where(OtpCode.phone_number == phone))
+        db.commit()
+        return True
+
+    def purge_expired(self, db: Optional[Session] = None) -> int:
+        result = db.execute(delete(OtpCode).where(OtpCode.expires_at < datetime.now()))
+        return result.rowcount
+
+    def _maybe_sweep(self, db: Session) -> None:
+        """Purges expired rows at most once per OTP_SWEEP_INTERVAL_SECONDS (per process)."""
+        now = time.monotonic()
+        with self._sweep_lock:
+            if now - self._last_sweep < OTP_SWEEP_INTERVAL_SECONDS:
+                return
+            self._last_sweep = now
+        self.purge_expired(db)
+
+
+class MemoryOtpStore(OtpStore):
+    """In-process OTP store with TTL expiry, for single-node deployments."""
+
+    def __init__(self):
+        self._codes = {}
+        self._lock = threading.Lock()
+        self._last_sweep = 0.0
+
+    def save(self, db: Session, phone: str, code: str, ttl_seconds: int = OTP_TTL_SECONDS) -> None:
+        now = time.monotonic()
+        with self._lock:
+            self._codes[phone] = [code, now + ttl_seconds, 0]
+            if now - self._last_sweep >= OTP_SWEEP_INTERVAL_SECONDS:
+                self._last_sweep = now
+                self._purge_locked(now)
+
+    def verify(self, db: Session, phone: str, code: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            entry = self._codes.get(phone)
+            if entry is None or entry[1] < now:
+                self._codes.pop(phone, None)
+                return False
+            entry[2] += 1
+            if entry[2] > OTP_MAX_ATTEMPTS:
+                del self._codes[phone]
+                raise _too_many_attempts()
+            if not _codes_match(entry[0], code):
+                return False
+            del self._codes[phone]
+            return True
+
+    def purge_expired(self, db: Optional[Session] = None) -> int:
+        with self._lock:
+            return self._purge_locked(time.monotonic())
+
+    def _purge_locked(self, now: float) -> int:
+        expired = [phone for phone, entry in self._codes.items() if entry[1] < now]
+        for phone in expired:
+            del self._codes[phone]
+        return len(expired)
+
+
+def _build_store() -> OtpStore:
+    if OTP_STORE_BACKEND == "memory":
+        return MemoryOtpStore()
+    return PostgresOtpStore()
+
+
+otp_store = _build_store()
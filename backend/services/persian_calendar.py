@@ -0,0 +1,75 @@
+import re
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+from services.persian_text import normalize_persian
+
+# Birthdays and anniversaries are celebrated on the Persian (Jalali) date, so the month-day
+# columns (users.birth_md, customers_crm.birth_md / marriage_md) hold the Jalali month * 100 + day.
+_DATE = re.compile(r"^(\d{2,4})[/\-.](\d{1,2})[/\-.](\d{1,2})")
+# Years below this are Jalali (e.g. 1370/05/12), anything else Gregorian (e.g. 1991-08-03).
+_GREGORIAN_YEAR_FROM = 1700
+
+
+def gregorian_to_jalali(day: date) -> Tuple[int, int, int]:
+    """(year, month, day) in the Persian calendar."""
+    g_days_before_month = [0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334]
+    gy, gm, gd = day.year, day.month, day.day
+    gy2 = gy + 1 if gm > 2 else gy
+    days = 355666 + 365 * gy + (gy2 + 3) // 4 - (gy2 + 99) // 100 + (gy2 + 399) // 400 + gd + g_days_before_month[gm - 1]
+    jy = -1595 + 33 * (days // 12053)
+    days %= 12053
+    jy += 4 * (days // 1461)
+    days %= 1461
+    if days > 365:
+        jy += (days - 1) // 365
+        days = (days - 1) % 365
+    if days < 186:
+        return jy, 1 + days // 31, 1 + days % 31
+    return jy, 7 + (days - 186) // 30, 1 + (days - 186) % 30
+
+
+def month_day(month: int, day: int) -> int:
+    return month * 100 + day
+
+
+def jalali_month_day(value) -> Optional[int]:
+    """
+    The Jalali month-day (MMDD as an int) of a date object or a date string. Strings may be Jalali
+    ("1370/05/12", Persian digits allowed) or Gregorian ("1991-08-03"). Returns None if unparseable.
+    """
+    if value is None:
+        return None
+    if isinstance(value, date):
+        _, month, day = gregorian_to_jalali(value)
+        return month_day(month, day)
+    match = _DATE.match(normalize_persian(str(value)))
+    if not match:
+        return None
+    year, month, day = (int(part) for part in match.groups())
+    if year >= _GREGORIAN_YEAR_FROM:
+        try:
+            return jalali_month_day(date(year, month, day))
+        except ValueError:
+            return None
+    if not (1 <= month <= 12 and 1 <= day <= (31 if month <= 6 else 30)):
+        return None
+    return month_day(month, day)
+
+
+def occasion_month_days(day: date) -> List[int]:
+    """
+    Month-days celebrated on the given Gregorian day. On the last day of a common Jalali year
+    (Esfand 29) people born on Esfand 30 of a leap year are included as well.
+    """
+    _, month, jday = gregorian_to_jalali(day)
+    days = [month_day(month, jday)]
+    if month == 12 and jday == 29 and gregorian_to_jalali(day + timedelta(days=1))[1] == 1:
+        days.append(month_day(12, 30))
+    return days
+
+
+def format_jalali(day: date) -> str:
+    """1405/07/26"""
+    year, month, jday = gregorian_to_jalali(day)
+    return f"{year}/{month:02d}/{jday:02d}"
@@ -0,0 +1,57 @@
+import re
+from typing import Optional
+
+# Arabic code points that Persian keyboards and older devices produce for Persian letters.
+_CHAR_MAP = {
+    "ي": "ی",  # ي Arabic yeh -> ی Persian yeh
+    "ى": "ی",  # ى Alef maksura -> ی
+    "ك": "ک",  # ك Arabic kaf -> ک Persian keheh
+    "ة": "ه",  # ة Teh marbuta -> ه
+    "ۀ": "ه",  # ۀ Heh with yeh -> ه
+    "أ": "ا",  # أ -> ا
+    "إ": "ا",  # إ -> ا
+    "\u200c": " ",  # zero-width non-joiner (نیم‌فاصله) separates words
+}
+# Persian (۰-۹) and Arabic-Indic (٠-٩) digits -> ASCII
+_CHAR_MAP.update({chr(0x06F0 + i): str(i) for i in range(10)})
+_CHAR_MAP.update({chr(0x0660 + i): str(i) for i in range(10)})
+_TRANSLATION = str.maketrans(_CHAR_MAP)
+
+# Harakat, tatweel and other marks that do not change how a name is searched
+_DIACRITICS = re.compile("[\u064b-\u065f\u0670\u0640]")
+_SPACES = re.compile(r"\s+")
+
+# For SQL translate(): the single-character mappings above, as (from, to) strings.
+SQL_TRANSLATE_FROM = "".join(k for k, v in _CHAR_MAP.items() if len(v) == 1)
+SQL_TRANSLATE_TO = "".join(v for k, v in _CHAR_MAP.items() if len(v) == 1)
+
+
+def normalize_persian(value: Optional[str]) -> str:
+    """
+    Canonical form used for searching: Arabic yeh/kaf and digit variants mapped to their Persian /
+    ASCII forms, diacritics removed, lower-cased and whitespace collapsed.
+    """
+    if not value:
+        return ""
+    value = _DIACRITICS.sub("", value.translate(_TRANSLATION))
+    return _SPACES.sub(" ", value).strip().lower()
+
+
+def search_name(first_name: Optional[str], last_name: Optional[str]) -> Optional[str]:
+    """The normalized "first last" stored in users.search_name."""
+    return normalize_persian(f"{first_name or ''} {last_name or ''}") or None
+
+
+def normalize_phone_query(value: str) -> Optional[str]:
+    """
+    Returns the digits of a phone-number query in the stored 09... form (accepting +98 / 98 / 9...),
+    or None if the query is not a number.
+    """
+    digits = re.sub(r"[\s\-+()]", "", normalize_persian(value))
+    if not digits.isdigit():
+        return None
+    if digits.startswith("98") and len(digits) > 2:
+        digits = "0" + digits[2:]
+    elif digits.startswith("9"):
+        digits = "0" + digits
+    return digits
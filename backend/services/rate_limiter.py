@@ -0,0 +1,140 @@
+import ipaddress
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from fastapi import HTTPException, Request
+from sqlalchemy import text
+
+from database import engine
+
+# --- Rate Limiter Configuration ---
+# "memory" keeps buckets in the worker process; "postgres" shares them between all workers.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+RATE_LIMIT_MEMORY_MAX_KEYS = int(os.getenv("RATE_LIMIT_MEMORY_MAX_KEYS", "100000"))
+# Peers (IPs or CIDRs, comma-separated) whose CF-Connecting-IP header is believed, e.g. the local
+# reverse proxy in front of uvicorn: "127.0.0.1,::1". Empty: the header is ignored.
+TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    """A token bucket: `capacity` requests per `period_seconds`, refilled continuously."""
+    name: str
+    capacity: int
+    period_seconds: float
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.capacity / self.period_seconds
+
+    @classmethod
+    def from_env(cls, name: str, env_var: str, default: str) -> "RateLimit":
+        """Reads a limit written as '<count>/<seconds>', e.g. '3/300'."""
+        count, seconds = os.getenv(env_var, default).split("/")
+        return cls(name=name, capacity=int(count), period_seconds=float(seconds))
+
+
+# --- Limits for the OTP endpoints ---
+OTP_REQUEST_PER_PHONE = RateLimit.from_env("otp-request:phone", "RATE_LIMIT_OTP_REQUEST_PHONE", "3/300")
+OTP_REQUEST_PER_IP = RateLimit.from_env("otp-request:ip", "RATE_LIMIT_OTP_REQUEST_IP", "20/300")
+OTP_VERIFY_PER_PHONE = RateLimit.from_env("otp-verify:phone", "RATE_LIMIT_OTP_VERIFY_PHONE", "10/300")
+OTP_VERIFY_PER_IP = RateLimit.from_env("otp-verify:ip", "RATE_LIMIT_OTP_VERIFY_IP", "30/300")
+
+
+class MemoryRateLimiter:
+    """Token buckets in a bounded LRU map. Each check is O(1)."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MEMORY_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def hit(self, limit: RateLimit, key: str) -> float:
+        """Consumes one token. Returns 0 if allowed, otherwise the seconds until a token is available."""
+        bucket_key = f"{limit.name}:{key}"
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(bucket_key, (limit.capacity, now))
+            tokens = min(limit.capacity, tokens + (now - updated_at) * limit.refill_per_second)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[bucket_key] = (tokens, now)
+            self._buckets.move_to_end(bucket_key)
+            if len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return 0 if allowed else (1 - tokens) / limit.refill_per_second
+
+
+class PostgresRateLimiter:
+    """Token buckets in the UNLOGGED rate_limit_buckets table, updated with one atomic upsert per check."""
+
+    _HIT_SQL = text("""
+        INSERT INTO rate_limit_buckets AS b (key, tokens, allowed, updated_at)
+        VALUES (:key, :capacity - 1, true, clock_timestamp())
+        ON CONFLICT (key) DO UPDATE SET
+            allowed = LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1,
+            tokens = LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate)
+                     - CASE WHEN LEAST(:capacity, b.tokens + EXTRACT(EPOCH FROM clock_timestamp() - b.updated_at) * :rate) >= 1
+                            THEN 1 ELSE 0 END,
+            updated_at = clock_timestamp()
+        RETURNING tokens, allowed
+    """)
+
+    def __init__(self, bind=engine):
+        self.bind = bind
+
+    def hit(self, limit: RateLimit, key: str) -> float:
+        with self.bind.begin() as conn:
+            row = conn.execute(self._HIT_SQL, {
+                "key": f"{limit.name}:{key}",
+                "capacity": limit.capacity,
+                "rate": limit.refill_per_second,
+            }).one()
+        return 0 if row.allowed else (1 - row.tokens) / limit.refill_per_second
+
+
+def _build_limiter():
+    if RATE_LIMIT_BACKEND == "postgres":
+        return PostgresRateLimiter()
+    return MemoryRateLimiter()
+
+
+rate_limiter = _build_limiter()
+
+
+def _is_trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in network for network in TRUSTED_PROXIES)
+
+
+def client_ip(request: Request) -> str:
+    """
+    The real client address: the socket peer, or Cloudflare's CF-Connecting-IP header when the peer
+    is one of TRUSTED_PROXIES (anyone else could send a new value per request to dodge the limits).
+    """
+    peer = request.client.host if request.client else "unknown"
+    forwarded = request.headers.get("CF-Connecting-IP")
+    if forwarded and _is_trusted_proxy(peer):
+        return forwarded.strip()
+    return peer
+
+
+def enforce(limit: RateLimit, key: str) -> None:
+    """Raises 429 with a Retry-After header when `key` has exhausted `limit`."""
+    retry_after = rate_limiter.hit(limit, key)
+    if retry_after > 0:
+        raise HTTPException(
+            status_code=429,
+            detail="Too many requests. Please try again later.",
+            headers={"Retry-After": str(max(1, int(retry_after + 0.999)))},
+        )
@@ -0,0 +1,225 @@
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Set
+
+from sqlalchemy import exists, select
+from sqlalchemy.orm import Session, aliased
+
+from models import Referral, Reservation, User
+
+# --- Referral Analytics Configuration ---
+# Other worker processes add referrals and payments too, so the graph is rebuilt after this many seconds.
+REFERRAL_ANALYTICS_TTL_SECONDS = float(os.getenv("REFERRAL_ANALYTICS_TTL_SECONDS", "300"))
+
+
+def mask_phone(phone: str) -> str:
+    """09123456789 -> 0912***6789"""
+    return phone[:4] + "***" + phone[-4:] if len(phone) > 8 else phone
+
+
+def full_name(first_name: Optional[str], last_name: Optional[str]) -> Optional[str]:
+    return " ".join(part for part in (first_name, last_name) if part) or None
+
+
+def mask_name(name: Optional[str]) -> Optional[str]:
+    """Ali Rezaei -> Ali R."""
+    if not name:
+        return None
+    first, _, rest = name.partition(" ")
+    return f"{first} {rest[0]}." if rest else first
+
+
+def public_stats(stats: dict) -> dict:
+    """Stats as shown to other customers: masked name, no internal user ids."""
+    return dict(stats, name=mask_name(stats["name"]), user_id=None, invited_by_user_id=None)
+
+
+class ReferralGraph:
+    """
+    The referral forest (inviter -> invited users), keyed by phone number because that is
+    how referrals name the inviter. Per-user figures are derived from it in memory:
+    direct and converted invites, the whole downstream network and its depth.
+    """
+
+    def __init__(self):
+        self.children: Dict[str, Set[str]] = {}
+        self.parent: Dict[str, str] = {}
+        self.users: Dict[str, dict] = {}  # phone -> {"id", "name"}
+        self.phones: Dict[int, str] = {}  # user id -> phone
+        self.converted: Set[str] = set()  # invited users with a paid reservation
+        self._network: Dict[str, tuple] = {}  # memoized (size, depth) per phone
+
+    def add(self, inviter_phone: str, invitee_phone: str, converted: bool = False):
+        if inviter_phone == invitee_phone or self.parent.get(invitee_phone) == inviter_phone:
+            return
+        self.children.setdefault(inviter_phone, set()).add(invitee_phone)
+        self.parent.setdefault(invitee_phone, inviter_phone)
+        if converted:
+            self.converted.add(invitee_phone)
+        self._network.clear()
+
+    def set_user(self, phone: str, user_id: Optional[int], name: Optional[str]):
+        """Records a user's id and name; an unknown (None) name keeps the one already cached."""
+        if user_id is not None:
+            user = self.users.setdefault(phone, {"id": user_id, "name": None})
+            user["id"] = user_id
+            if name is not None:
+                user["name"] = name
+            self.phones[user_id] = phone
+
+    def network(self, phone: str):
+        """(number of users reached through any chain of invites, length of the longest chain)."""
+        cached = self._network.get(phone)
+        if cached is not None:
+            return cached
+        size, depth = 0, 0
+        seen = {phone}
+        level = [phone]
+        while level:
+            next_level = [child for node in level for child in self.children.get(node, ()) if child not in seen]
+            seen.update(next_level)
+            if next_level:
+                size += len(next_level)
+                depth += 1
+            level = next_level
+        self._network[phone] = (size, depth)
+        return size, depth
+
+    def stats(self, phone: str) -> dict:
+        invitees = self.children.get(phone, set())
+        converted = len(invitees & self.converted)
+        size, depth = self.network(phone)
+        user = self.users.get(phone, {})
+        inviter = self.parent.get(phone)
+        return {
+            "user_id": user.get("id"),
+            "name": user.get("name"),
+            "phone": mask_phone(phone),
+            "direct_invites": len(invitees),
+            "converted_invites": converted,
+            "conversion_rate": round(converted / len(invitees), 3) if invitees else 0.0,
+            "network_size": size,
+            "chain_depth": depth,
+            "invited_by_user_id": self.users.get(inviter, {}).get("id") if inviter else None,
+        }
+
+
+class ReferralAnalytics:
+    """
+    Caches the referral graph. It is built with one query, kept current in this process by
+    add_referral() / mark_converted(), and rebuilt after REFERRAL_ANALYTICS_TTL_SECONDS.
+    The leaderboard is recomputed only when the graph changed. Rebuilds run outside the lock, so
+    add_referral() / mark_converted() (called on every payment) never wait for the query; changes
+    made while a rebuild is in flight are replayed onto the new graph.
+    """
+
+    def __init__(self, ttl: float = REFERRAL_ANALYTICS_TTL_SECONDS):
+        self.ttl = ttl
+        self._graph: Optional[ReferralGraph] = None
+        self._loaded_at = 0.0
+        self._leaderboard: Optional[List[dict]] = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+        self._pending: Optional[list] = None  # changes made while a rebuild is in flight
+
+    def _load(self, db: Session) -> ReferralGraph:
+        invitee = aliased(User)
+        inviter = aliased(User)
+        paid = exists().where(Reservation.user_id == Referral.user_id, Reservation.payment_status == "paid")
+        rows = db.execute(
+            select(
+                Referral.invited_phone,
+                inviter.id, inviter.first_name, inviter.last_name,
+                invitee.phone_number, invitee.id, invitee.first_name, invitee.last_name,
+                paid,
+            )
+            .join(invitee, invitee.id == Referral.user_id)
+            .outerjoin(inviter, inviter.phone_number == Referral.invited_phone)
+            .order_by(Referral.id)
+        ).all()
+        graph = ReferralGraph()
+        for inviter_phone, inviter_id, inviter_first, inviter_last, invitee_phone, invitee_id, invitee_first, invitee_last, converted in rows:
+            graph.add(inviter_phone, invitee_phone, converted=converted)
+            graph.set_user(inviter_phone, inviter_id, full_name(inviter_first, inviter_last))
+            graph.set_user(invitee_phone, invitee_id, full_name(invitee_first, invitee_last))
+        return graph
+
+    def _fresh(self) -> bool:
+        return self._graph is not None and time.monotonic() - self._loaded_at <= self.ttl
+
+    def graph(self, db: Session) -> ReferralGraph:
+        with self._lock:
+            if self._fresh():
+                return self._graph
+            stale = self._graph
+        # One thread rebuilds; the others keep using the stale graph meanwhile (or wait for the first load).
+        if not self._reload_lock.acquire(blocking=stale is None):
+            return stale
+        try:
+            with self._lock:
+                if self._fresh():
+                    return self._graph
+                self._pending = []
+            graph = self._load(db)
+            with self._lock:
+                for change in self._pending:
+                    change(graph)
+                self._graph = graph
+                self._loaded_at = time.monotonic()
+                self._leaderboard = None
+                return graph
+        finally:
+            with self._lock:
+                self._pending = None
+            self._reload_lock.release()
+
+    def _apply(self, change):
+        """
+        Applies change(graph) to the cached graph and records it for a rebuild in flight.
+        change() returns whether it modified the graph.
+        """
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(change)
+            if self._graph is not None and change(self._graph):
+                self._leaderboard = None
+
+    def stats(self, db: Session, phone: str) -> dict:
+        graph = self.graph(db)
+        with self._lock:
+            return graph.stats(phone)
+
+    def leaderboard(self, db: Session, limit: int = 10) -> List[dict]:
+        graph = self.graph(db)
+        with self._lock:
+            if self._leaderboard is None:
+                ranked = sorted(
+                    (graph.stats(phone) for phone in graph.children),
+                    key=lambda s: (-s["direct_invites"], -s["converted_invites"], -s["network_size"], s["user_id"] or 0),
+                )
+                self._leaderboard = [dict(entry, rank=i + 1) for i, entry in enumerate(ranked)]
+            return self._leaderboard[:limit]
+
+    def add_referral(self, inviter_phone: str, inviter_id: int, inviter_name: Optional[str],
+                     invitee_phone: str, invitee_id: int, invitee_name: Optional[str]):
+        """Applies a newly committed referral to the cached graph (no-op until the graph is loaded)."""
+        def change(graph: ReferralGraph):
+            graph.add(inviter_phone, invitee_phone)
+            graph.set_user(inviter_phone, inviter_id, inviter_name)
+            graph.set_user(invitee_phone, invitee_id, invitee_name)
+            return True
+        self._apply(change)
+
+    def mark_converted(self, user_id: int):
+        """Records that an invited user paid (no-op for users who were not invited)."""
+        def change(graph: ReferralGraph):
+            phone = graph.phones.get(user_id)
+            if phone is None or phone not in graph.parent or phone in graph.converted:
+                return False
+            graph.converted.add(phone)
+            return True
+        self._apply(change)
+
+
+referral_analytics = ReferralAnalytics()
@@ -0,0 +1,43 @@
+import os
+
+# --- Service Catalog ---
+# Duration of each bookable service in minutes. Unknown service types fall back to the default.
+SERVICE_DURATIONS = {
+    "haircut": 60,
+    "beard": 30,
+    "haircut_beard": 90,
+    "hair_color": 120,
+    "facial": 60,
+    "groom_package": 240,
+}
+DEFAULT_SERVICE_DURATION_MINUTES = int(os.getenv("DEFAULT_SERVICE_DURATION_MINUTES", "60"))
+
+# List price of each service (Rial). Unknown service types fall back to the default.
+SERVICE_PRICES = {
+    "haircut": 500000,
+    "beard": 250000,
+    "haircut_beard": 700000,
+    "hair_color": 1500000,
+    "facial": 800000,
+    "groom_package": 3000000,
+}
+DEFAULT_SERVICE_PRICE = float(os.getenv("DEFAULT_SERVICE_PRICE", "500000"))
+
+# --- Opening Hours (local time) ---
+OPENING_HOUR = int(os.getenv("SALON_OPENING_HOUR", "9"))
+CLOSING_HOUR = int(os.getenv("SALON_CLOSING_HOUR", "24"))
+
+
+def get_service_duration(service_type: str) -> int:
+    """Returns the duration of a service in minutes."""
+    return SERVICE_DURATIONS.get(service_type, DEFAULT_SERVICE_DURATION_MINUTES)
+
+
+def max_service_duration() -> int:
+    """The longest duration any reservation can have, used to bound overlap queries."""
+    return max([DEFAULT_SERVICE_DURATION_MINUTES, *SERVICE_DURATIONS.values()])
+
+
+def get_service_price(service_type: str) -> float:
+    """Returns the list price of a service."""
+    return float(SERVICE_PRICES.get(service_type, DEFAULT_SERVICE_PRICE))
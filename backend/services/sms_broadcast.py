@@ -0,0 +1,299 @@
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, or_, and_, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import SmsCampaign, SmsCampaignFailure, User
+from schemas import DiscountSegment, SmsBroadcastCreate
+from crud.pagination import DEFAULT_PAGE_SIZE, keyset_paginate
+from services import sms_service
+
+# --- Broadcast Configuration ---
+# Recipients read (keyset over users.id) and checkpointed per transaction
+SMS_BROADCAST_BATCH_SIZE = int(os.getenv("SMS_BROADCAST_BATCH_SIZE", "1000"))
+# Provider calls in flight, shared by all running broadcasts
+SMS_BROADCAST_CONCURRENCY = int(os.getenv("SMS_BROADCAST_CONCURRENCY", "4"))
+# Messages per second across all broadcasts (0 = no cap)
+SMS_BROADCAST_RATE_PER_SECOND = float(os.getenv("SMS_BROADCAST_RATE_PER_SECOND", "50"))
+SMS_BROADCAST_CALL_ATTEMPTS = int(os.getenv("SMS_BROADCAST_CALL_ATTEMPTS", "3"))
+SMS_BROADCAST_BACKOFF_SECONDS = float(os.getenv("SMS_BROADCAST_BACKOFF_SECONDS", "5"))
+# A "running" campaign without a heartbeat for this long lost its sender (e.g. a restart) and may be resumed.
+SMS_BROADCAST_STALE_SECONDS = int(os.getenv("SMS_BROADCAST_STALE_SECONDS", "300"))
+
+
+class RateCap:
+    """Spaces out sends so that at most `per_second` messages go out per second, across threads."""
+
+    def __init__(self, per_second: float):
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self, messages: int):
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next, now)
+            self._next = start + messages * self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def _segment_query(segment: DiscountSegment):
+    query = select(User.id, User.phone_number)
+    if segment.user_ids is not None:
+        return query.where(User.id.in_(segment.user_ids))
+    if segment.role is not None:
+        query = query.where(User.role == segment.role)
+    if segment.active_only:
+        query = query.where(User.is_active.is_(True))
+    return query
+
+
+# -------------------------------
+# Admin operations
+# -------------------------------
+def describe_campaign(campaign: SmsCampaign) -> dict:
+    """The campaign row plus progress and throughput."""
+    elapsed = 0.0
+    if campaign.started_at:
+        elapsed = max(((campaign.finished_at or datetime.now()) - campaign.started_at).total_seconds(), 0.0)
+    return {
+        **{column.key: getattr(campaign, column.key) for column in SmsCampaign.__table__.columns},
+        "progress": round(campaign.processed / campaign.total_recipients, 4) if campaign.total_recipients else 1.0,
+        "elapsed_seconds": round(elapsed, 1),
+        "messages_per_second": round(campaign.processed / elapsed, 1) if elapsed > 0 else 0.0,
+    }
+
+
+def create_broadcast(db: Session, data: SmsBroadcastCreate) -> SmsCampaign:
+    """Records the campaign with its recipient count and starts sending it in the background."""
+    total = db.scalar(select(func.count()).select_from(_segment_query(data.segment).subquery()))
+    campaign = SmsCampaign(
+        name=data.name,
+        message=data.message,
+        segment=data.segment.model_dump_json(),
+        status="pending",
+        total_recipients=total,
+        processed=0, sent=0, failed=0, last_user_id=0,
+        updated_at=datetime.now(),
+    )
+    db.add(campaign)
+    db.commit()
+    db.refresh(campaign)
+    broadcast_runner.start(campaign.id)
+    return campaign
+
+
+def get_campaign(db: Session, campaign_id: int) -> SmsCampaign:
+    campaign = db.query(SmsCampaign).filter(SmsCampaign.id == campaign_id).first()
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found")
+    return campaign
+
+
+def get_campaigns(db: Session, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """Newest campaigns first. Returns (items, next_cursor)."""
+    return keyset_paginate(db.query(SmsCampaign), [SmsCampaign.id], limit=limit, cursor=cursor)
+
+
+def get_campaign_failures(db: Session, campaign_id: int, limit: int = DEFAULT_PAGE_SIZE, cursor: Optional[str] = None):
+    """A campaign's failed recipients in the order they failed. Returns (items, next_cursor)."""
+    get_campaign(db, campaign_id)
+    query = db.query(SmsCampaignFailure).filter(SmsCampaignFailure.campaign_id == campaign_id)
+    return keyset_paginate(query, [SmsCampaignFailure.id], limit=limit, cursor=cursor, descending=False)
+
+
+def _transition(db: Session, campaign_id: int, condition, **values) -> SmsCampaign:
+    """Conditional status change; 404 for an unknown campaign, 409 if it is not in a matching state."""
+    campaign = db.scalars(
+        update(SmsCampaign)
+        .where(SmsCampaign.id == campaign_id, condition)
+        .values(**values)
+        .returning(SmsCampaign)
+        .execution_options(populate_existing=True, synchronize_session=False)
+    ).first()
+    if campaign is None:
+        db.rollback()
+        status = db.scalar(select(SmsCampaign.status).where(SmsCampaign.id == campaign_id))
+        if status is None:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+        raise HTTPException(status_code=409, detail=f"Campaign is {status}")
+    db.expunge(campaign)
+    db.commit()
+    return campaign
+
+
+def cancel_broadcast(db: Session, campaign_id: int) -> SmsCampaign:
+    """Stops a campaign; the sender notices after its current batch."""
+    return _transition(
+        db, campaign_id, SmsCampaign.status.in_(("pending", "running")),
+        status="cancelled", finished_at=datetime.now(),
+    )
+
+
+def resume_broadcast(db: Session, campaign_id: int) -> SmsCampaign:
+    """
+    Continues a failed or cancelled campaign, or one whose sender died, after its last checkpoint.
+    Recipients of the batch that was in progress may receive the message twice.
+    """
+    stale = datetime.now() - timedelta(seconds=SMS_BROADCAST_STALE_SECONDS)
+    campaign = _transition(
+        db, campaign_id,
+        or_(
+            SmsCampaign.status.in_(("failed", "cancelled")),
+            and_(SmsCampaign.status == "running", SmsCampaign.updated_at < stale),
+        ),
+        status="pending", finished_at=None, last_error=None, updated_at=datetime.now(),
+    )
+    broadcast_runner.start(campaign.id)
+    return campaign
+
+
+# -------------------------------
+# Sender (background)
+# -------------------------------
+class BroadcastRunner:
+    """
+    Sends campaigns in background threads.
+
+    Recipients are read in keyset batches of SMS_BROADCAST_BATCH_SIZE, so no transaction or cursor
+    stays open while messages go out. Each batch is split into multi-recipient provider calls
+    (SMS_MAX_RECIPIENTS_PER_CALL numbers per call) that run on a shared pool of
+    SMS_BROADCAST_CONCURRENCY threads under one rate cap. Counters, failures and the checkpoint
+    of a batch are committed together.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        send_bulk=sms_service.send_sms_bulk,
+        concurrency: int = SMS_BROADCAST_CONCURRENCY,
+        rate_per_second: float = SMS_BROADCAST_RATE_PER_SECOND,
+        batch_size: int = SMS_BROADCAST_BATCH_SIZE,
+    ):
+        self.session_factory = session_factory
+        self.send_bulk = send_bulk
+        self.batch_size = batch_size
+        self.chunk_size = sms_service.SMS_MAX_RECIPIENTS_PER_CALL
+        self.rate = RateCap(rate_per_second)
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sms-broadcast")
+
+    def start(self, campaign_id: int):
+        threading.Thread(target=self.run, args=(campaign_id,), name=f"sms-broadcast-{campaign_id}", daemon=True).start()
+
+    def run(self, campaign_id: int):
+        """Sends a pending campaign to completion (or until it is cancelled)."""
+        db = self.session_factory()
+        try:
+            now = datetime.now()
+            campaign = db.execute(
+                update(SmsCampaign)
+                .where(SmsCampaign.id == campaign_id, SmsCampaign.status == "pending")
+                .values(status="running", started_at=func.coalesce(SmsCampaign.started_at, now), updated_at=now)
+                .returning(SmsCampaign.segment, SmsCampaign.message, SmsCampaign.last_user_id)
+            ).first()
+            db.commit()
+            if campaign is None:
+                return  # already claimed by another sender, or cancelled
+            print(f"SMS broadcast {campaign_id}: started after user {campaign.last_user_id}")
+            segment = DiscountSegment.model_validate_json(campaign.segment)
+            if self._send_all(db, campaign_id, segment, campaign.message, campaign.last_user_id):
+                db.execute(
+                    update(SmsCampaign)
+                    .where(SmsCampaign.id == campaign_id, SmsCampaign.status == "running")
+                    .values(status="completed", finished_at=datetime.now(), updated_at=datetime.now())
+                )
+                db.commit()
+                print(f"SMS broadcast {campaign_id}: completed")
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: SMS broadcast {campaign_id} failed: {e}")
+            db.execute(
+                update(SmsCampaign)
+                .where(SmsCampaign.id == campaign_id, SmsCampaign.status == "running")
+                .values(status="failed", last_error=str(e), finished_at=datetime.now(), updated_at=datetime.now())
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def _send_all(self, db: Session, campaign_id: int, segment: DiscountSegment, message: str, last_user_id: int) -> bool:
+        """Returns False if the campaign was cancelled meanwhile."""
+        query = _segment_query(segment)
+        while True:
+            batch = db.execute(query.where(User.id > last_user_id).order_by(User.id).limit(self.batch_size)).all()
+            db.commit()
+            if not batch:
+                return True
+            results = self._send_batch(batch, message)
+            failures = [
+                dict(campaign_id=campaign_id, user_id=user_id, phone_number=phone, error=error)
+                for user_id, phone, _, error in results if error is not None
+            ]
+            if failures:
+                db.execute(insert(SmsCampaignFailure).values(failures))
+            last_user_id = batch[-1].id
+            status = db.execute(
+                update(SmsCampaign)
+                .where(SmsCampaign.id == campaign_id)
+                .values(
+                    processed=SmsCampaign.processed + len(results),
+                    sent=SmsCampaign.sent + len(results) - len(failures),
+                    failed=SmsCampaign.failed + len(failures),
+                    last_user_id=last_user_id,
+                    updated_at=datetime.now(),
+                )
+                .returning(SmsCampaign.status)
+            ).scalar_one()
+            db.commit()
+            if status != "running":
+                print(f"SMS broadcast {campaign_id}: stopped ({status})")
+                return False
+
+    def _send_batch(self, batch, message: str):
+        """[(user_id, phone, message_id, error)] for every recipient of the batch."""
+        chunks = [batch[i:i + self.chunk_size] for i in range(0, len(batch), self.chunk_size)]
+        results = []
+        for chunk_results in self._pool.map(lambda chunk: self._send_chunk(chunk, message), chunks):
+            results.extend(chunk_results)
+        return results
+
+    def _send_chunk(self, chunk, message: str):
+        """
+        Only calls that never reached the provider (503) are retried. After any other error the
+        messages may already be out, so the chunk is recorded as failed with an unknown status
+        rather than risking a duplicate.
+        """
+        error = None
+        for attempt in range(1, SMS_BROADCAST_CALL_ATTEMPTS + 1):
+            self.rate.wait(len(chunk))
+            try:
+                sent = self.send_bulk([recipient.phone_number for recipient in chunk], message)
+                return [
+                    (recipient.id, phone, message_id, call_error)
+                    for recipient, (phone, message_id, call_error) in zip(chunk, sent)
+                ]
+            except HTTPException as e:
+                error = str(e.detail)
+                if e.status_code != 503:
+                    if e.status_code == 504:
+                        error = f"{error} Not resent."
+                    break
+            except Exception as e:
+                error = f"{e} (delivery status unknown, not resent)"
+                break
+            if attempt < SMS_BROADCAST_CALL_ATTEMPTS:
+                time.sleep(SMS_BROADCAST_BACKOFF_SECONDS * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5))
+        return [(recipient.id, recipient.phone_number, None, error) for recipient in chunk]
+
+broadcast_runner = BroadcastRunner()
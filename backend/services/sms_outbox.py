@@ -0,0 +1,234 @@
+import os
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from fastapi import HTTPException
+from sqlalchemy import case, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import SmsOutbox
+from services import sms_service
+
+# --- Outbox Configuration ---
+SMS_OUTBOX_ENABLED = os.getenv("SMS_OUTBOX_ENABLED", "true").lower() == "true"
+SMS_OUTBOX_WORKERS = int(os.getenv("SMS_OUTBOX_WORKERS", "4"))
+SMS_OUTBOX_BATCH_SIZE = int(os.getenv("SMS_OUTBOX_BATCH_SIZE", "50"))
+SMS_OUTBOX_MAX_ATTEMPTS = int(os.getenv("SMS_OUTBOX_MAX_ATTEMPTS", "5"))
+SMS_OUTBOX_POLL_INTERVAL = float(os.getenv("SMS_OUTBOX_POLL_INTERVAL", "2"))
+SMS_OUTBOX_BACKOFF_SECONDS = float(os.getenv("SMS_OUTBOX_BACKOFF_SECONDS", "5"))
+SMS_OUTBOX_MAX_BACKOFF_SECONDS = float(os.getenv("SMS_OUTBOX_MAX_BACKOFF_SECONDS", "600"))
+# How long a worker may hold a message in "sending" before another worker may reclaim it.
+SMS_OUTBOX_LEASE_SECONDS = int(os.getenv("SMS_OUTBOX_LEASE_SECONDS", "60"))
+
+
+# -------------------------------
+# Producer side (called inside request transactions)
+# -------------------------------
+def enqueue_sms(db: Session, phone_number: str, message: str) -> SmsOutbox:
+    """
+    Adds a message to the outbox without sending it.
+    The caller owns the transaction: the message becomes visible to the workers on commit,
+    after which notify() can be used to wake them up immediately.
+    """
+    outbox_message = SmsOutbox(phone_number=phone_number, message=message, status="pending", attempts=0)
+    db.add(outbox_message)
+    return outbox_message
+
+
+def enqueue_sms_batch(db: Session, messages) -> int:
+    """
+    Adds many (phone_number, message) pairs to the outbox with one multi-row INSERT.
+    Same transaction rules as enqueue_sms(). Returns the number of messages queued.
+    """
+    rows = [
+        dict(phone_number=phone_number, message=message, status="pending", attempts=0)
+        for phone_number, message in messages
+    ]
+    if rows:
+        db.execute(insert(SmsOutbox).values(rows))
+    return len(rows)
+
+
+def get_outbox_message(db: Session, message_id: int):
+    """Retrieves a single outbox message (and thus its delivery status) by ID."""
+    return db.query(SmsOutbox).filter(SmsOutbox.id == message_id).first()
+
+
+def get_outbox_stats(db: Session):
+    """Returns the number of outbox messages per status."""
+    rows = db.query(SmsOutbox.status, func.count(SmsOutbox.id)).group_by(SmsOutbox.status).all()
+    return {status: count for status, count in rows}
+
+
+def notify():
+    """Wakes the outbox worker so freshly committed messages are delivered without waiting for the next poll."""
+    outbox_worker.notify()
+
+
+# -------------------------------
+# Consumer side (background worker)
+# -------------------------------
+def _backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at SMS_OUTBOX_MAX_BACKOFF_SECONDS."""
+    delay = SMS_OUTBOX_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, SMS_OUTBOX_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
+
+class SmsOutboxWorker:
+    """
+    Delivers outbox messages in the background.
+
+    A single dispatcher thread claims due messages in batches (FOR UPDATE SKIP LOCKED, so several
+    processes can share one outbox) and hands each batch to a thread pool for concurrent delivery.
+    Failed messages are rescheduled with exponential backoff until SMS_OUTBOX_MAX_ATTEMPTS is reached.
+    A message that may already have gone out (the provider did not answer, or the worker's lease
+    expired mid-send) is marked "unknown" instead and never resent automatically, so nobody gets
+    the same OTP twice.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        send=sms_service.send_sms,
+        workers: int = SMS_OUTBOX_WORKERS,
+        batch_size: int = SMS_OUTBOX_BATCH_SIZE,
+        max_attempts: int = SMS_OUTBOX_MAX_ATTEMPTS,
+        poll_interval: float = SMS_OUTBOX_POLL_INTERVAL,
+    ):
+        self.session_factory = session_factory
+        self.send = send
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._pool = None
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stopping.clear()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="sms-outbox")
+        self._thread = threading.Thread(target=self._run, name="sms-outbox-dispatcher", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10):
+        if self._thread is None:
+            return
+        self._stopping.set()
+        self._wakeup.set()
+        self._thread.join(timeout=timeout)
+        self._pool.shutdown(wait=True)
+        self._thread = None
+        self._pool = None
+
+    def notify(self):
+        self._wakeup.set()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                processed = self.process_batch()
+            except Exception as e:
+                print(f"ERROR: SMS outbox dispatcher failed: {e}")
+                processed = 0
+            # A full batch means there is probably more work waiting; otherwise sleep until woken.
+            if processed < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+
+    def process_batch(self) -> int:
+        """Claims and delivers one batch of due messages. Returns the number of messages processed."""
+        claimed = self._claim_batch()
+        if not claimed:
+            return 0
+        results = list(self._pool.map(self._deliver, claimed))
+        self._record_results(results)
+        return len(results)
+
+    def _claim_batch(self):
+        db = self.session_factory()
+        try:
+            # The worker holding these died or took longer than its lease: the message may be out.
+            db.execute(
+                update(SmsOutbox)
+                .where(SmsOutbox.status == "sending", SmsOutbox.next_attempt_at <= func.now())
+                .values(
+                    status=case((SmsOutbox.attempts >= self.max_attempts, "failed"), else_="unknown"),
+                    last_error="Lease expired during delivery; delivery status unknown.",
+                )
+                .execution_options(synchronize_session=False)
+            )
+            due_ids = (
+                select(SmsOutbox.id)
+                .where(SmsOutbox.status == "pending", SmsOutbox.next_attempt_at <= func.now())
+                .order_by(SmsOutbox.next_attempt_at)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            claimed = db.execute(
+                update(SmsOutbox)
+                .where(SmsOutbox.id.in_(due_ids))
+                .values(
+                    status="sending",
+                    attempts=SmsOutbox.attempts + 1,
+                    next_attempt_at=func.now() + timedelta(seconds=SMS_OUTBOX_LEASE_SECONDS),
+                )
+                .returning(SmsOutbox.id, SmsOutbox.phone_number, SmsOutbox.message, SmsOutbox.attempts)
+                .execution_options(synchronize_session=False)
+            ).all()
+            db.commit()
+            return claimed
+        finally:
+            db.close()
+
+    def _deliver(self, message):
+        """(message, outcome, provider_message_id, error); outcome is "sent", "retry" or "unknown"."""
+        try:
+            result = self.send(phone_number=message.phone_number, message=message.message)
+            return message, "sent", (result or {}).get("message_id"), None
+        except HTTPException as e:
+            # 504: the request reached the provider but no answer came back
+            return message, "unknown" if e.status_code == 504 else "retry", None, str(e.detail)
+        except Exception as e:
+            return message, "unknown", None, str(e)
+
+    def _record_results(self, results):
+        db = self.session_factory()
+        try:
+            for message, outcome, provider_message_id, error in results:
+                if outcome == "sent":
+                    values = dict(
+                        status="sent",
+                        sent_at=func.now(),
+                        provider_message_id=str(provider_message_id) if provider_message_id else None,
+                        last_error=None,
+                    )
+                elif outcome == "unknown":
+                    values = dict(status="unknown", last_error=error)
+                elif message.attempts >= self.max_attempts:
+                    values = dict(status="failed", last_error=error)
+                else:
+                    values = dict(
+                        status="pending",
+                        last_error=error,
+                        next_attempt_at=func.now() + timedelta(seconds=_backoff_seconds(message.attempts)),
+                    )
+                db.execute(
+                    update(SmsOutbox)
+                    .where(SmsOutbox.id == message.id)
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+            db.commit()
+        finally:
+            db.close()
+
+
+outbox_worker = SmsOutboxWorker()
@@ -1,5 +1,7 @@
 import os
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
 from fastapi import HTTPException
 
 # --- SMS Service Configuration ---
@@ -8,16 +10,36 @@ SMS_USERNAME = os.getenv("SMS_USERNAME")
 SMS_PASSWORD = os.getenv("SMS_PASSWORD")
 SMS_FROM = os.getenv("SMS_FROM")
 SMS_API_URL = "https://rest.payamak-panel.com/api/SendSMS/SendSMS"
+# The panel accepts up to this many comma-separated numbers per call for one text
+SMS_MAX_RECIPIENTS_PER_CALL = int(os.getenv("SMS_MAX_RECIPIENTS_PER_CALL", "100"))
+SMS_HTTP_POOL_SIZE = int(os.getenv("SMS_HTTP_POOL_SIZE", "10"))
 
-def send_sms(phone_number: str, message: str):
-    """
-    Sends an SMS message using the National SMS Panel API.
-    """
+# One keep-alive connection pool for every sender (request handlers, outbox workers, broadcasts)
+# instead of a new TCP + TLS handshake per message.
+_http = requests.Session()
+_http.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=SMS_HTTP_POOL_SIZE))
+
+def _check_configured():
     if not all([SMS_USERNAME, SMS_PASSWORD, SMS_FROM]):
         error_msg = "SMS service is not configured. Missing environment variables."
         print(f"ERROR: {error_msg}")
         raise HTTPException(status_code=500, detail=error_msg)
 
+def _never_reached_provider(e: requests.RequestException) -> bool:
+    """True if the request failed before it was sent (DNS, refused or timed-out connection)."""
+    if isinstance(e, requests.ConnectTimeout):
+        return True
+    reason = getattr(e.args[0], "reason", None) if e.args else None
+    return isinstance(e, requests.ConnectionError) and isinstance(reason, NewConnectionError)
+
+def send_sms(phone_number: str, message: str):
+    """
+    Sends an SMS message using the National SMS Panel API.
+    Raises HTTPException 503 when the provider could not be reached and 504 when the outcome is
+    unknown (see send_sms_bulk).
+    """
+    _check_configured()
+
     payload = {
         "username": SMS_USERNAME,
         "password": SMS_PASSWORD,
@@ -28,7 +50,7 @@ def send_sms(phone_number: str, message: str):
     }
 
     try:
-        response = requests.post(SMS_API_URL, json=payload, timeout=10)
+        response = _http.post(SMS_API_URL, json=payload, timeout=10)
         response.raise_for_status()
         
         response_json = response.json()
@@ -45,5 +67,59 @@ def send_sms(phone_number: str, message: str):
              raise HTTPException(status_code=500, detail=f"SMS provider error: {error_detail}")
 
     except requests.RequestException as e:
-        print(f"ERROR: Could not connect to SMS service: {e}")
-        raise HTTPException(status_code=503, detail="SMS service is currently unavailable.")
+        if _never_reached_provider(e):
+            print(f"ERROR: Could not connect to SMS service: {e}")
+            raise HTTPException(status_code=503, detail="SMS service is currently unavailable.")
+        print(f"ERROR: SMS service did not answer properly: {e}")
+        raise HTTPException(status_code=504, detail="SMS service did not answer; delivery status unknown.")
+    except ValueError as e:
+        print(f"ERROR: SMS service returned an invalid response: {e}")
+        raise HTTPException(status_code=504, detail="SMS service returned an invalid response; delivery status unknown.")
+
+def send_sms_bulk(phone_numbers, message: str):
+    """
+    Sends one text to up to SMS_MAX_RECIPIENTS_PER_CALL numbers with a single API call.
+    Returns [(phone_number, message_id or None, error or None)], one entry per number.
+    Raises HTTPException 503 when the provider could not be reached (nothing was sent, safe to retry)
+    and 504 when the request went out but no usable answer came back (e.g. a read timeout): the
+    messages may have been sent, so the call must not be repeated.
+    """
+    _check_configured()
+    phone_numbers = list(phone_numbers)
+    if len(phone_numbers) > SMS_MAX_RECIPIENTS_PER_CALL:
+        raise ValueError(f"At most {SMS_MAX_RECIPIENTS_PER_CALL} recipients per call")
+
+    payload = {
+        "username": SMS_USERNAME,
+        "password": SMS_PASSWORD,
+        "to": ",".join(phone_numbers),
+        "from": SMS_FROM,
+        "text": message,
+        "isflash": False
+    }
+    try:
+        response = _http.post(SMS_API_URL, json=payload, timeout=30)
+        response.raise_for_status()
+        response_json = response.json()
+    except requests.RequestException as e:
+        if _never_reached_provider(e):
+            print(f"ERROR: Could not connect to SMS service: {e}")
+            raise HTTPException(status_code=503, detail="SMS service is currently unavailable.")
+        print(f"ERROR: SMS service did not answer properly: {e}")
+        raise HTTPException(status_code=504, detail="SMS service did not answer; delivery status unknown.")
+    except ValueError as e:
+        print(f"ERROR: SMS service returned an invalid response: {e}")
+        raise HTTPException(status_code=504, detail="SMS service returned an invalid response; delivery status unknown.")
+
+    if response_json.get("RetStatus") != 1:
+        error_detail = response_json.get("StrRetStatus", "Unknown error")
+        return [(phone, None, f"SMS provider error: {error_detail}") for phone in phone_numbers]
+
+    # Value holds one recId (success) or short error code per number, in the order sent.
+    values = str(response_json.get("Value", "")).split(",")
+    if len(values) != len(phone_numbers):
+        values = values[:1] * len(phone_numbers)
+    return [
+        (phone, value, None) if len(value) > 5 else (phone, None, f"SMS provider error code {value}")
+        for phone, value in zip(phone_numbers, values)
+    ]
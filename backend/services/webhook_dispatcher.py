@@ -0,0 +1,245 @@
+import hashlib
+import heapq
+import hmac
+import itertools
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from database import SessionLocal
+from models import WebhookDeadLetter
+
+# --- Webhook Configuration ---
+# Shared secret for the X-Webhook-Signature header (unsigned if empty)
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", "4"))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("WEBHOOK_TIMEOUT_SECONDS", "5"))
+WEBHOOK_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_BACKOFF_SECONDS", "2"))
+WEBHOOK_MAX_BACKOFF_SECONDS = float(os.getenv("WEBHOOK_MAX_BACKOFF_SECONDS", "300"))
+# Deliveries waiting (including scheduled retries); beyond this new ones go straight to the dead letters.
+WEBHOOK_MAX_QUEUE = int(os.getenv("WEBHOOK_MAX_QUEUE", "10000"))
+
+# Client errors that are worth retrying; any other 4xx means the request itself is wrong.
+RETRYABLE_CLIENT_ERRORS = {408, 409, 425, 429}
+
+
+@dataclass
+class WebhookDelivery:
+    url: str
+    event: str
+    payload: dict
+    # Sent as X-Webhook-Id so receivers can drop the duplicates that retries may cause
+    delivery_id: str = field(default_factory=lambda: uuid.uuid4().hex)
+    attempts: int = 0
+    last_error: Optional[str] = None
+
+
+def sign(secret: str, timestamp: str, body: bytes) -> str:
+    """HMAC-SHA256 over "<timestamp>.<body>", as sent in X-Webhook-Signature."""
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(secret: str, timestamp: str, body: bytes, signature: str) -> bool:
+    """Receiver-side check (used by check_webhooks.py; n8n can do the same in a Code node)."""
+    return hmac.compare_digest(sign(secret, timestamp, body), signature or "")
+
+
+def _backoff_seconds(attempts: int) -> float:
+    """Exponential backoff with jitter, capped at WEBHOOK_MAX_BACKOFF_SECONDS."""
+    delay = WEBHOOK_BACKOFF_SECONDS * (2 ** max(attempts - 1, 0))
+    delay = min(delay, WEBHOOK_MAX_BACKOFF_SECONDS)
+    return delay * random.uniform(0.5, 1.5)
+
+
+class WebhookDispatcher:
+    """
+    Delivers outbound webhooks in the background so request handlers only enqueue them.
+
+    A fixed number of worker threads share one keep-alive requests.Session (one connection
+    pool slot per worker), which bounds the concurrency towards the receivers. Failed deliveries
+    are rescheduled with exponential backoff and jitter without holding a worker while they wait;
+    after WEBHOOK_MAX_ATTEMPTS, on a non-retryable response, when the queue is full or when the
+    process stops, the delivery is stored in webhook_dead_letters.
+    """
+
+    def __init__(
+        self,
+        session_factory=SessionLocal,
+        secret: str = WEBHOOK_SECRET,
+        workers: int = WEBHOOK_WORKERS,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        timeout: float = WEBHOOK_TIMEOUT_SECONDS,
+        max_queue: int = WEBHOOK_MAX_QUEUE,
+    ):
+        self.session_factory = session_factory
+        self.secret = secret
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.timeout = timeout
+        self.max_queue = max_queue
+        self.http = requests.Session()
+        adapter = HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+        self.http.mount("http://", adapter)
+        self.http.mount("https://", adapter)
+        self._queue = []  # heap of (due, seq, delivery)
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self.stats = {"delivered": 0, "retried": 0, "dead_lettered": 0}
+
+    def start(self):
+        with self._cond:
+            if self._threads:
+                return
+            self._stopping = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f"webhook-{i}", daemon=True)
+                for i in range(self.workers)
+            ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10):
+        """Waits for the deliveries in progress; whatever is still queued goes to the dead letters."""
+        with self._cond:
+            if not self._threads:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(timeout=max(deadline - time.monotonic(), 0))
+        with self._cond:
+            leftover = [delivery for _, _, delivery in self._queue]
+            self._queue.clear()
+            self._threads = []
+        for delivery in leftover:
+            self._dead_letter(delivery, delivery.last_error or "Not delivered before shutdown")
+
+    def submit(self, url: str, event: str, payload: dict) -> WebhookDelivery:
+        """Queues a delivery and returns immediately (starts the workers on first use)."""
+        self.start()
+        delivery = WebhookDelivery(url=url, event=event, payload=payload)
+        if not self._schedule(delivery, delay=0):
+            self._dead_letter(delivery, "Webhook queue full")
+        return delivery
+
+    def pending(self) -> int:
+        """Deliveries queued, waiting for a retry or in progress."""
+        with self._cond:
+            return len(self._queue) + self._in_flight
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Blocks until nothing is pending (for scripts and shutdown). Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._queue or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(min(remaining, 0.1))
+        return True
+
+    def _schedule(self, delivery: WebhookDelivery, delay: float) -> bool:
+        with self._cond:
+            if self._stopping or len(self._queue) >= self.max_queue:
+                return False
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._seq), delivery))
+            self._cond.notify()
+            return True
+
+    def _next_due(self) -> Optional[WebhookDelivery]:
+        with self._cond:
+            while not self._stopping:
+                now = time.monotonic()
+                if self._queue and self._queue[0][0] <= now:
+                    self._in_flight += 1
+                    return heapq.heappop(self._queue)[2]
+                self._cond.wait(self._queue[0][0] - now if self._queue else None)
+            return None
+
+    def _run(self):
+        while True:
+            delivery = self._next_due()
+            if delivery is None:
+                return
+            try:
+                self._process(delivery)
+            except Exception as e:
+                print(f"ERROR: Webhook worker failed: {e}")
+            finally:
+                with self._cond:
+                    self._in_flight -= 1
+                    self._cond.notify_all()
+
+    def _process(self, delivery: WebhookDelivery):
+        delivery.attempts += 1
+        retryable, error = self._send(delivery)
+        if error is None:
+            self._count("delivered")
+            return
+        delivery.last_error = error
+        if retryable and delivery.attempts < self.max_attempts and self._schedule(delivery, _backoff_seconds(delivery.attempts)):
+            self._count("retried")
+            return
+        self._dead_letter(delivery, error)
+
+    def _send(self, delivery: WebhookDelivery):
+        """One attempt. Returns (retryable, error); error is None on success."""
+        body = json.dumps(delivery.payload, ensure_ascii=False, default=str).encode()
+        timestamp = str(int(time.time()))
+        headers = {
+            "Content-Type": "application/json",
+            "X-Webhook-Event": delivery.event,
+            "X-Webhook-Id": delivery.delivery_id,
+            "X-Webhook-Timestamp": timestamp,
+        }
+        if self.secret:
+            headers["X-Webhook-Signature"] = sign(self.secret, timestamp, body)
+        try:
+            response = self.http.post(delivery.url, data=body, headers=headers, timeout=self.timeout)
+        except requests.RequestException as e:
+            return True, f"{type(e).__name__}: {e}"
+        if response.status_code < 300:
+            return False, None
+        error = f"HTTP {response.status_code}: {response.text[:200]}"
+        return response.status_code >= 500 or response.status_code in RETRYABLE_CLIENT_ERRORS, error
+
+    def _count(self, outcome: str):
+        with self._cond:
+            self.stats[outcome] += 1
+
+    def _dead_letter(self, delivery: WebhookDelivery, error: str):
+        self._count("dead_lettered")
+        print(f"ERROR: Webhook '{delivery.event}' to {delivery.url} failed after {delivery.attempts} attempt(s): {error}")
+        db = self.session_factory()
+        try:
+            db.add(WebhookDeadLetter(
+                delivery_id=delivery.delivery_id,
+                event=delivery.event,
+                url=delivery.url,
+                payload=json.dumps(delivery.payload, ensure_ascii=False, default=str),
+                attempts=delivery.attempts,
+                last_error=error,
+            ))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"ERROR: Could not store webhook dead letter: {e}")
+        finally:
+            db.close()
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -0,0 +1,139 @@
+"""
+Concurrency stress test for reservation booking.
+
+Many parallel clients try to book overlapping slots on the same day through
+crud_reservations.create_reservation. Afterwards every non-cancelled reservation
+of that day is checked for overlaps and latency percentiles are reported.
+
+Usage:
+    python stress_booking.py --clients 300 --day 2030-01-15 [--coworkers 12,13] [--keep]
+"""
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import SQLALCHEMY_DATABASE_URL
+from models import Reservation, User
+from crud import crud_reservations
+from schemas import ReservationCreate
+from services.service_catalog import OPENING_HOUR, CLOSING_HOUR, SERVICE_DURATIONS, get_service_duration
+
+STRESS_PHONE = "09000000000"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def find_double_bookings(reservations):
+    """Returns pairs of reservations that overlap under the booking rules."""
+    overlaps = []
+    for i, a in enumerate(reservations):
+        a_end = a.date + timedelta(minutes=get_service_duration(a.service_type))
+        for b in reservations[i + 1:]:
+            b_end = b.date + timedelta(minutes=get_service_duration(b.service_type))
+            same_lane = a.coworker_id is None or b.coworker_id is None or a.coworker_id == b.coworker_id
+            if same_lane and a.date < b_end and b.date < a_end:
+                overlaps.append((a.id, b.id))
+    return overlaps
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests-per-client", type=int, default=3)
+    parser.add_argument("--day", type=date.fromisoformat, default=date.today() + timedelta(days=365))
+    parser.add_argument("--coworkers", default="", help="Comma separated coworker user IDs; empty books unassigned slots.")
+    parser.add_argument("--keep", action="store_true", help="Keep the created reservations.")
+    args = parser.parse_args()
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=min(args.clients, 50), max_overflow=0,
+                           connect_args={"options": "-c timezone=utc"})
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    coworkers = [int(c) for c in args.coworkers.split(",") if c] or [None]
+
+    db = Session()
+    user = db.query(User).filter(User.phone_number == STRESS_PHONE).first()
+    if not user:
+        user = User(phone_number=STRESS_PHONE, role="customer", is_active=True, created_at=datetime.now())
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    user_id = user.id
+    db.close()
+
+    latencies, outcomes = [], {"created": 0, "conflict": 0, "busy": 0, "error": 0}
+    lock = threading.Lock()
+    services = list(SERVICE_DURATIONS)
+
+    def client(_):
+        session = Session()
+        try:
+            for _ in range(args.requests_per_client):
+                hour = random.randint(OPENING_HOUR, CLOSING_HOUR - 3)
+                slot = datetime.combine(args.day, datetime.min.time()) + timedelta(hours=hour, minutes=random.choice((0, 30)))
+                data = ReservationCreate(user_id=user_id, service_type=random.choice(services), date=slot,
+                                         coworker_id=random.choice(coworkers), notes="stress-test")
+                started = time.perf_counter()
+                try:
+                    crud_reservations.create_reservation(session, reservation=data)
+                    outcome = "created"
+                except HTTPException as e:
+                    outcome = {409: "conflict", 503: "busy"}.get(e.status_code, "error")
+                    session.rollback()
+                elapsed = (time.perf_counter() - started) * 1000
+                with lock:
+                    latencies.append(elapsed)
+                    outcomes[outcome] += 1
+        finally:
+            session.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        list(pool.map(client, range(args.clients)))
+    wall = time.perf_counter() - started
+
+    db = Session()
+    day_start = datetime.combine(args.day, datetime.min.time())
+    booked = (
+        db.query(Reservation)
+        .filter(Reservation.date >= day_start, Reservation.date < day_start + timedelta(days=1),
+                Reservation.status != "cancelled")
+        .order_by(Reservation.date)
+        .all()
+    )
+    double_bookings = find_double_bookings(booked)
+
+    print(f"requests: {len(latencies)} in {wall:.2f}s ({len(latencies) / wall:.0f} req/s)")
+    print(f"outcomes: {outcomes}")
+    print(f"latency ms: p50={percentile(latencies, 50):.1f} p95={percentile(latencies, 95):.1f} "
+          f"p99={percentile(latencies, 99):.1f} max={max(latencies):.1f} mean={statistics.mean(latencies):.1f}")
+    print(f"reservations on {args.day}: {len(booked)}, double bookings: {len(double_bookings)}")
+    for pair in double_bookings[:10]:
+        print(f"  overlap: reservations {pair[0]} and {pair[1]}")
+
+    if not args.keep:
+        db.query(Reservation).filter(Reservation.user_id == user_id, Reservation.notes == "stress-test").delete()
+        db.commit()
+    db.close()
+
+    raise SystemExit(1 if double_bookings else 0)
+
+
+if __name__ == "__main__":
+    main()
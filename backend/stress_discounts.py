@@ -0,0 +1,112 @@
+"""
+Concurrency test for discount redemption.
+
+Creates a few discounts for a test user, then lets many parallel clients redeem
+each of them at the same time (half by ID through apply_discount, half by code
+through redeem_discount_code). Every discount must be redeemed exactly once;
+all other attempts must fail with 409. The test rows are removed afterwards.
+
+Usage:
+    python stress_discounts.py --clients 100 --discounts 20
+"""
+import argparse
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import sessionmaker
+
+from database import SQLALCHEMY_DATABASE_URL
+from models import DailyDiscountRollup, Discount, User
+from crud import crud_discounts
+from schemas import DiscountCreate
+
+STRESS_PHONE = "09000000002"
+STRESS_DISCOUNT_TYPE = "stress_test"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=100, help="Concurrent redemption attempts per discount.")
+    parser.add_argument("--discounts", type=int, default=20)
+    args = parser.parse_args()
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=min(args.clients, 50), max_overflow=0,
+                           connect_args={"options": "-c timezone=utc"})
+    Session = sessionmaker(bind=engine, autocommit=False, autoflush=False)
+
+    db = Session()
+    user = db.query(User).filter(User.phone_number == STRESS_PHONE).first()
+    if not user:
+        user = User(phone_number=STRESS_PHONE, role="customer", is_active=True, created_at=datetime.now())
+        db.add(user)
+        db.commit()
+        db.refresh(user)
+    user_id = user.id
+    discounts = [
+        crud_discounts.create_discount(db, DiscountCreate(
+            user_id=user_id, discount_type=STRESS_DISCOUNT_TYPE, percentage=10,
+            expires_at=datetime.now() + timedelta(days=1),
+        ))
+        for _ in range(args.discounts)
+    ]
+    targets = [(d.id, d.code) for d in discounts]
+    db.close()
+
+    outcomes = Counter()
+    winners = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(args.clients)
+
+    def attempt(i, discount_id, code):
+        session = Session()
+        barrier.wait()  # release all clients of this discount at once
+        try:
+            if i % 2:
+                crud_discounts.apply_discount(session, discount_id=discount_id, user_id=user_id)
+            else:
+                crud_discounts.redeem_discount_code(session, code=code, user_id=user_id)
+            result = "redeemed"
+        except HTTPException as e:
+            result = str(e.status_code)
+        except Exception as e:
+            result = type(e).__name__
+        finally:
+            session.close()
+        with lock:
+            outcomes[result] += 1
+            if result == "redeemed":
+                winners[discount_id] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.clients) as pool:
+        for discount_id, code in targets:
+            list(pool.map(lambda i: attempt(i, discount_id, code), range(args.clients)))
+    elapsed = time.perf_counter() - started
+
+    db = Session()
+    used = db.query(Discount).filter(Discount.id.in_([d for d, _ in targets]), Discount.used.is_(True)).count()
+    db.execute(delete(Discount).where(Discount.user_id == user_id, Discount.discount_type == STRESS_DISCOUNT_TYPE))
+    db.execute(delete(DailyDiscountRollup).where(DailyDiscountRollup.discount_type == STRESS_DISCOUNT_TYPE))
+    db.commit()
+    db.close()
+
+    attempts = args.clients * len(targets)
+    print(f"{attempts} attempts on {len(targets)} discounts in {elapsed:.2f}s: {dict(outcomes)}")
+    double = {d: n for d, n in winners.items() if n > 1}
+    unredeemed = len(targets) - len(winners)
+    if double or unredeemed or used != len(targets) or outcomes["409"] != attempts - len(targets):
+        print(f"FAIL: redeemed twice: {double}, never redeemed: {unredeemed}, marked used: {used}")
+        raise SystemExit(1)
+    print("OK: every discount was redeemed exactly once")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+"""
+Shared setup for the backend tests.
+
+The tests run against the PostgreSQL database in DATABASE_URL (the booking locks and the
+query plans cannot be faked with SQLite) and are skipped when it is not set. Use a scratch
+database: rows are written far in the future (2099) and removed again afterwards.
+
+Usage (from backend/):
+    DATABASE_URL=postgresql://... python -m pytest -q tests
+"""
+import os
+import sys
+
+# The backend modules are imported top-level (database, models, crud, ...), like uvicorn does.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
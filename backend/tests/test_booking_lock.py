@@ -0,0 +1,132 @@
+"""
+Concurrent bookings through crud_reservations.create_reservation never overlap: the per-day
+advisory locks serialize the conflict check and the insert, also for bookings past midnight.
+"""
+import os
+import random
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs a PostgreSQL database in DATABASE_URL", allow_module_level=True)
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import SQLALCHEMY_DATABASE_URL
+from models import DailyBookingRollup, Reservation, User
+from crud import crud_reservations
+from schemas import ReservationCreate
+from stress_booking import find_double_bookings
+
+DAY = date(2099, 3, 1)
+CLIENTS = 24
+TEST_PHONE = "09000000002"
+
+
+@pytest.fixture(scope="module")
+def Session():
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, pool_size=CLIENTS, max_overflow=0,
+                           connect_args={"options": "-c timezone=utc"})
+    yield sessionmaker(bind=engine, autocommit=False, autoflush=False)
+    engine.dispose()
+
+
+@pytest.fixture
+def user_id(Session):
+    db = Session()
+    user = db.query(User).filter(User.phone_number == TEST_PHONE).first()
+    if not user:
+        user = User(phone_number=TEST_PHONE, role="customer", is_active=True, created_at=datetime.now())
+        db.add(user)
+        db.commit()
+    user_id = user.id
+    yield user_id
+    start = datetime.combine(DAY, datetime.min.time())
+    db.query(Reservation).filter(
+        Reservation.user_id == user_id, Reservation.date >= start, Reservation.date < start + timedelta(days=3)
+    ).delete(synchronize_session=False)
+    db.query(DailyBookingRollup).filter(
+        DailyBookingRollup.day >= DAY, DailyBookingRollup.day < DAY + timedelta(days=3)
+    ).delete(synchronize_session=False)
+    db.commit()
+    db.close()
+
+
+def book_concurrently(Session, requests):
+    """Runs create_reservation for every request in parallel; returns the outcome counts."""
+    def book(data):
+        db = Session()
+        try:
+            crud_reservations.create_reservation(db, reservation=data)
+            return "created"
+        except HTTPException as e:
+            db.rollback()
+            return {409: "conflict", 503: "busy"}.get(e.status_code, "error")
+        finally:
+            db.close()
+
+    with ThreadPoolExecutor(max_workers=CLIENTS) as pool:
+        return Counter(pool.map(book, requests))
+
+
+def booked(Session, user_id):
+    db = Session()
+    try:
+        start = datetime.combine(DAY, datetime.min.time())
+        return (
+            db.query(Reservation)
+            .filter(Reservation.user_id == user_id, Reservation.status != "cancelled",
+                    Reservation.date >= start, Reservation.date < start + timedelta(days=3))
+            .order_by(Reservation.date)
+            .all()
+        )
+    finally:
+        db.close()
+
+
+def at(day: date, hour: int, minute: int = 0) -> datetime:
+    return datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute)
+
+
+def test_same_slot_is_booked_once(Session, user_id):
+    requests = [ReservationCreate(user_id=user_id, service_type="haircut", date=at(DAY, 10)) for _ in range(CLIENTS)]
+
+    outcomes = book_concurrently(Session, requests)
+
+    assert outcomes == {"created": 1, "conflict": CLIENTS - 1}
+    assert len(booked(Session, user_id)) == 1
+
+
+def test_overlapping_slots_never_double_book(Session, user_id):
+    rng = random.Random(8)
+    requests = [
+        ReservationCreate(user_id=user_id, service_type=rng.choice(["beard", "haircut", "hair_color"]),
+                          date=at(DAY, rng.randint(10, 13), rng.choice((0, 30))))
+        for _ in range(CLIENTS * 2)
+    ]
+
+    outcomes = book_concurrently(Session, requests)
+
+    reservations = booked(Session, user_id)
+    assert outcomes["error"] == outcomes["busy"] == 0
+    assert outcomes["created"] == len(reservations) >= 1
+    assert find_double_bookings(reservations) == []
+
+
+def test_booking_past_midnight_blocks_the_next_morning(Session, user_id):
+    # 22:30 + 4h runs until 02:30 the next day, so it overlaps a 00:30 haircut on the next day.
+    late = ReservationCreate(user_id=user_id, service_type="groom_package", date=at(DAY, 22, 30))
+    early = ReservationCreate(user_id=user_id, service_type="haircut", date=at(DAY + timedelta(days=1), 0, 30))
+    requests = [late, early] * (CLIENTS // 2)
+
+    outcomes = book_concurrently(Session, requests)
+
+    reservations = booked(Session, user_id)
+    assert outcomes == {"created": 1, "conflict": CLIENTS - 1}
+    assert len(reservations) == 1
+    assert find_double_bookings(reservations) == []
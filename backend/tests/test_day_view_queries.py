@@ -0,0 +1,18 @@
+"""The staff day view loads its reservations with customer, coworker and payment in two queries."""
+import os
+from datetime import date
+
+import pytest
+
+if not os.getenv("DATABASE_URL"):
+    pytest.skip("needs a PostgreSQL database in DATABASE_URL", allow_module_level=True)
+
+from check_day_view_queries import count_queries
+
+DAY = date(2099, 1, 1)
+
+
+def test_day_view_query_count_does_not_grow_with_reservations():
+    counts = {size: count_queries(DAY, size) for size in (1, 10, 100)}
+    # One joined SELECT for reservations + users, one SELECT ... IN for the payments.
+    assert counts == {1: 2, 10: 2, 100: 2}
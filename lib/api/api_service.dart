@@ -28,6 +28,9 @@ class ApiService {
   // Factory constructor to return the singleton instance.
   factory ApiService() => _instance;
 
+  // Login/refresh endpoints: a 401 from these must not trigger a session refresh.
+  static const _sessionPaths = {"/auth/token", "/auth/refresh", "/auth/request-otp"};
+
   // Sets up interceptors to automatically handle tokens and errors.
   void _addInterceptors() {
     _dio.interceptors.add(
@@ -39,10 +42,21 @@ class ApiService {
           }
           return handler.next(options);
         },
-        onError: (DioException e, handler) {
-          if (e.response?.statusCode == 401) {
+        onError: (DioException e, handler) async {
+          final isAuthRequest = _sessionPaths.contains(e.requestOptions.path);
+          if (e.response?.statusCode == 401 && !isAuthRequest) {
+            // Renew the session with the refresh token and replay the request once.
+            if (await _refreshSession()) {
+              try {
+                final token = await TokenService.getToken();
+                e.requestOptions.headers['Authorization'] = 'Bearer $token';
+                return handler.resolve(await _dio.fetch(e.requestOptions));
+              } on DioException catch (retryError) {
+                return handler.next(retryError);
+              }
+            }
             print("ApiService: Unauthorized access. Clearing token.");
-            TokenService.clearToken();
+            await TokenService.clearToken();
           }
           return handler.next(e);
         },
@@ -50,6 +64,35 @@ class ApiService {
     );
   }
 
+  // The refresh in progress, shared by every request that got a 401 meanwhile. Sending the same
+  // refresh token twice would look like token reuse to the server and revoke the whole session.
+  Future<bool>? _refreshing;
+
+  /// Exchanges the stored refresh token for a new token pair (one exchange at a time).
+  Future<bool> _refreshSession() {
+    return _refreshing ??= _doRefreshSession().whenComplete(() => _refreshing = null);
+  }
+
+  Future<bool> _doRefreshSession() async {
+    final refreshToken = await TokenService.getRefreshToken();
+    if (refreshToken == null) return false;
+    try {
+      final response = await _dio.post("/auth/refresh", data: {"refresh_token": refreshToken});
+      await _saveTokens(response.data);
+      return true;
+    } catch (e) {
+      print("❌ Error in _refreshSession(): $e");
+      return false;
+    }
+  }
+
+  Future<void> _saveTokens(dynamic data) async {
+    await TokenService.saveToken(data['access_token']);
+    if (data['refresh_token'] != null) {
+      await TokenService.saveRefreshToken(data['refresh_token']);
+    }
+  }
+
   // --- Authentication Methods ---
 
   /// Requests an OTP code from the backend for the given phone number.
@@ -71,7 +114,7 @@ class ApiService {
 
       if (response.statusCode == 200 && response.data?['access_token'] != null) {
         final token = response.data['access_token'];
-        await TokenService.saveToken(token);
+        await _saveTokens(response.data);
         return token;
       }
       return null;
@@ -139,6 +182,29 @@ class ApiService {
     }
   }
 
+  /// Fetches free slots for a service on [days] consecutive days starting at [from].
+  /// Returns a map from 'yyyy-MM-dd' to the free start times of that day.
+  Future<Map<String, List<DateTime>>> getAvailability(DateTime from, String serviceType, {int days = 7}) async {
+    try {
+      final response = await _dio.get(
+        "/reservations/availability",
+        queryParameters: {
+          'date': DateFormat('yyyy-MM-dd').format(from),
+          'service_type': serviceType,
+          'days': days,
+        },
+      );
+      final Map<String, List<DateTime>> availability = {};
+      for (final day in response.data['days']) {
+        availability[day['date']] = (day['slots'] as List).map((slot) => DateTime.parse(slot)).toList();
+      }
+      return availability;
+    } catch (e) {
+      print("❌ Error in getAvailability(): $e");
+      return {};
+    }
+  }
+
   /// Creates a new reservation for the current user.
   Future<bool> createReservation(DateTime date, String serviceType) async {
     try {
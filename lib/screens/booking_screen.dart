@@ -1,6 +1,6 @@
 import 'package:flutter/material.dart';
 import 'package:matin_mafhoom/api/api_service.dart';
-import 'package:matin_mafhoom/models/reservation_model.dart'; // We will create this model
+import 'package:intl/intl.dart';
 import 'package:table_calendar/table_calendar.dart';
 import 'package:intl/date_symbol_data_local.dart'; // For Farsi locale
 
@@ -14,22 +14,36 @@ class _BookingScreenState extends State<BookingScreen> {
   DateTime _selectedDay = DateTime.now();
   DateTime _focusedDay = DateTime.now();
   String? _selectedSlot;
-  Future<List<Reservation>>? _reservationsFuture;
+  static const String _serviceType = "haircut"; // Example service type
+  DateTime? _availabilityStart;
+  Future<Map<String, List<DateTime>>>? _availabilityFuture;
 
   final List<String> _timeSlots = List.generate(15, (i) => "${(i + 9).toString().padLeft(2, '0')}:00");
 
   @override
   void initState() {
     super.initState();
-    _fetchReservations();
+    _fetchAvailability();
   }
 
-  void _fetchReservations() {
+  /// Loads free slots for a whole week starting at the selected day in one request.
+  void _fetchAvailability() {
+    final start = DateTime(_selectedDay.year, _selectedDay.month, _selectedDay.day);
     setState(() {
-      _reservationsFuture = ApiService().getMyReservations();
+      _availabilityStart = start;
+      _availabilityFuture = ApiService().getAvailability(start, _serviceType);
     });
   }
 
+  /// Reloads only when the selected day falls outside the week that is already loaded.
+  void _ensureAvailabilityLoaded() {
+    final start = _availabilityStart;
+    final day = DateTime(_selectedDay.year, _selectedDay.month, _selectedDay.day);
+    if (start == null || day.isBefore(start) || day.difference(start).inDays >= 7) {
+      _fetchAvailability();
+    }
+  }
+
   Future<void> _submitReservation() async {
     if (_selectedSlot == null) {
       ScaffoldMessenger.of(context).showSnackBar(const SnackBar(content: Text("لطفاً یک ساعت را انتخاب کنید")));
@@ -44,14 +58,14 @@ class _BookingScreenState extends State<BookingScreen> {
       int.parse(_selectedSlot!.split(':')[0]),
     );
 
-    final success = await ApiService().createReservation(selectedDateTime, "haircut"); // Example service type
+    final success = await ApiService().createReservation(selectedDateTime, _serviceType);
 
     if (mounted) {
       ScaffoldMessenger.of(context).showSnackBar(
         SnackBar(content: Text(success ? "رزرو شما با موفقیت ثبت شد ✅" : "خطا در ثبت رزرو ❌")),
       );
       if (success) {
-        _fetchReservations(); // Refresh the list after booking
+        _fetchAvailability(); // Refresh the free slots after booking
       }
     }
   }
@@ -92,13 +106,14 @@ class _BookingScreenState extends State<BookingScreen> {
           _focusedDay = focusedDay;
           _selectedSlot = null;
         });
+        _ensureAvailabilityLoaded();
       },
     );
   }
 
   Widget _buildTimeSlots() {
-    return FutureBuilder<List<Reservation>>(
-      future: _reservationsFuture,
+    return FutureBuilder<Map<String, List<DateTime>>>(
+      future: _availabilityFuture,
       builder: (context, snapshot) {
         if (snapshot.connectionState == ConnectionState.waiting) {
           return const Center(child: CircularProgressIndicator());
@@ -107,16 +122,16 @@ class _BookingScreenState extends State<BookingScreen> {
           return Center(child: Text("خطا در دریافت اطلاعات: ${snapshot.error}"));
         }
         
-        final reservedSlotsForSelectedDay = snapshot.data
-            ?.where((res) => isSameDay(res.date, _selectedDay))
-            .map((res) => "${res.date.hour.toString().padLeft(2, '0')}:00")
-            .toList() ?? [];
+        final freeSlotsForSelectedDay = snapshot.data?[DateFormat('yyyy-MM-dd').format(_selectedDay)]
+                ?.map((slot) => DateFormat('HH:mm').format(slot))
+                .toList() ??
+            [];
 
         return Wrap(
           spacing: 12,
           runSpacing: 12,
           children: _timeSlots.map((slot) {
-            final isReserved = reservedSlotsForSelectedDay.contains(slot);
+            final isReserved = !freeSlotsForSelectedDay.contains(slot);
             final isSelected = _selectedSlot == slot;
             return ElevatedButton(
               onPressed: isReserved ? null : () => setState(() => _selectedSlot = slot),
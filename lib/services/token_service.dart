@@ -3,6 +3,7 @@ import 'package:flutter_secure_storage/flutter_secure_storage.dart';
 class TokenService {
   static const _storage = FlutterSecureStorage();
   static const _key = "access_token";
+  static const _refreshKey = "refresh_token";
 
   /// ذخیره توکن
   static Future<void> saveToken(String token) async {
@@ -14,9 +15,20 @@ class TokenService {
     return await _storage.read(key: _key);
   }
 
+  /// ذخیره توکن تمدید (refresh token)
+  static Future<void> saveRefreshToken(String token) async {
+    await _storage.write(key: _refreshKey, value: token);
+  }
+
+  /// خواندن توکن تمدید
+  static Future<String?> getRefreshToken() async {
+    return await _storage.read(key: _refreshKey);
+  }
+
   /// حذف توکن (برای لاگ‌اوت)
   static Future<void> clearToken() async {
     await _storage.delete(key: _key);
+    await _storage.delete(key: _refreshKey);
   }
 }
 